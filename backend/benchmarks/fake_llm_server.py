@@ -0,0 +1,115 @@
+"""
+OpenAI-compatible chat completions server backed by FakeLLM
+
+Serves POST /chat/completions (plain and streamed) so the backend's real
+HTTP client, connection pool and in-flight limit are exercised without
+network access. Point the backend at it with
+
+    python -m benchmarks.fake_llm_server --port 8001 --latency-ms 300 --tokens-per-second 250
+    GROQ_BASE_URL=http://127.0.0.1:8001 uvicorn main:app
+
+Injected errors are answered with HTTP 500; streamed completions report
+their token usage on the final chunk under x_groq, as Groq does.
+"""
+import json
+import time
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from services.fake_llm import (
+    FakeLLM,
+    LLM_FAKE_ERROR_RATE,
+    LLM_FAKE_JITTER,
+    LLM_FAKE_LATENCY_MS,
+    LLM_FAKE_QUERY_RATE,
+    LLM_FAKE_REPLY_TOKENS,
+    LLM_FAKE_TOKENS_PER_SECOND
+)
+
+
+def create_app(llm: FakeLLM) -> FastAPI:
+    app = FastAPI(title="Fake LLM")
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        completion = llm.plan(body.get("messages") or [], int(body.get("max_tokens") or 1024))
+        completion_id = f"chatcmpl-{time.time_ns()}"
+
+        if not body.get("stream"):
+            try:
+                text = await llm.complete(completion)
+            except Exception as e:
+                return JSONResponse({"error": {"message": str(e), "type": "server_error"}}, status_code=500)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop"
+                }],
+                "usage": completion.usage
+            }
+
+        if completion.fails:
+            # Failing before the first token, like an upstream 5xx
+            await asyncio.sleep(completion.first_token_seconds)
+            return JSONResponse({"error": {"message": "Injected completion failure", "type": "server_error"}}, status_code=500)
+
+        def chunk(delta: dict, finish_reason=None, **extra) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra
+            }
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant"})
+            async for text in llm.stream(completion):
+                yield chunk({"content": text})
+            yield chunk({}, "stop", x_groq={"usage": completion.usage})
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=LLM_FAKE_LATENCY_MS, help="Mean time to first token")
+    parser.add_argument("--jitter", type=float, default=LLM_FAKE_JITTER, help="Relative standard deviation of the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=LLM_FAKE_TOKENS_PER_SECOND)
+    parser.add_argument("--error-rate", type=float, default=LLM_FAKE_ERROR_RATE)
+    parser.add_argument("--query-rate", type=float, default=LLM_FAKE_QUERY_RATE, help="Share of <<QUERY_DB>> replies")
+    parser.add_argument("--reply-tokens", type=int, default=LLM_FAKE_REPLY_TOKENS)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    llm = FakeLLM(
+        latency_ms=args.latency_ms,
+        jitter=args.jitter,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        query_rate=args.query_rate,
+        reply_tokens=args.reply_tokens,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(llm), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Deterministic synthetic dataset for load_all_data.py
+
+Writes products, users, orders, order_items and inventory_items CSVs with
+the column layout the loaders expect. --rows sets the order_items row
+count (10k to 50M); the other tables are sized from it. The same --rows
+and --seed always produce byte-identical files.
+
+    python -m benchmarks.generate_data --rows 1000000 --out ./data/bench
+"""
+import os
+import time
+import argparse
+from typing import Callable, Dict, Tuple
+import numpy as np
+import pandas as pd
+
+MIN_ROWS = 10_000
+MAX_ROWS = 50_000_000
+# Rows generated (and written) per step; part of the output's identity
+CHUNK_ROWS = 500_000
+# The repo's data/distribution_centers.csv holds centers 1-10
+DISTRIBUTION_CENTERS = 10
+
+# Table size relative to order_items
+TABLE_RATIOS = {
+    "products": 0.02,
+    "users": 0.1,
+    "orders": 0.4,
+    "order_items": 1.0,
+    "inventory_items": 0.6,
+}
+
+CATEGORIES = np.array([
+    "Jeans", "Tops & Tees", "Sweaters", "Fashion Hoodies & Sweatshirts", "Shorts",
+    "Outerwear & Coats", "Dresses", "Active", "Swim", "Accessories", "Socks",
+    "Sleep & Lounge", "Pants", "Underwear", "Suits & Sport Coats", "Skirts",
+])
+BRANDS = np.array([
+    "Levi's", "Calvin Klein", "Carhartt", "Columbia", "Nike", "Hanes", "Tommy Hilfiger",
+    "Ralph Lauren", "Wrangler", "Dockers", "Champion", "Patagonia", "Quiksilver", "Volcom",
+])
+DEPARTMENTS = np.array(["Men", "Women"])
+ORDER_STATUSES = np.array(["Complete", "Shipped", "Processing", "Cancelled", "Returned"])
+INVENTORY_STATUSES = np.array(["available", "reserved", "sold"])
+FIRST_NAMES = np.array(["Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie"])
+LAST_NAMES = np.array(["Smith", "Garcia", "Chen", "Patel", "Kim", "Nguyen", "Brown", "Silva"])
+
+
+def table_sizes(rows: int) -> Dict[str, int]:
+    return {table: max(100, int(rows * ratio)) for table, ratio in TABLE_RATIOS.items()}
+
+
+def _rng(seed: int, table: str, chunk: int) -> np.random.Generator:
+    # One stream per (table, chunk), so chunks can be generated independently
+    table_key = list(TABLE_RATIOS).index(table)
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(table_key, chunk)))
+
+
+def products(rng, ids: np.ndarray, sizes: Dict[str, int]) -> pd.DataFrame:
+    n = len(ids)
+    category = CATEGORIES[rng.integers(0, len(CATEGORIES), n)]
+    brand = BRANDS[rng.integers(0, len(BRANDS), n)]
+    retail_price = np.round(rng.lognormal(3.4, 0.6, n), 2)
+    return pd.DataFrame({
+        "id": ids,
+        "cost": np.round(retail_price * rng.uniform(0.35, 0.65, n), 2),
+        "category": category,
+        "name": pd.Series(brand).str.cat([category, ids.astype(str)], sep=" "),
+        "brand": brand,
+        "retail_price": retail_price,
+        "department": DEPARTMENTS[rng.integers(0, len(DEPARTMENTS), n)],
+        "sku": pd.Series(rng.integers(0, 2**40, n)).map("{:010X}".format),
+        "distribution_center_id": rng.integers(1, DISTRIBUTION_CENTERS + 1, n),
+    })
+
+
+def users(rng, ids: np.ndarray, sizes: Dict[str, int]) -> pd.DataFrame:
+    n = len(ids)
+    first = FIRST_NAMES[rng.integers(0, len(FIRST_NAMES), n)]
+    last = LAST_NAMES[rng.integers(0, len(LAST_NAMES), n)]
+    return pd.DataFrame({
+        "id": ids,
+        "name": pd.Series(first).str.cat(last, sep=" "),
+        "email": pd.Series(first).str.lower().str.cat(ids.astype(str), sep=".") + "@example.com",
+    })
+
+
+def orders(rng, ids: np.ndarray, sizes: Dict[str, int]) -> pd.DataFrame:
+    n = len(ids)
+    # Orders spread over 2023-2024, ascending with the id
+    seconds = np.sort(rng.integers(0, 2 * 365 * 86400, n))
+    created_at = pd.Timestamp("2023-01-01") + pd.to_timedelta(seconds, unit="s")
+    return pd.DataFrame({
+        "id": ids,
+        "user_id": rng.integers(1, sizes["users"] + 1, n),
+        "status": ORDER_STATUSES[rng.integers(0, len(ORDER_STATUSES), n)],
+        "total_amount": np.round(rng.lognormal(4.0, 0.7, n), 2),
+        "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+
+
+def order_items(rng, ids: np.ndarray, sizes: Dict[str, int]) -> pd.DataFrame:
+    n = len(ids)
+    # Zipf-like popularity so top-N queries have a clear head
+    product_id = (rng.zipf(1.3, n) - 1) % sizes["products"] + 1
+    return pd.DataFrame({
+        "id": ids,
+        "order_id": (ids - 1) * sizes["orders"] // sizes["order_items"] + 1,
+        "product_id": product_id,
+        "quantity": rng.integers(1, 4, n),
+        "price": np.round(rng.lognormal(3.4, 0.6, n), 2),
+    })
+
+
+def inventory_items(rng, ids: np.ndarray, sizes: Dict[str, int]) -> pd.DataFrame:
+    n = len(ids)
+    return pd.DataFrame({
+        "id": ids,
+        "product_id": rng.integers(1, sizes["products"] + 1, n),
+        "distribution_center_id": rng.integers(1, DISTRIBUTION_CENTERS + 1, n),
+        "quantity": rng.integers(0, 200, n),
+        "status": INVENTORY_STATUSES[rng.integers(0, len(INVENTORY_STATUSES), n)],
+    })
+
+
+GENERATORS: Dict[str, Callable] = {
+    "products": products,
+    "users": users,
+    "orders": orders,
+    "order_items": order_items,
+    "inventory_items": inventory_items,
+}
+
+
+def generate_table(table: str, out_dir: str, rows: int, seed: int = 41) -> Tuple[str, int]:
+    """
+    Writes one table's CSV
+    Args:
+        table: Table name (a key of GENERATORS)
+        out_dir: Output directory
+        rows: order_items row count the dataset is scaled to
+        seed: Random seed
+    Returns:
+        (path, rows written)
+    """
+    sizes = table_sizes(rows)
+    total = sizes[table]
+    path = os.path.join(out_dir, f"{table}.csv")
+    with open(path, "w", newline="") as file:
+        for chunk, start in enumerate(range(0, total, CHUNK_ROWS)):
+            ids = np.arange(start + 1, min(start + CHUNK_ROWS, total) + 1, dtype=np.int64)
+            frame = GENERATORS[table](_rng(seed, table, chunk), ids, sizes)
+            frame.to_csv(file, header=chunk == 0, index=False)
+    return path, total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic e-commerce dataset")
+    parser.add_argument("--rows", type=int, default=100_000,
+                        help=f"order_items rows ({MIN_ROWS:,} to {MAX_ROWS:,}); other tables scale from it")
+    parser.add_argument("--out", default="./data/bench", help="Output directory")
+    parser.add_argument("--seed", type=int, default=41)
+    parser.add_argument("--tables", nargs="+", choices=list(GENERATORS), default=list(GENERATORS))
+    args = parser.parse_args(argv)
+    if not MIN_ROWS <= args.rows <= MAX_ROWS:
+        parser.error(f"--rows must be between {MIN_ROWS:,} and {MAX_ROWS:,}")
+
+    os.makedirs(args.out, exist_ok=True)
+    for table in args.tables:
+        started = time.perf_counter()
+        path, total = generate_table(table, args.out, args.rows, args.seed)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"{table}: {total:,} rows, {size_mb:.1f} MB in {time.perf_counter() - started:.1f}s -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Ingestion benchmark for load_all_data.py against a local mongod
+
+Loads each table of a synthetic dataset (generated on demand by
+benchmarks.generate_data) into a scratch database, one table at a time,
+and reports rows/s, MB/s, peak RSS (loader plus parser processes) and
+the parse/transform/insert/index stage times per loader. Results can be
+saved as JSON and compared against a previous run to catch regressions.
+
+    python -m benchmarks.ingest --rows 1000000 --json bench.json
+    python -m benchmarks.ingest --rows 1000000 --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import threading
+from typing import Dict, List
+from pymongo import MongoClient
+
+from benchmarks.generate_data import MAX_ROWS, MIN_ROWS, generate_table
+from load_all_data import TABLES, add_loader_arguments, options_from_args, table_runner
+from utils.bulk_loader import parser_pool
+
+BENCHMARK_MONGO_URI = os.getenv("BENCHMARK_MONGO_URI", "mongodb://localhost:27017")
+BENCHMARK_DB = "ingest_benchmark"
+
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as file:
+                children.extend(int(child) for child in file.read().split())
+    except OSError:
+        pass
+    return children
+
+
+class RssSampler:
+    """
+    Samples the resident memory of this process and all its descendants
+    (the parser pool) in a background thread. Falls back to this process's
+    ru_maxrss where /proc is unavailable.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> int:
+        total, pending = 0, [os.getpid()]
+        while pending:
+            pid = pending.pop()
+            total += _rss_bytes(pid)
+            pending.extend(_children(pid))
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if not self.peak:
+            # ru_maxrss is in KiB on Linux
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    @property
+    def peak_mb(self) -> float:
+        return self.peak / (1024 * 1024)
+
+
+def ensure_dataset(data_dir: str, rows: int, seed: int) -> None:
+    """Generates any missing CSVs of the requested scale"""
+    os.makedirs(data_dir, exist_ok=True)
+    marker = os.path.join(data_dir, ".rows")
+    current = None
+    if os.path.exists(marker):
+        with open(marker) as file:
+            current = file.read().strip()
+    stale = current != f"{rows}:{seed}"
+    for spec in TABLES:
+        path = os.path.join(data_dir, f"{spec.name}.csv")
+        if stale or not os.path.exists(path):
+            print(f"Generating {spec.name}...")
+            generate_table(spec.name, data_dir, rows, seed)
+    with open(marker, "w") as file:
+        file.write(f"{rows}:{seed}")
+
+
+def run_benchmark(db, data_dir: str, args) -> List[Dict]:
+    """Loads every table once and returns one result dict per loader"""
+    options = options_from_args(args)
+    run_table = table_runner(args)
+    results = []
+    for spec in TABLES:
+        csv_file = os.path.join(data_dir, f"{spec.name}.csv")
+        # A private parser pool per table keeps the RSS peak attributable
+        with RssSampler() as rss, parser_pool(options.parse_workers) as executor:
+            report = run_table(db, spec, csv_file, options, executor)
+        results.append({
+            "table": spec.name,
+            "rows": report.rows,
+            "seconds": round(report.seconds, 3),
+            "rows_per_second": round(report.rows_per_second, 1),
+            "mb_per_second": round(report.mb_per_second, 2),
+            "peak_rss_mb": round(rss.peak_mb, 1),
+            "stages": {stage: round(seconds, 3) for stage, seconds in report.stages.items()},
+            "counts": report.counts,
+        })
+    return results
+
+
+def print_results(results: List[Dict]):
+    header = f"{'table':<16}{'rows':>12}{'rows/s':>12}{'MB/s':>8}{'peak RSS':>11}" \
+             f"{'parse':>9}{'transform':>11}{'insert':>9}{'index':>8}"
+    print("\n" + header)
+    print("-" * len(header))
+    for result in results:
+        stages = result["stages"]
+        print(
+            f"{result['table']:<16}{result['rows']:>12,}{result['rows_per_second']:>12,.0f}"
+            f"{result['mb_per_second']:>8.1f}{result['peak_rss_mb']:>8.0f} MB"
+            f"{stages['parse']:>8.2f}s{stages['transform']:>10.2f}s"
+            f"{stages['insert']:>8.2f}s{stages['index']:>7.2f}s"
+        )
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Lists tables whose rows/s or peak RSS regressed beyond tolerance"""
+    previous = {result["table"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result["table"])
+        if before is None:
+            continue
+        if result["rows_per_second"] < before["rows_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{result['table']}: {result['rows_per_second']:,.0f} rows/s "
+                f"vs {before['rows_per_second']:,.0f} baseline"
+            )
+        if result["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{result['table']}: peak RSS {result['peak_rss_mb']:.0f} MB "
+                f"vs {before['peak_rss_mb']:.0f} MB baseline"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark load_all_data against a local mongod")
+    parser.add_argument("--rows", type=int, default=100_000,
+                        help=f"order_items rows of the generated dataset ({MIN_ROWS:,} to {MAX_ROWS:,})")
+    parser.add_argument("--seed", type=int, default=41)
+    parser.add_argument("--data-dir", default="./data/bench", help="Where the generated CSVs live")
+    parser.add_argument("--mongo-uri", default=BENCHMARK_MONGO_URI)
+    parser.add_argument("--db", default=BENCHMARK_DB, help="Scratch database, dropped before the run")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against results saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed relative slowdown / memory growth against the baseline")
+    add_loader_arguments(parser)
+    args = parser.parse_args(argv)
+    if not MIN_ROWS <= args.rows <= MAX_ROWS:
+        parser.error(f"--rows must be between {MIN_ROWS:,} and {MAX_ROWS:,}")
+
+    ensure_dataset(args.data_dir, args.rows, args.seed)
+    client = MongoClient(args.mongo_uri)
+    client.drop_database(args.db)
+    started = time.perf_counter()
+    try:
+        results = run_benchmark(client[args.db], args.data_dir, args)
+    finally:
+        client.drop_database(args.db)
+        client.close()
+    print_results(results)
+    print(f"\nTotal {time.perf_counter() - started:.1f}s, mode={args.mode}, "
+          f"parse_workers={args.parse_workers}, writers={args.writers}, batch_bytes={args.batch_bytes}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"rows": args.rows, "mode": args.mode, "results": results}, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Closed-loop load generator for the chat API
+
+Each virtual user loads the conversation sidebar, then holds a chat
+session: a geometrically distributed number of turns (mean --mean-turns)
+with exponential think time between them. It occasionally revalidates the
+open conversation with If-None-Match and ends the session before starting
+the next. Messages mix fast-path intents, LLM questions and order lookups.
+
+Reports p50/p95/p99 latency, throughput and error rate per operation. For
+an offline capacity test run the API against a local mongod with the fake
+LLM, in-process or over HTTP:
+
+    LLM_BACKEND=fake uvicorn main:app --port 8000
+    python -m benchmarks.load_chat --users 50 --duration 60
+
+    python -m benchmarks.fake_llm_server --port 8001 --latency-ms 300
+    GROQ_BASE_URL=http://127.0.0.1:8001 uvicorn main:app --port 8000
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+import httpx
+import numpy as np
+from bson import ObjectId
+
+# (weight, message template); {order} is replaced by a random order number
+MESSAGES = [
+    (3, "What are your top 5 products?"),
+    (2, "Show me the best selling jeans"),
+    (1, "Most popular hoodies?"),
+    (3, "I'm looking for a warm jacket for winter, what do you recommend?"),
+    (2, "Do you have dresses for a summer wedding?"),
+    (2, "What would go well with slim fit jeans?"),
+    (1, "Which brands of sweaters do you carry?"),
+    (2, "Where is my order {order}?"),
+    (1, "Can you check the status of order {order}"),
+    (1, "hello"),
+    (1, "thanks!"),
+    (1, "What is your return policy?"),
+]
+
+
+class Recorder:
+    """Latencies and failures per operation"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    async def call(self, operation: str, request, expected=(200,)) -> Optional[httpx.Response]:
+        """Times an awaitable request; None when it failed"""
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError as e:
+            self.errors[operation][type(e).__name__] += 1
+            return None
+        finally:
+            self.latencies[operation].append(time.perf_counter() - started)
+        if response.status_code not in expected:
+            self.errors[operation][str(response.status_code)] += 1
+            return None
+        return response
+
+    def report(self) -> Dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        operations = {}
+        for operation, latencies in sorted(self.latencies.items()):
+            values = np.array(latencies) * 1000
+            errors = sum(self.errors[operation].values())
+            operations[operation] = {
+                "requests": len(latencies),
+                "errors": errors,
+                "error_rate": errors / len(latencies),
+                "error_kinds": dict(self.errors[operation]),
+                "throughput_rps": len(latencies) / elapsed,
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "p99_ms": float(np.percentile(values, 99)),
+                "max_ms": float(values.max()),
+            }
+        total = sum(op["requests"] for op in operations.values())
+        errors = sum(op["errors"] for op in operations.values())
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "errors": errors,
+            "error_rate": errors / total if total else 0.0,
+            "throughput_rps": total / elapsed if elapsed else 0.0,
+            "operations": operations,
+        }
+
+
+def pick_message(rng: random.Random) -> str:
+    weights = [weight for weight, _ in MESSAGES]
+    template = rng.choices([text for _, text in MESSAGES], weights)[0]
+    return template.replace("{order}", str(rng.randint(1, 125000)))
+
+
+def session_turns(rng: random.Random, mean: float, cap: int) -> int:
+    """Geometric session length with the given mean, at least one turn"""
+    p = 1 / max(mean, 1)
+    turns = 1
+    while turns < cap and rng.random() > p:
+        turns += 1
+    return turns
+
+
+async def run_session(client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, user_id: str, args):
+    await recorder.call("summaries", client.get(f"/api/conversations/user/{user_id}/summaries"))
+
+    conversation_id, since, etag = None, 0, None
+    for _ in range(session_turns(rng, args.mean_turns, args.max_turns)):
+        params = {"user_message": pick_message(rng), "user_id": user_id, "since": since}
+        if conversation_id:
+            params["conversation_id"] = conversation_id
+        response = await recorder.call("chat", client.post("/api/chat", params=params))
+        if response is not None:
+            body = response.json()
+            conversation_id = body.get("_id") or body.get("id") or conversation_id
+            since = body.get("message_count", since)
+            etag = response.headers.get("ETag", etag)
+
+        if conversation_id and rng.random() < args.reload_rate:
+            headers = {"If-None-Match": etag} if etag else {}
+            await recorder.call(
+                "conversation",
+                client.get(f"/api/conversations/{conversation_id}", headers=headers),
+                expected=(200, 304)
+            )
+        await asyncio.sleep(rng.expovariate(1000 / args.think_ms) if args.think_ms > 0 else 0)
+
+    if conversation_id:
+        await recorder.call("end", client.put(f"/api/conversations/{conversation_id}/end"))
+
+
+async def virtual_user(index: int, client: httpx.AsyncClient, recorder: Recorder, deadline: float, args):
+    rng = random.Random(None if args.seed is None else args.seed + index)
+    await asyncio.sleep(args.ramp_up * index / max(args.users, 1))
+    user_id = str(ObjectId())
+    sessions = 0
+    while time.perf_counter() < deadline and (not args.sessions or sessions < args.sessions):
+        await run_session(client, recorder, rng, user_id, args)
+        sessions += 1
+
+
+async def run(args) -> Dict:
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        await asyncio.gather(*(
+            virtual_user(index, client, recorder, deadline, args) for index in range(args.users)
+        ))
+    recorder.finished = time.perf_counter()
+    return recorder.report()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the chat API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds before users stop starting sessions")
+    parser.add_argument("--sessions", type=int, default=0, help="Sessions per user (0: until --duration)")
+    parser.add_argument("--mean-turns", type=float, default=6)
+    parser.add_argument("--max-turns", type=int, default=30)
+    parser.add_argument("--think-ms", type=float, default=1000, help="Mean pause between turns")
+    parser.add_argument("--reload-rate", type=float, default=0.2,
+                        help="Chance per turn of revalidating the conversation")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Seconds over which users start")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    header = (
+        f"{'operation':<14}{'requests':>9}{'errors':>8}{'err %':>7}{'req/s':>8}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for operation, stats in report["operations"].items():
+        print(
+            f"{operation:<14}{stats['requests']:>9,}{stats['errors']:>8,}"
+            f"{stats['error_rate'] * 100:>7.1f}{stats['throughput_rps']:>8.1f}"
+            f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}"
+        )
+        if stats["error_kinds"]:
+            print(f"{'':<14}errors: {stats['error_kinds']}")
+    print("-" * len(header))
+    print(
+        f"{report['requests']:,} requests in {report['elapsed_s']:.1f} s: "
+        f"{report['throughput_rps']:.1f} req/s, {report['error_rate'] * 100:.2f}% errors"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Per-response CPU time of Conversation serialization
+
+Compares the validated path (Conversation(**doc), FastAPI's response_model
+re-validation and jsonable_encoder, then JSONResponse) with the trusted
+path (construct_from and TrustedJSONResponse) for conversations of 10, 100
+and 1,000 messages. Documents are round-tripped through BSON first, so
+both paths see exactly what Motor returns. Both outputs are checked to
+decode to the same JSON.
+
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --messages 10 100 1000 10000 --repeat 200
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+import bson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models.conversation import Conversation
+from services.chat_service import trusted_conversation
+from utils.serialization import TrustedJSONResponse
+
+RESPONSE_FIELD = create_response_field(name="Response_read_conversation", type_=Conversation)
+
+
+def conversation_document(messages: int) -> dict:
+    """A conversation as find_conversation_with_messages returns it"""
+    started = datetime(2024, 5, 1, 12, 0, 0, 123000)
+    document = {
+        "_id": ObjectId(),
+        "user_id": ObjectId(),
+        "session_id": f"session_{started.timestamp()}",
+        "created_at": started,
+        "updated_at": started + timedelta(seconds=30 * messages),
+        "message_count": messages,
+        "summary": None,
+        "summary_seq": 0,
+        "is_active": True,
+        "messages": [
+            {
+                "text": f"Message {seq}: where is my order #{1000 + seq}? It was due last week.",
+                "sender": "user" if seq % 2 == 0 else "bot",
+                "timestamp": started + timedelta(seconds=30 * seq),
+                "metadata": {} if seq % 2 == 0 else {"route": "llm"},
+                "seq": seq,
+            }
+            for seq in range(messages)
+        ],
+    }
+    return bson.decode(bson.encode(document))
+
+
+def validated_response(loop, document: dict) -> bytes:
+    conversation = Conversation(**document)
+    content = loop.run_until_complete(serialize_response(
+        field=RESPONSE_FIELD, response_content=conversation, is_coroutine=True
+    ))
+    return JSONResponse(content).body
+
+
+def trusted_response(loop, document: dict) -> bytes:
+    return TrustedJSONResponse(trusted_conversation(document)).body
+
+
+def cpu_per_call(func: Callable[[], bytes], repeat: int) -> float:
+    """Mean CPU seconds of func over repeat calls, after a warm-up call"""
+    func()
+    started = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - started) / repeat
+
+
+def run(sizes: List[int], repeat: int) -> List[Dict]:
+    loop = asyncio.new_event_loop()
+    results = []
+    try:
+        for size in sizes:
+            document = conversation_document(size)
+            validated = validated_response(loop, document)
+            trusted = trusted_response(loop, document)
+            if json.loads(validated) != json.loads(trusted):
+                raise AssertionError(f"Responses differ for {size} messages")
+            # Keep large conversations from dominating the run time
+            calls = max(5, repeat * 10 // max(size, 10))
+            validated_cpu = cpu_per_call(lambda: validated_response(loop, document), calls)
+            trusted_cpu = cpu_per_call(lambda: trusted_response(loop, document), calls)
+            results.append({
+                "messages": size,
+                "bytes": len(trusted),
+                "validated_us": validated_cpu * 1e6,
+                "trusted_us": trusted_cpu * 1e6,
+                "speedup": validated_cpu / trusted_cpu if trusted_cpu else float("inf"),
+            })
+    finally:
+        loop.close()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Conversation response serialization")
+    parser.add_argument("--messages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=500,
+                        help="Calls for a 10-message conversation; scaled down for larger ones")
+    args = parser.parse_args(argv)
+
+    header = f"{'messages':>9}{'bytes':>11}{'validated':>14}{'trusted':>12}{'speedup':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in run(args.messages, args.repeat):
+        print(
+            f"{result['messages']:>9,}{result['bytes']:>11,}"
+            f"{result['validated_us']:>11,.0f} us{result['trusted_us']:>9,.0f} us"
+            f"{result['speedup']:>8.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,21 @@
 import os
 import csv
+import argparse
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from pymongo import MongoClient
 from dotenv import load_dotenv
-import pandas as pd
 from datetime import datetime
 from tqdm import tqdm  # for progress bars
+from services.product_sales import rebuild_product_sales_sync
+from services.inventory_availability import rebuild_inventory_availability_sync
+from utils.bulk_loader import (
+    LOADER_BATCH_BYTES, LOADER_BLOCK_BYTES, LOADER_PARSE_WORKERS,
+    LOADER_MAX_SHRINK, LOADER_TABLE_WORKERS, LOADER_WRITE_CONCERN, LOADER_WRITERS,
+    REQUIRED, STAGING_SUFFIX, Checkpoint, LoaderOptions, TableSpec, create_indexes,
+    delete_missing, parser_pool, run_pipeline, swap_collection, sync_batch,
+    validate_staged
+)
 
 # Load environment variables
 load_dotenv()
@@ -36,8 +47,9 @@ def chunk_insert(collection, data, chunk_size=1000):
 def load_distribution_centers(db, csv_file):
     """Load distribution centers data from CSV"""
     print("\n📦 Loading distribution centers...")
-    collection = db['distribution_centers']
-    collection.delete_many({})
+    # Built beside the live collection and swapped in once indexed
+    collection = db['distribution_centers' + STAGING_SUFFIX]
+    collection.drop()
     
     with open(csv_file, mode='r') as file:
         reader = csv.DictReader(file)
@@ -71,201 +83,260 @@ def load_distribution_centers(db, csv_file):
             collection.create_index([('location', '2dsphere')])
             collection.create_index('id', unique=True)
             print("🔑 Created geospatial and ID indexes")
+            swap_collection(db, collection.name, 'distribution_centers')
 
-def load_products(db, csv_file):
+# Table layouts: (column, kind, default). REQUIRED columns reject the row
+# when missing or malformed; optional columns fall back to their default.
+PRODUCTS = TableSpec(
+    'products', 'products',
+    fields=[
+        ('id', 'int', REQUIRED),
+        ('cost', 'float', None),
+        ('category', 'str', None),
+        ('name', 'str', None),
+        ('brand', 'str', None),
+        ('retail_price', 'float', None),
+        ('department', 'str', None),
+        ('sku', 'str', None),
+        ('distribution_center_id', 'int', REQUIRED),
+    ],
+    # updated_at: newest sync write, part of the catalog version
+    indexes=[('id', {'unique': True}), ('distribution_center_id', {}), ('category', {}), ('updated_at', {})]
+)
+
+USERS = TableSpec(
+    'users', 'users',
+    fields=[
+        ('id', 'int', REQUIRED),
+        ('name', 'str', ''),
+        ('email', 'str', ''),
+    ],
+    indexes=[('id', {'unique': True}), ('email', {})]
+)
+
+# created_at comes from the CSV when present, otherwise the load time
+ORDERS = TableSpec(
+    'orders', 'orders',
+    fields=[
+        ('id', 'int', REQUIRED),
+        ('user_id', 'int', REQUIRED),
+        ('status', 'str', 'pending'),
+        ('total_amount', 'float', 0.0),
+        ('created_at', 'datetime', None),
+    ],
+    indexes=[('id', {'unique': True}), ('user_id', {}), ('status', {})]
+)
+
+ORDER_ITEMS = TableSpec(
+    'order_items', 'order items',
+    fields=[
+        ('id', 'int', REQUIRED),
+        ('order_id', 'int', REQUIRED),
+        ('product_id', 'int', REQUIRED),
+        ('quantity', 'int', 1),
+        ('price', 'float', 0.0),
+    ],
+    indexes=[('id', {'unique': True}), ('order_id', {}), ('product_id', {})]
+)
+
+INVENTORY_ITEMS = TableSpec(
+    'inventory_items', 'inventory items',
+    fields=[
+        ('id', 'int', REQUIRED),
+        ('product_id', 'int', REQUIRED),
+        ('distribution_center_id', 'int', REQUIRED),
+        # Exports without a quantity column list one row per physical item
+        ('quantity', 'int', 1),
+        ('status', 'str', 'available'),
+    ],
+    indexes=[('id', {'unique': True}), ('product_id', {}), ('distribution_center_id', {})],
+    timestamps=('created_at', 'updated_at')
+)
+
+TABLES = [PRODUCTS, USERS, ORDERS, ORDER_ITEMS, INVENTORY_ITEMS]
+
+def load_table(db, spec, csv_file, options=None, executor=None, staged=True):
+    """
+    Replaces a collection with the contents of a CSV
+    Args:
+        db: pymongo database
+        spec: TableSpec describing the CSV
+        csv_file: Path to the CSV
+        options: LoaderOptions (defaults when omitted)
+        executor: Parser process pool; a private one is created when omitted
+        staged: Load into a shadow collection, index and validate it, then
+            rename it over the live one; otherwise truncate and load in place
+    Returns:
+        TableReport with throughput and stage timings
+    """
+    options = options or LoaderOptions()
+    print(f"\n⏳ Loading {spec.label}...")
+    if staged:
+        # Readers keep the old, fully indexed collection until the swap
+        collection = db[spec.name + STAGING_SUFFIX]
+        collection.drop()
+    else:
+        collection = db[spec.name]
+        collection.delete_many({})
+
+    if executor is None:
+        with parser_pool(options.parse_workers) as pool:
+            report = run_pipeline(collection, csv_file, spec, options, pool)
+    else:
+        report = run_pipeline(collection, csv_file, spec, options, executor)
+    print(f"✅ Inserted {report.counts.get('inserted', 0)} {spec.label}")
+    if report.rejected:
+        print(f"⚠️ Rejected {report.rejected} {spec.label} (see {os.path.splitext(csv_file)[0]}.rejects.csv)")
+
+    # Indexes are built once, after the bulk insert
+    create_indexes(collection, spec, report)
+    print(f"🔑 Created {spec.label} indexes")
+
+    if staged:
+        if report.error:
+            raise ValueError(f"Staging {spec.label} failed: {report.error}")
+        staged_rows = validate_staged(collection, db[spec.name], report, options.max_shrink)
+        swap_collection(db, collection.name, spec.name)
+        print(f"🔁 Swapped in {staged_rows} {spec.label}")
+    return report
+
+def sync_table(db, spec, csv_file, options=None, executor=None, restart=False):
+    """
+    Brings a collection in line with a CSV without reloading it: rows are
+    diffed against their stored row_hash, only new and changed rows are
+    upserted, rows missing from the CSV are deleted, and progress is
+    checkpointed so an interrupted sync resumes where it stopped
+    Args:
+        db: pymongo database
+        spec: TableSpec describing the CSV
+        csv_file: Path to the CSV
+        options: LoaderOptions (defaults when omitted)
+        executor: Parser process pool; a private one is created when omitted
+        restart: Ignore any checkpoint and diff the whole file
+    Returns:
+        TableReport with throughput, stage timings and change counts
+    """
+    options = options or LoaderOptions()
+    print(f"\n🔄 Syncing {spec.label}...")
+    collection = db[spec.name]
+    # Rows are looked up and upserted by id, so the indexes must exist first
+    create_indexes(collection, spec)
+
+    checkpoint = Checkpoint(db, spec.name, csv_file)
+    start = None if restart else checkpoint.load()
+    if start:
+        print(f"↩️ Resuming {spec.label} from byte {start}")
+
+    def run(pool):
+        return run_pipeline(
+            collection, csv_file, spec, options, pool,
+            write_batch=partial(sync_batch, timestamps=spec.timestamps),
+            timestamps=(),
+            start=start,
+            on_commit=checkpoint.commit
+        )
+
+    if executor is None:
+        with parser_pool(options.parse_workers) as pool:
+            report = run(pool)
+    else:
+        report = run(executor)
+    if report.error:
+        print(f"❌ Sync of {spec.label} stopped; rerun to resume from the last checkpoint")
+        return report
+
+    report.counts['deleted'] = delete_missing(collection, csv_file)
+    checkpoint.clear()
+    report.finish()
+    print(
+        f"✅ {spec.label}: {report.counts.get('inserted', 0)} inserted, "
+        f"{report.counts.get('updated', 0)} updated, {report.counts.get('unchanged', 0)} unchanged, "
+        f"{report.counts['deleted']} deleted"
+    )
+    if report.rejected:
+        print(f"⚠️ Rejected {report.rejected} {spec.label} (see {os.path.splitext(csv_file)[0]}.rejects.csv)")
+    return report
+
+def load_products(db, csv_file, options=None, executor=None):
     """Load products data from CSV"""
-    print("\n👕 Loading products...")
-    collection = db['products']
-    collection.delete_many({})
-    
-    # Read CSV in chunks for large files
-    chunksize = 10**5
-    total_rows = 0
-    
-    for chunk in tqdm(pd.read_csv(csv_file, chunksize=chunksize), desc="Processing products"):
-        products = []
-        for _, row in chunk.iterrows():
-            try:
-                product = {
-                    'id': int(row['id']),
-                    'cost': float(row['cost']),
-                    'category': row['category'],
-                    'name': row['name'],
-                    'brand': row['brand'],
-                    'retail_price': float(row['retail_price']),
-                    'department': row['department'],
-                    'sku': row['sku'],
-                    'distribution_center_id': int(row['distribution_center_id']),
-                    'created_at': datetime.utcnow()
-                }
-                products.append(product)
-            except Exception as e:
-                print(f"⚠️ Error processing product {row.get('id')}: {e}")
-        
-        if products:
-            chunk_insert(collection, products)
-            total_rows += len(products)
-    
-    print(f"✅ Inserted {total_rows} products")
-    
-    # Create indexes
-    collection.create_index('id', unique=True)
-    collection.create_index('distribution_center_id')
-    collection.create_index('category')
-    print("🔑 Created product indexes")
+    return load_table(db, PRODUCTS, csv_file, options, executor)
 
-def load_users(db, csv_file):
+def load_users(db, csv_file, options=None, executor=None):
     """Load users data from CSV"""
-    print("\n👤 Loading users...")
-    collection = db['users']
-    collection.delete_many({})
-    
-    # Assuming columns: id, name, email, etc.
-    chunksize = 10**5
-    total_rows = 0
-    
-    for chunk in tqdm(pd.read_csv(csv_file, chunksize=chunksize), desc="Processing users"):
-        users = []
-        for _, row in chunk.iterrows():
-            try:
-                user = {
-                    'id': int(row['id']),
-                    'name': row.get('name', ''),
-                    'email': row.get('email', ''),
-                    'created_at': datetime.utcnow()
-                    # Add other fields as needed
-                }
-                users.append(user)
-            except Exception as e:
-                print(f"⚠️ Error processing user {row.get('id')}: {e}")
-        
-        if users:
-            chunk_insert(collection, users)
-            total_rows += len(users)
-    
-    print(f"✅ Inserted {total_rows} users")
-    
-    # Create indexes
-    collection.create_index('id', unique=True)
-    collection.create_index('email')
-    print("🔑 Created user indexes")
+    return load_table(db, USERS, csv_file, options, executor)
 
-def load_orders(db, csv_file):
+def load_orders(db, csv_file, options=None, executor=None):
     """Load orders data from CSV"""
-    print("\n📝 Loading orders...")
-    collection = db['orders']
-    collection.delete_many({})
-    
-    # Assuming columns: id, user_id, status, etc.
-    chunksize = 10**5
-    total_rows = 0
-    
-    for chunk in tqdm(pd.read_csv(csv_file, chunksize=chunksize), desc="Processing orders"):
-        orders = []
-        for _, row in chunk.iterrows():
-            try:
-                order = {
-                    'id': int(row['id']),
-                    'user_id': int(row['user_id']),
-                    'status': row.get('status', 'pending'),
-                    'total_amount': float(row.get('total_amount', 0)),
-                    'created_at': datetime.strptime(row['created_at'], '%Y-%m-%d %H:%M:%S') if 'created_at' in row else datetime.utcnow()
-                    # Add other fields as needed
-                }
-                orders.append(order)
-            except Exception as e:
-                print(f"⚠️ Error processing order {row.get('id')}: {e}")
-        
-        if orders:
-            chunk_insert(collection, orders)
-            total_rows += len(orders)
-    
-    print(f"✅ Inserted {total_rows} orders")
-    
-    # Create indexes
-    collection.create_index('id', unique=True)
-    collection.create_index('user_id')
-    collection.create_index('status')
-    print("🔑 Created order indexes")
+    return load_table(db, ORDERS, csv_file, options, executor)
 
-def load_order_items(db, csv_file):
+def load_order_items(db, csv_file, options=None, executor=None):
     """Load order items data from CSV"""
-    print("\n🛒 Loading order items...")
-    collection = db['order_items']
-    collection.delete_many({})
-    
-    # Assuming columns: id, order_id, product_id, quantity, etc.
-    chunksize = 10**5
-    total_rows = 0
-    
-    for chunk in tqdm(pd.read_csv(csv_file, chunksize=chunksize), desc="Processing order items"):
-        items = []
-        for _, row in chunk.iterrows():
-            try:
-                item = {
-                    'id': int(row['id']),
-                    'order_id': int(row['order_id']),
-                    'product_id': int(row['product_id']),
-                    'quantity': int(row.get('quantity', 1)),
-                    'price': float(row.get('price', 0)),
-                    'created_at': datetime.utcnow()
-                }
-                items.append(item)
-            except Exception as e:
-                print(f"⚠️ Error processing order item {row.get('id')}: {e}")
-        
-        if items:
-            chunk_insert(collection, items)
-            total_rows += len(items)
-    
-    print(f"✅ Inserted {total_rows} order items")
-    
-    # Create indexes
-    collection.create_index('id', unique=True)
-    collection.create_index('order_id')
-    collection.create_index('product_id')
-    print("🔑 Created order item indexes")
+    return load_table(db, ORDER_ITEMS, csv_file, options, executor)
 
-def load_inventory_items(db, csv_file):
+def load_inventory_items(db, csv_file, options=None, executor=None):
     """Load inventory items data from CSV"""
-    print("\n📊 Loading inventory items...")
-    collection = db['inventory_items']
-    collection.delete_many({})
-    
-    # Assuming columns: id, product_id, distribution_center_id, quantity, etc.
-    chunksize = 10**5
-    total_rows = 0
-    
-    for chunk in tqdm(pd.read_csv(csv_file, chunksize=chunksize), desc="Processing inventory"):
-        items = []
-        for _, row in chunk.iterrows():
-            try:
-                item = {
-                    'id': int(row['id']),
-                    'product_id': int(row['product_id']),
-                    'distribution_center_id': int(row['distribution_center_id']),
-                    'quantity': int(row.get('quantity', 0)),
-                    'status': row.get('status', 'available'),
-                    'created_at': datetime.utcnow(),
-                    'updated_at': datetime.utcnow()
-                }
-                items.append(item)
-            except Exception as e:
-                print(f"⚠️ Error processing inventory item {row.get('id')}: {e}")
-        
-        if items:
-            chunk_insert(collection, items)
-            total_rows += len(items)
-    
-    print(f"✅ Inserted {total_rows} inventory items")
-    
-    # Create indexe
-    collection.create_index('id', unique=True)
-    collection.create_index('product_id')
-    collection.create_index('distribution_center_id')
-    print("🔑 Created inventory indexes")
+    return load_table(db, INVENTORY_ITEMS, csv_file, options, executor)
+
+def add_loader_arguments(parser):
+    """Pipeline and mode flags, shared with benchmarks/ingest.py"""
+    parser.add_argument('--parse-workers', type=int, default=LOADER_PARSE_WORKERS,
+                        help="Parser processes shared by all tables")
+    parser.add_argument('--writers', type=int, default=LOADER_WRITERS,
+                        help="Concurrent insert workers per table")
+    parser.add_argument('--table-workers', type=int, default=LOADER_TABLE_WORKERS,
+                        help="Tables loaded in parallel")
+    parser.add_argument('--block-bytes', type=int, default=LOADER_BLOCK_BYTES,
+                        help="CSV bytes per parser task")
+    parser.add_argument('--batch-bytes', type=int, default=LOADER_BATCH_BYTES,
+                        help="BSON bytes per insert_many batch")
+    parser.add_argument('--write-concern', default=LOADER_WRITE_CONCERN,
+                        help='Write concern "w" value: 0, 1, majority, ...')
+    parser.add_argument('--journal', action='store_true', default=None,
+                        help="Wait for the journal on every batch")
+    parser.add_argument('--mode', choices=['stage', 'replace', 'sync'], default='stage',
+                        help="stage: load a shadow collection and swap it in; "
+                             "replace: truncate and reload in place; sync: write only changed rows")
+    parser.add_argument('--max-shrink', type=float, default=LOADER_MAX_SHRINK,
+                        help="In stage mode, refuse swaps that drop more than this fraction of rows")
+    parser.add_argument('--restart', action='store_true',
+                        help="In sync mode, ignore checkpoints of an interrupted run")
+
+def options_from_args(args):
+    return LoaderOptions(
+        parse_workers=args.parse_workers,
+        writers=args.writers,
+        table_workers=args.table_workers,
+        block_bytes=args.block_bytes,
+        batch_bytes=args.batch_bytes,
+        write_concern=args.write_concern,
+        journal=args.journal,
+        max_shrink=args.max_shrink
+    )
+
+def table_runner(args):
+    """Returns the load function for the selected --mode"""
+    if args.mode == 'sync':
+        return partial(sync_table, restart=args.restart)
+    return partial(load_table, staged=args.mode == 'stage')
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load the e-commerce CSVs into MongoDB")
+    parser.add_argument('--data-dir', default='./data', help="Directory holding the CSV files")
+    parser.add_argument('--tables', nargs='+', choices=[spec.name for spec in TABLES],
+                        help="Only load these tables")
+    add_loader_arguments(parser)
+    return parser.parse_args(argv)
+
+def table_changed(reports, spec):
+    """Whether the run inserted, updated or deleted rows of a table"""
+    report = next((report for report in reports if report.name == spec.name), None)
+    return report is not None and any(
+        report.counts.get(key) for key in ('inserted', 'updated', 'deleted')
+    )
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = options_from_args(args)
     print("🚀 Starting MongoDB Data Ingestion")
     
     # Connect to MongoDB
@@ -273,27 +344,44 @@ def main():
     
     # Load all data files
     try:
-        # Adjust file paths as needed
-        data_dir = './data'
+        data_dir = args.data_dir
         
         # Load each file if it exists
-        if os.path.exists(f'{data_dir}/distribution_centers.csv'):
+        if not args.tables and os.path.exists(f'{data_dir}/distribution_centers.csv'):
             load_distribution_centers(db, f'{data_dir}/distribution_centers.csv')
         
-        if os.path.exists(f'{data_dir}/products.csv'):
-            load_products(db, f'{data_dir}/products.csv')
-        
-        if os.path.exists(f'{data_dir}/users.csv'):
-            load_users(db, f'{data_dir}/users.csv')
-        
-        if os.path.exists(f'{data_dir}/orders.csv'):
-            load_orders(db, f'{data_dir}/orders.csv')
+        specs = [
+            spec for spec in TABLES
+            if (not args.tables or spec.name in args.tables)
+            and os.path.exists(f'{data_dir}/{spec.name}.csv')
+        ]
+        reports = []
+        # Tables are independent: load them side by side, sharing one parser pool
+        with parser_pool(options.parse_workers) as executor, \
+                ThreadPoolExecutor(max_workers=options.table_workers) as tables:
+            run_table = table_runner(args)
+            futures = {
+                spec.name: tables.submit(run_table, db, spec, f'{data_dir}/{spec.name}.csv', options, executor)
+                for spec in specs
+            }
+            for name, future in futures.items():
+                try:
+                    reports.append(future.result())
+                except Exception as e:
+                    print(f"❌ Error loading {name}: {e}")
         
-        if os.path.exists(f'{data_dir}/order_items.csv'):
-            load_order_items(db, f'{data_dir}/order_items.csv')
+        if table_changed(reports, ORDER_ITEMS):
+            print("\n📈 Building product_sales view...")
+            rebuild_product_sales_sync(db)
+            print("✅ product_sales view built")
+        if table_changed(reports, INVENTORY_ITEMS):
+            print("\n📦 Counting available inventory...")
+            rebuild_inventory_availability_sync(db)
+            print("✅ inventory_availability counters built")
         
-        if os.path.exists(f'{data_dir}/inventory_items.csv'):
-            load_inventory_items(db, f'{data_dir}/inventory_items.csv')
+        print("\n📊 Throughput")
+        for report in reports:
+            print(f"   {report.summary()}")
         
         print("\n🎉 All data loaded successfully!")
         
@@ -303,4 +391,4 @@ def main():
         print("\n🏁 Data ingestion process completed")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
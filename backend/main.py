@@ -1,7 +1,31 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from routers import users, conversations, chat
-from utils.database import init_db
+from routers import users, conversations, chat, distribution_centers, inventory
+from utils.database import init_db, close_db, get_db
+from services.llm_client import get_llm_client, close_llm_client
+from services.context_builder import context_builder
+from services.response_cache import response_cache
+from services.query_planner import query_planner
+from services.product_sales import (
+    PRODUCT_SALES_REFRESH_SECONDS,
+    run_product_sales_refresher
+)
+from services.catalog import CATALOG_ENABLED, catalog, run_catalog_refresher
+from services.data_loader import shared_loaders
+from services.singleflight import db_flights, llm_flights
+from services.metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    MetricsMiddleware,
+    registry as metrics_registry,
+    run_loop_lag_monitor
+)
+from services.inventory_availability import apply_pending_inventory_changes
+from services.distribution_centers import (
+    DC_INDEX_ENABLED,
+    distribution_centers as distribution_center_index,
+    run_distribution_center_refresher
+)
+import asyncio
 import logging
 
 # Configure logging
@@ -27,7 +51,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Initialize database connection
 @app.on_event("startup")
@@ -39,14 +65,70 @@ async def startup_db_client():
         logger.error(f"Database connection failed: {e}")
         raise
 
+background_tasks = set()
+
+@app.on_event("startup")
+async def start_background_refreshers():
+    if PRODUCT_SALES_REFRESH_SECONDS > 0:
+        task = asyncio.create_task(run_product_sales_refresher(get_db))
+        background_tasks.add(task)
+    if CATALOG_ENABLED:
+        task = asyncio.create_task(run_catalog_refresher(get_db))
+        background_tasks.add(task)
+    if DC_INDEX_ENABLED:
+        task = asyncio.create_task(run_distribution_center_refresher(get_db))
+        background_tasks.add(task)
+    if metrics_registry.enabled:
+        task = asyncio.create_task(run_loop_lag_monitor())
+        background_tasks.add(task)
+
+@app.on_event("startup")
+async def reapply_inventory_changes():
+    # Status changes a failure left half-applied to the availability counters
+    try:
+        await apply_pending_inventory_changes(get_db())
+    except Exception as e:
+        logger.error(f"Reapplying inventory changes failed: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    for task in background_tasks:
+        task.cancel()
+    await close_llm_client()
+    close_db()
+
 # Include routers
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(conversations.router, prefix="/api/conversations", tags=["Conversations"])
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
+app.include_router(
+    distribution_centers.router,
+    prefix="/api/distribution-centers",
+    tags=["Distribution Centers"]
+)
+app.include_router(inventory.router, prefix="/api/inventory", tags=["Inventory"])
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "message": "Chatbot API is running"}
+    return {
+        "status": "healthy",
+        "message": "Chatbot API is running",
+        "llm": get_llm_client().stats(),
+        "context": context_builder.stats(),
+        "response_cache": response_cache.stats(),
+        "query_planner": query_planner.stats(),
+        "catalog": catalog.stats(),
+        "distribution_centers": distribution_center_index.stats(),
+        "data_loaders": shared_loaders.stats(),
+        "singleflight": {"llm": llm_flights.stats(), "db": db_flights.stats()}
+    }
+
+@app.get("/api/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of the process metrics"""
+    if not metrics_registry.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
 
 @app.get("/")
 async def root():
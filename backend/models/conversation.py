@@ -1,8 +1,8 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel, Field
 from bson import ObjectId
-from schemas.message import Message
+from schemas.message import Message, MessageSender
 
 class PyObjectId(ObjectId):
     @classmethod
@@ -26,6 +26,9 @@ class Conversation(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     messages: List[Message] = Field(default_factory=list)
+    message_count: int = Field(default=0)
+    summary: Optional[str] = None
+    summary_seq: int = Field(default=0)
     is_active: bool = Field(default=True)
 
     class Config:
@@ -39,4 +42,36 @@ class Conversation(BaseModel):
                 "messages": [],
                 "is_active": True
             }
-        }
\ No newline at end of file
+        }
+class ConversationDelta(Conversation):
+    """A conversation with only the messages whose seq is at least `since`"""
+    since: int
+
+class MessagePreview(BaseModel):
+    text: str
+    sender: MessageSender
+    timestamp: datetime
+
+class ConversationSummary(BaseModel):
+    """A conversation without its messages, for list views"""
+    id: PyObjectId = Field(..., alias="_id")
+    user_id: PyObjectId = Field(...)
+    session_id: str = Field(...)
+    created_at: datetime
+    updated_at: datetime
+    message_count: int = Field(default=0)
+    last_message: Optional[MessagePreview] = None
+    is_active: bool = Field(default=True)
+
+    class Config:
+        allow_population_by_field_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+class ConversationPage(BaseModel):
+    items: List[ConversationSummary]
+    # Pass back as `cursor` to fetch the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+    class Config:
+        json_encoders = {ObjectId: str}
@@ -0,0 +1,37 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+class Location(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+class NearestCenter(BaseModel):
+    id: int
+    name: str
+    latitude: float
+    longitude: float
+    distance_km: float
+    shipping_days: int
+    # Set when the lookup was restricted to centers stocking a product
+    available_quantity: Optional[int] = None
+
+class NearestCentersRequest(BaseModel):
+    locations: List[Location] = Field(..., min_items=1, max_items=100000)
+    product_id: Optional[int] = None
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "locations": [
+                    {"latitude": 40.7128, "longitude": -74.006},
+                    {"latitude": 34.0522, "longitude": -118.2437}
+                ],
+                "product_id": 13842
+            }
+        }
+
+class NearestCenterMatch(BaseModel):
+    # None when no center stocks the requested product
+    distribution_center_id: Optional[int]
+    distance_km: Optional[float]
+    shipping_days: Optional[int]
@@ -0,0 +1,19 @@
+from typing import Dict
+from pydantic import BaseModel
+
+class CenterAvailability(BaseModel):
+    items: int
+    quantity: int
+
+class ProductAvailability(BaseModel):
+    product_id: int
+    available_items: int
+    available_quantity: int
+    # Keyed by distribution center id
+    centers: Dict[int, CenterAvailability]
+
+class InventoryItemStatus(BaseModel):
+    product_id: int
+    distribution_center_id: int
+    quantity: int
+    status: str
@@ -1,43 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException
-from models.conversation import Conversation
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from models.conversation import Conversation, ConversationDelta
 from schemas.message import Message, MessageSender
 from services.chat_service import (
     get_conversation,
-    add_message_to_conversation,
-    create_conversation
+    commit_chat_turn,
+    conversation_delta,
+    conversation_etag
 )
 from services.groq_services import GroqService
+from services.context_builder import context_builder
+from services.ai_service import generate_fast_path_response
+from services.metrics import stage
 from utils.database import get_db
+from utils.serialization import TrustedJSONResponse
 from bson import ObjectId
-from typing import Optional
+from typing import Optional, Union
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 groq_service = GroqService()
 
-@router.post("", response_model=Conversation)
+@router.post("", response_model=Union[ConversationDelta, Conversation])
 async def chat(
     user_message: str,
     user_id: str,
     conversation_id: Optional[str] = None,
+    since: Optional[int] = Query(None, ge=0),
     db=Depends(get_db)
 ):
     """
-    Primary chat endpoint with LLM integration
+    Primary chat endpoint with LLM integration.
+    Pass `since` (the number of messages already held, i.e. the next seq)
+    to receive only the new messages plus conversation metadata instead of
+    the whole history.
     """
     # Validate user_id
     if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=400, detail="Invalid user ID")
     
-    # Get or create conversation
-    if conversation_id:
-        if not ObjectId.is_valid(conversation_id):
-            raise HTTPException(status_code=400, detail="Invalid conversation ID")
-        conversation = await get_conversation(db, conversation_id)
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-    else:
-        conversation = await create_conversation(db, user_id)
-        conversation_id = str(conversation.id)
+    # With `since` only the messages the client lacks and those the
+    # summary does not cover yet are needed, not the whole history
+    with stage("load_conversation"):
+        conversation, conversation_id, is_new = await _resolve_conversation(
+            db, conversation_id, since
+        )
+    held = conversation.message_count if conversation else 0
+    if since is not None and since > held:
+        # A stale client; an empty delta would silently drop this turn
+        raise HTTPException(
+            status_code=400,
+            detail=f"since ({since}) is beyond the conversation's {held} messages"
+        )
+    history = conversation.messages if conversation else []
     
     # Create user message
     user_msg = Message(
@@ -45,26 +64,173 @@ async def chat(
         sender=MessageSender.USER
     )
     
-    # Add user message to conversation
-    conversation = await add_message_to_conversation(
-        db, conversation_id, user_msg
-    )
+    # Keep the prompt within the token budget
+    with stage("context_window"):
+        window = _context_window(conversation, history + [user_msg])
     
-    # Generate AI response with Groq
-    ai_response = await groq_service.generate_response(
-        user_message,
-        conversation.messages
-    )
+    # Answer high-confidence intents directly, otherwise ask Groq
+    with stage("fast_path"):
+        fast_path = await generate_fast_path_response(
+            user_message, groq_service.answer_top_products, user_id
+        )
+    if fast_path:
+        ai_response, match = fast_path
+        metadata = _fast_path_metadata(match)
+    else:
+        ai_response = await groq_service.generate_response(
+            user_message,
+            window.messages,
+            summary=window.summary,
+            user_id=user_id
+        )
+        metadata = {"route": "llm"}
     
     # Create AI message
     ai_msg = Message(
         text=ai_response,
-        sender=MessageSender.BOT
+        sender=MessageSender.BOT,
+        metadata=metadata
     )
     
-    # Add AI response to conversation
-    conversation = await add_message_to_conversation(
-        db, conversation_id, ai_msg
+    # Persist both messages (and create the conversation if needed) at once
+    with stage("persist"):
+        conversation = await commit_chat_turn(
+            db, user_id, conversation_id, [user_msg, ai_msg],
+            history=history, create=is_new
+        )
+    context_builder.schedule_summary_update(
+        db, conversation_id, window, groq_service.summarize
     )
     
-    return conversation
\ No newline at end of file
+    headers = {"ETag": conversation_etag(conversation)}
+    # The response body is encoded when the response is constructed
+    with stage("serialize"):
+        if since is not None:
+            return TrustedJSONResponse(conversation_delta(conversation, since), headers=headers)
+        return TrustedJSONResponse(conversation, headers=headers)
+
+@router.post("/stream")
+async def chat_stream(
+    user_message: str,
+    user_id: str,
+    conversation_id: Optional[str] = None,
+    db=Depends(get_db)
+):
+    """
+    Streaming chat endpoint (Server-Sent Events).
+    Emits a `conversation` event, one `token` event per completion chunk and
+    a final `done` event once the bot message has been persisted.
+    """
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+
+    # Only the messages the summary does not cover can enter the window
+    conversation, conversation_id, is_new = await _resolve_conversation(
+        db, conversation_id, unsummarized=True
+    )
+    history = conversation.messages if conversation else []
+
+    user_msg = Message(
+        text=user_message,
+        sender=MessageSender.USER
+    )
+    window = _context_window(conversation, history + [user_msg])
+
+    async def event_stream():
+        yield _sse_event("conversation", {"conversation_id": conversation_id})
+
+        chunks = []
+        fast_path = await generate_fast_path_response(
+            user_message, groq_service.answer_top_products, user_id
+        )
+        if fast_path:
+            text, match = fast_path
+            metadata = _fast_path_metadata(match)
+            chunks.append(text)
+            yield _sse_event("token", {"text": text})
+        else:
+            metadata = {"route": "llm"}
+            async for chunk in groq_service.stream_response(
+                user_message,
+                window.messages,
+                summary=window.summary,
+                user_id=user_id
+            ):
+                chunks.append(chunk)
+                yield _sse_event("token", {"text": chunk})
+
+        # Persist the turn once the stream has finished
+        ai_msg = Message(
+            text="".join(chunks),
+            sender=MessageSender.BOT,
+            metadata=metadata
+        )
+        try:
+            conversation = await commit_chat_turn(
+                db, user_id, conversation_id, [user_msg, ai_msg],
+                history=[], create=is_new
+            )
+        except Exception as e:
+            logger.error(f"Error persisting streamed response: {e}")
+            yield _sse_event("error", {"detail": "Failed to save response"})
+            return
+        context_builder.schedule_summary_update(
+            db, conversation_id, window, groq_service.summarize
+        )
+
+        yield _sse_event("done", {
+            "conversation_id": conversation_id,
+            "message_count": conversation.message_count,
+            "message": jsonable_encoder(conversation.messages[-1])
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _resolve_conversation(
+    db,
+    conversation_id: Optional[str],
+    since: Optional[int] = None,
+    unsummarized: bool = False
+):
+    """
+    Loads the requested conversation and its history in one round trip;
+    from min(summary_seq, since) on when `since` is given, from summary_seq
+    on when only `unsummarized` messages are needed.
+    New conversations get a pre-generated ID and are created when the turn
+    is committed.
+    """
+    if not conversation_id:
+        return None, str(ObjectId()), True
+    if not ObjectId.is_valid(conversation_id):
+        raise HTTPException(status_code=400, detail="Invalid conversation ID")
+    conversation = await get_conversation(
+        db, conversation_id, since=since, unsummarized=unsummarized
+    )
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation, conversation_id, False
+
+def _context_window(conversation: Optional[Conversation], history):
+    """Builds the token-budgeted context for a turn"""
+    if conversation is None:
+        return context_builder.build(history)
+    return context_builder.build(
+        history,
+        summary=conversation.summary,
+        summary_seq=conversation.summary_seq
+    )
+
+def _fast_path_metadata(match) -> dict:
+    return {
+        "route": "fast_path",
+        "intent": match.intent,
+        "confidence": match.confidence
+    }
+
+def _sse_event(event: str, data: dict) -> str:
+    """Formats a single Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
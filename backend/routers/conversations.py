@@ -1,31 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
-from models.conversation import Conversation
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from typing import List, Optional
+from models.conversation import Conversation, ConversationPage
 from schemas.message import Message
 from services.chat_service import (
     create_conversation,
     get_conversation,
+    get_conversation_etag,
+    conversation_etag,
     add_message_to_conversation,
     get_user_conversations,
+    get_user_conversation_summaries,
+    get_conversation_messages,
     end_conversation
 )
 from utils.database import get_db
+from utils.serialization import TrustedJSONResponse
 from bson import ObjectId
 
 router = APIRouter()
 
 @router.post("/", response_model=Conversation)
 async def start_conversation(user_id: str, db=Depends(get_db)):
-    return await create_conversation(db, user_id)
+    return TrustedJSONResponse(await create_conversation(db, user_id))
 
 @router.get("/{conversation_id}", response_model=Conversation)
-async def read_conversation(conversation_id: str, db=Depends(get_db)):
+async def read_conversation(
+    conversation_id: str,
+    if_none_match: Optional[str] = Header(None),
+    db=Depends(get_db)
+):
+    """
+    Returns the conversation with an ETag. Send it back as If-None-Match to
+    get a 304 without the messages being read when nothing has changed.
+    """
     if not ObjectId.is_valid(conversation_id):
         raise HTTPException(status_code=400, detail="Invalid conversation ID")
+    if if_none_match:
+        etag = await get_conversation_etag(db, conversation_id)
+        if etag and etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
     conversation = await get_conversation(db, conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return conversation
+    return TrustedJSONResponse(conversation, headers={"ETag": conversation_etag(conversation, start=0)})
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison against an If-None-Match header value"""
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+@router.get("/{conversation_id}/messages", response_model=List[Message])
+async def read_messages(
+    conversation_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    before: Optional[int] = Query(None, ge=0),
+    db=Depends(get_db)
+):
+    """
+    Pages backwards through a conversation: pass the `seq` of the oldest
+    message received as `before` to fetch the previous page.
+    """
+    if not ObjectId.is_valid(conversation_id):
+        raise HTTPException(status_code=400, detail="Invalid conversation ID")
+    return TrustedJSONResponse(await get_conversation_messages(
+        db, conversation_id, limit=limit, before=before
+    ))
 
 @router.post("/{conversation_id}/messages", response_model=Conversation)
 async def add_message(
@@ -35,16 +75,35 @@ async def add_message(
 ):
     if not ObjectId.is_valid(conversation_id):
         raise HTTPException(status_code=400, detail="Invalid conversation ID")
-    return await add_message_to_conversation(db, conversation_id, message)
+    return TrustedJSONResponse(await add_message_to_conversation(db, conversation_id, message))
 
 @router.get("/user/{user_id}", response_model=List[Conversation])
 async def list_user_conversations(user_id: str, db=Depends(get_db)):
     if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=400, detail="Invalid user ID")
-    return await get_user_conversations(db, user_id)
+    return TrustedJSONResponse(await get_user_conversations(db, user_id))
+
+@router.get("/user/{user_id}/summaries", response_model=ConversationPage)
+async def list_user_conversation_summaries(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db=Depends(get_db)
+):
+    """
+    Sidebar listing: conversations without messages, newest first. Pass
+    `next_cursor` from the response as `cursor` to fetch the next page.
+    """
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(status_code=400, detail="Invalid user ID")
+    try:
+        page = await get_user_conversation_summaries(db, user_id, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return TrustedJSONResponse(page)
 
 @router.put("/{conversation_id}/end", response_model=Conversation)
 async def close_conversation(conversation_id: str, db=Depends(get_db)):
     if not ObjectId.is_valid(conversation_id):
         raise HTTPException(status_code=400, detail="Invalid conversation ID")
-    return await end_conversation(db, conversation_id)
\ No newline at end of file
+    return TrustedJSONResponse(await end_conversation(db, conversation_id))
\ No newline at end of file
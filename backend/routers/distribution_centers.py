@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+import numpy as np
+from models.distribution_center import NearestCenter, NearestCenterMatch, NearestCentersRequest
+from services.distribution_centers import distribution_centers, shipping_days
+from utils.serialization import TrustedJSONResponse
+
+router = APIRouter()
+
+@router.get("/nearest", response_model=List[NearestCenter])
+async def nearest_centers(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    product_id: Optional[int] = None,
+    k: int = Query(1, ge=1, le=50)
+):
+    """
+    Nearest distribution centers to a location with a shipping estimate,
+    optionally only those with available stock of `product_id`
+    """
+    centers = distribution_centers.nearest(latitude, longitude, product_id=product_id, k=k)
+    if centers is None:
+        raise HTTPException(status_code=503, detail="Distribution center index is loading")
+    return TrustedJSONResponse(centers)
+
+@router.post("/nearest", response_model=List[NearestCenterMatch])
+async def nearest_center_bulk(request: NearestCentersRequest):
+    """Nearest center for many locations at once, in request order"""
+    latitude = np.fromiter((location.latitude for location in request.locations), dtype=np.float64)
+    longitude = np.fromiter((location.longitude for location in request.locations), dtype=np.float64)
+    result = distribution_centers.nearest_many(latitude, longitude, product_id=request.product_id)
+    if result is None:
+        raise HTTPException(status_code=503, detail="Distribution center index is loading")
+    center_ids, distances = result
+    return TrustedJSONResponse([
+        {
+            "distribution_center_id": center_id,
+            "distance_km": round(distance, 1),
+            "shipping_days": shipping_days(distance)
+        } if center_id >= 0 else {
+            "distribution_center_id": None, "distance_km": None, "shipping_days": None
+        }
+        for center_id, distance in zip(center_ids.tolist(), distances.tolist())
+    ])
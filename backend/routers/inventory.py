@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+from models.inventory import InventoryItemStatus, ProductAvailability
+from services.inventory_availability import get_availability, update_inventory_status
+from utils.database import get_db
+from utils.serialization import TrustedJSONResponse
+
+router = APIRouter()
+
+INVENTORY_STATUSES = ("available", "reserved", "sold")
+
+@router.get("/availability", response_model=List[ProductAvailability])
+async def read_availability(
+    product_id: List[int] = Query(..., max_items=500),
+    distribution_center_id: Optional[int] = None,
+    db=Depends(get_db)
+):
+    """
+    Available items per product, overall or at one distribution center.
+    Pass `product_id` once per product; all are read in one round trip.
+    """
+    availability = await get_availability(db, product_id, distribution_center_id)
+    return TrustedJSONResponse([
+        {"product_id": product, **counts} for product, counts in availability.items()
+    ])
+
+@router.put("/items/{item_id}/status", response_model=InventoryItemStatus)
+async def set_item_status(item_id: int, status: str, db=Depends(get_db)):
+    if status not in INVENTORY_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Status must be one of {', '.join(INVENTORY_STATUSES)}")
+    item = await update_inventory_status(db, item_id, status)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Inventory item not found")
+    return TrustedJSONResponse(item)
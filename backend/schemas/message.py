@@ -1,6 +1,7 @@
 from datetime import datetime
 from enum import Enum
-from pydantic import BaseModel
+from typing import Optional
+from pydantic import BaseModel, Field
 
 class MessageSender(str, Enum):
     USER = "user"
@@ -11,6 +12,7 @@ class Message(BaseModel):
     sender: MessageSender
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     metadata: dict = Field(default_factory=dict)
+    seq: Optional[int] = None
 
     class Config:
         schema_extra = {
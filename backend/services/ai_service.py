@@ -1,6 +1,7 @@
-from typing import List
+from typing import Awaitable, Callable, List, Optional, Tuple
 from schemas.message import Message
-import random
+from services.intent_router import IntentMatch, intent_router
+from services.query_planner import parse_free_text
 
 # Sample product data (would normally come from DB)
 SAMPLE_PRODUCTS = [
@@ -9,31 +10,62 @@ SAMPLE_PRODUCTS = [
     {"name": "Sports Hoodie", "price": 49.99, "category": "Hoodies"},
 ]
 
+# Canned answers for intents that never need the LLM or the database
+STATIC_RESPONSES = {
+    "greeting": "Hello! Welcome to our e-commerce store. How can I help you today?",
+    "order_status": "Please provide your order number so I can check the status.",
+    "returns": "We accept returns within 30 days of purchase. Please visit our Returns Center for more details.",
+    "thanks": "You're welcome! Is there anything else I can help you with?",
+}
+
+FALLBACK_RESPONSE = "I'm sorry, I didn't understand that. Could you please rephrase your question?"
+
+DatabaseLookup = Callable[[str, Optional[str]], Awaitable[str]]
+
+async def generate_fast_path_response(
+    user_message: str,
+    database_lookup: DatabaseLookup,
+    user_id: Optional[str] = None
+) -> Optional[Tuple[str, IntentMatch]]:
+    """
+    Answers high-confidence rule-based intents without calling the LLM
+    Args:
+        user_message: The user's message
+        database_lookup: Coroutine answering a top-products or order-status
+            request from the DB, for the given user
+        user_id: ID of the chatting user; orders are only shown to their owner
+    Returns:
+        (response, match) when the message was handled, otherwise None
+    """
+    match = intent_router.classify(user_message)
+    if match is None or not match.confident:
+        return None
+
+    if match.intent == "order_status" and any(char.isdigit() for char in user_message):
+        # The user gave a number: look the order up rather than ask for it
+        if parse_free_text(user_message).order_id is not None:
+            return await database_lookup(user_message, user_id), match
+        # Too ambiguous to parse here (e.g. a two-digit number); the LLM decides
+        return None
+    if match.intent in STATIC_RESPONSES:
+        return STATIC_RESPONSES[match.intent], match
+    if match.intent == "top_products":
+        return await database_lookup(user_message, user_id), match
+    return None
+
 async def generate_ai_response(user_message: str, conversation_history: List[Message]) -> str:
     """
     Generates appropriate AI responses based on user input.
     In a real implementation, this would connect to an LLM API.
     """
-    user_message = user_message.lower()
-    
-    # Simple intent detection
-    if any(word in user_message for word in ["hello", "hi", "hey"]):
-        return "Hello! Welcome to our e-commerce store. How can I help you today?"
-    
-    elif "top product" in user_message or "best seller" in user_message:
+    match = intent_router.classify(user_message)
+    if match is None:
+        return FALLBACK_RESPONSE
+
+    if match.intent == "top_products":
         response = "Our top selling products are:\n"
         for i, product in enumerate(SAMPLE_PRODUCTS[:5], 1):
             response += f"{i}. {product['name']} - ${product['price']}\n"
         return response
-    
-    elif "order status" in user_message:
-        return "You can check your order status in the 'My Orders' section of your account."
-    
-    elif "return" in user_message or "exchange" in user_message:
-        return "We accept returns within 30 days of purchase. Please visit our Returns Center for more details."
-    
-    elif "thank" in user_message:
-        return "You're welcome! Is there anything else I can help you with?"
-    
-    else:
-        return "I'm sorry, I didn't understand that. Could you please rephrase your question?"
\ No newline at end of file
+
+    return STATIC_RESPONSES.get(match.intent, FALLBACK_RESPONSE)
@@ -0,0 +1,294 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from pymongo import DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+CATALOG_ENABLED = os.getenv("CATALOG_ENABLED", "true").lower() == "true"
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "60"))
+# Length of the precomputed per-category/brand/department top lists
+CATALOG_TOP_N = int(os.getenv("CATALOG_TOP_N", "20"))
+
+ENCODED_COLUMNS = ("category", "brand", "department")
+
+
+class CatalogSnapshot:
+    """
+    Immutable column-oriented copy of the products collection.
+
+    Numeric attributes are NumPy arrays indexed by row; string attributes
+    are dictionary-encoded into integer code arrays, with one sorted row
+    index array per distinct value acting as a secondary index.
+    """
+
+    def __init__(self, documents: List[Dict], sales: Dict[int, float], version: Tuple):
+        self.version = version
+        self.loaded_at = time.time()
+        self.size = len(documents)
+
+        self.id = np.fromiter((doc["id"] for doc in documents), dtype=np.int64, count=self.size)
+        self.retail_price = np.fromiter(
+            (doc.get("retail_price") or 0.0 for doc in documents), dtype=np.float64, count=self.size
+        )
+        self.cost = np.fromiter(
+            (doc.get("cost") or 0.0 for doc in documents), dtype=np.float64, count=self.size
+        )
+        self.distribution_center_id = np.fromiter(
+            (doc.get("distribution_center_id") or -1 for doc in documents), dtype=np.int32, count=self.size
+        )
+        self.sales_count = np.fromiter(
+            (sales.get(doc["id"], 0.0) for doc in documents), dtype=np.float64, count=self.size
+        )
+        # Insertion order stands in for recency
+        self.recency = np.arange(self.size, dtype=np.int64)
+        self.name = np.array([doc.get("name") or "" for doc in documents], dtype=object)
+
+        self.dictionaries: Dict[str, List[str]] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        self.indexes: Dict[str, Dict[int, np.ndarray]] = {}
+        self.top: Dict[str, Dict[int, np.ndarray]] = {}
+
+        # Rows ordered by sales, best first; per-value lists keep this order
+        by_sales = np.argsort(-self.sales_count, kind="stable")
+        self.top_overall = by_sales[:CATALOG_TOP_N]
+
+        for column in ENCODED_COLUMNS:
+            values = np.array([str(doc.get(column) or "") for doc in documents], dtype=object)
+            dictionary, codes = np.unique(values, return_inverse=True)
+            codes = codes.astype(np.int32)
+            self.dictionaries[column] = [str(value) for value in dictionary]
+            self.codes[column] = codes
+
+            ranked_codes = codes[by_sales]
+            order = np.argsort(ranked_codes, kind="stable")
+            boundaries = np.searchsorted(ranked_codes[order], np.arange(len(dictionary) + 1))
+            index = {}
+            top = {}
+            for code in range(len(dictionary)):
+                rows = by_sales[order[boundaries[code]:boundaries[code + 1]]]
+                index[code] = rows
+                top[code] = rows[:CATALOG_TOP_N]
+            self.indexes[column] = index
+            self.top[column] = top
+
+        self._code_lookup = {
+            column: {value: code for code, value in enumerate(self.dictionaries[column])}
+            for column in ENCODED_COLUMNS
+        }
+
+    def code(self, column: str, value: str) -> Optional[int]:
+        return self._code_lookup[column].get(value)
+
+    def query(
+        self,
+        filters: Dict[str, object],
+        sort: str,
+        limit: int
+    ) -> List[Dict]:
+        """
+        Answers a product request from memory
+        Args:
+            filters: Exact-match values for category/brand/department/distribution_center_id
+            sort: "sales", "price_asc", "price_desc" or "newest"
+            limit: Maximum number of rows
+        Returns:
+            List of product dicts, best first
+        """
+        encoded = {}
+        for column in ENCODED_COLUMNS:
+            if column in filters:
+                code = self.code(column, filters[column])
+                if code is None:
+                    return []
+                encoded[column] = code
+
+        # Single-dimension sales ranking is a precomputed list
+        if sort == "sales" and limit <= CATALOG_TOP_N and "distribution_center_id" not in filters:
+            if not encoded:
+                return self._rows(self.top_overall[:limit])
+            if len(encoded) == 1:
+                column, code = next(iter(encoded.items()))
+                return self._rows(self.top[column][code][:limit])
+
+        # Start from the smallest secondary index, then filter vectorized
+        if encoded:
+            column, code = min(encoded.items(), key=lambda item: len(self.indexes[item[0]][item[1]]))
+            rows = self.indexes[column][code]
+        else:
+            rows = np.arange(self.size)
+        mask = np.ones(len(rows), dtype=bool)
+        for column, code in encoded.items():
+            mask &= self.codes[column][rows] == code
+        if "distribution_center_id" in filters:
+            mask &= self.distribution_center_id[rows] == int(filters["distribution_center_id"])
+        rows = rows[mask]
+
+        keys = {
+            "sales": -self.sales_count,
+            "price_asc": self.retail_price,
+            "price_desc": -self.retail_price,
+            "newest": -self.recency,
+        }[sort][rows]
+        if len(rows) > limit:
+            best = np.argpartition(keys, limit - 1)[:limit]
+            rows, keys = rows[best], keys[best]
+        return self._rows(rows[np.argsort(keys, kind="stable")])
+
+    def _rows(self, rows: np.ndarray) -> List[Dict]:
+        return [
+            {
+                "id": int(self.id[row]),
+                "name": self.name[row],
+                "category": self.dictionaries["category"][self.codes["category"][row]],
+                "brand": self.dictionaries["brand"][self.codes["brand"][row]],
+                "department": self.dictionaries["department"][self.codes["department"][row]],
+                "retail_price": float(self.retail_price[row]),
+                "distribution_center_id": int(self.distribution_center_id[row]),
+                "sales_count": float(self.sales_count[row]),
+            }
+            for row in rows
+        ]
+
+
+class ProductCatalog:
+    """
+    Process-wide in-memory product catalog. Readers always see a complete
+    snapshot; reloads build a new snapshot and swap it in atomically when
+    the catalog version changes.
+    """
+
+    def __init__(self):
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self.hits = 0
+        self.reloads = 0
+        self.change_streams: Optional[bool] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    def values(self, column: str) -> List[str]:
+        return self.snapshot.dictionaries[column] if self.snapshot else []
+
+    def query(self, filters: Dict[str, object], sort: str, limit: int) -> Optional[List[Dict]]:
+        """Returns matching products, or None while no snapshot is loaded"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        self.hits += 1
+        return snapshot.query(filters, sort, limit)
+
+    async def version(self, db) -> Tuple:
+        """
+        Cheap fingerprint of the data the catalog is built from: product
+        count, newest product _id (reloads insert fresh ObjectIds), newest
+        updated_at (sync mode rewrites products in place) and the last
+        product_sales refresh
+        """
+        count = await db.products.estimated_document_count()
+        newest = await db.products.find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+        updated = await db.products.find_one(
+            {"updated_at": {"$exists": True}}, {"_id": 0, "updated_at": 1},
+            sort=[("updated_at", DESCENDING)]
+        )
+        view = await db.materialized_views.find_one({"_id": "product_sales"}, {"refreshed_at": 1})
+        return (
+            count,
+            newest["_id"] if newest else None,
+            updated["updated_at"] if updated else None,
+            view.get("refreshed_at") if view else None
+        )
+
+    async def load(self, db, version: Optional[Tuple] = None):
+        """Builds a new snapshot from products and product_sales"""
+        version = version or await self.version(db)
+        documents = await db.products.find(
+            {},
+            {
+                "_id": 0, "id": 1, "name": 1, "category": 1, "brand": 1,
+                "department": 1, "retail_price": 1, "cost": 1,
+                "distribution_center_id": 1
+            }
+        ).sort("_id", 1).to_list(length=None)
+        sales = {
+            doc["product_id"]: doc.get("sales_count", 0)
+            async for doc in db.product_sales.find({}, {"_id": 0, "product_id": 1, "sales_count": 1})
+        }
+        # Column building is CPU-bound; keep it off the event loop
+        snapshot = await asyncio.get_running_loop().run_in_executor(
+            None, CatalogSnapshot, documents, sales, version
+        )
+        self.snapshot = snapshot
+        self.reloads += 1
+        logger.info(f"Product catalog loaded: {snapshot.size} products")
+
+    async def refresh_if_changed(self, db) -> bool:
+        version = await self.version(db)
+        if self.snapshot is not None and self.snapshot.version == version:
+            return False
+        await self.load(db, version)
+        return True
+
+    async def wait_for_change(self, db, timeout: float) -> bool:
+        """
+        Waits until products change (via a change stream where the server
+        supports it) or the timeout passes
+        Returns:
+            True if a change stream reported a modification
+        """
+        if self.change_streams is not False:
+            try:
+                deadline = time.monotonic() + timeout
+                async with db.products.watch(max_await_time_ms=1000) as stream:
+                    self.change_streams = True
+                    while time.monotonic() < deadline:
+                        if await stream.try_next() is not None:
+                            return True
+                return False
+            except OperationFailure:
+                # Standalone servers have no change streams; poll instead
+                self.change_streams = False
+        await asyncio.sleep(timeout)
+        return False
+
+    def stats(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            "ready": snapshot is not None,
+            "products": snapshot.size if snapshot else 0,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "reloads": self.reloads,
+            "hits": self.hits,
+            "change_streams": bool(self.change_streams)
+        }
+
+
+async def run_catalog_refresher(get_db, interval: Optional[float] = None):
+    """Background loop keeping the in-memory catalog current"""
+    interval = CATALOG_REFRESH_SECONDS if interval is None else interval
+    changed = False
+    while True:
+        db = get_db()
+        try:
+            if db is not None:
+                if changed:
+                    # In-place edits keep the version, so reload unconditionally
+                    await catalog.load(db)
+                else:
+                    await catalog.refresh_if_changed(db)
+                changed = await catalog.wait_for_change(db, interval)
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Catalog refresh failed: {e}")
+        changed = False
+        await asyncio.sleep(interval)
+
+
+catalog = ProductCatalog()
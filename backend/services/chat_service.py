@@ -1,13 +1,42 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
-from typing import List, Optional
-from models.conversation import Conversation
+from typing import Dict, List, Optional, Tuple
+from models.conversation import (
+    Conversation,
+    ConversationDelta,
+    ConversationPage,
+    ConversationSummary,
+    MessagePreview
+)
 from schemas.message import Message
+from services.message_store import (
+    CONVERSATION_PREVIEW_CHARS,
+    append_message,
+    append_messages,
+    find_conversation_with_messages,
+    get_messages,
+    migrate_embedded_messages
+)
+from utils.serialization import construct_from
 from pymongo.errors import PyMongoError
 import logging
 
 logger = logging.getLogger(__name__)
 
+EPOCH = datetime(1970, 1, 1)
+
+def trusted_conversation(document: dict) -> Conversation:
+    """
+    Builds a Conversation from a stored document without re-validating it
+    or its messages
+    """
+    conversation = construct_from(Conversation, document)
+    conversation.messages = [
+        msg if isinstance(msg, Message) else construct_from(Message, msg)
+        for msg in document.get("messages", [])
+    ]
+    return conversation
+
 async def create_conversation(db, user_id: str) -> Conversation:
     """
     Creates a new conversation for a user
@@ -22,7 +51,7 @@ async def create_conversation(db, user_id: str) -> Conversation:
         conversation_data = {
             "user_id": ObjectId(user_id),
             "session_id": session_id,
-            "messages": [],
+            "message_count": 0,
             "is_active": True,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
@@ -32,8 +61,8 @@ async def create_conversation(db, user_id: str) -> Conversation:
         if not result.inserted_id:
             raise ValueError("Failed to create conversation")
         
-        # Return the full conversation object
-        return await get_conversation(db, str(result.inserted_id))
+        # insert_one fills in _id, so the document is already complete
+        return trusted_conversation(conversation_data)
     
     except PyMongoError as e:
         logger.error(f"Database error creating conversation: {e}")
@@ -42,19 +71,31 @@ async def create_conversation(db, user_id: str) -> Conversation:
         logger.error(f"Error creating conversation: {e}")
         raise
 
-async def get_conversation(db, conversation_id: str) -> Optional[Conversation]:
+async def get_conversation(
+    db,
+    conversation_id: str,
+    message_limit: Optional[int] = None,
+    since: Optional[int] = None,
+    unsummarized: bool = False
+) -> Optional[Conversation]:
     """
     Retrieves a conversation by ID
     Args:
         db: MongoDB database connection
         conversation_id: ID of the conversation to retrieve
+        message_limit: Only load this many of the newest messages
+        since: Only load messages from min(summary_seq, since) on
+        unsummarized: Only load messages from summary_seq on
     Returns:
         Conversation object or None if not found
     """
     try:
-        conversation = await db.conversations.find_one({"_id": ObjectId(conversation_id)})
+        conversation = await find_conversation_with_messages(
+            db, conversation_id, limit=message_limit, since=since,
+            unsummarized=unsummarized
+        )
         if conversation:
-            return Conversation(**conversation)
+            return trusted_conversation(conversation)
         return None
     except PyMongoError as e:
         logger.error(f"Database error getting conversation: {e}")
@@ -75,20 +116,7 @@ async def add_message_to_conversation(
         Updated Conversation object
     """
     try:
-        message_dict = message.dict()
-        message_dict["timestamp"] = datetime.utcnow()
-        
-        update_result = await db.conversations.update_one(
-            {"_id": ObjectId(conversation_id)},
-            {
-                "$push": {"messages": message_dict},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
-        
-        if update_result.modified_count == 0:
-            raise ValueError("Failed to add message to conversation")
-        
+        await append_message(db, conversation_id, message)
         return await get_conversation(db, conversation_id)
     except PyMongoError as e:
         logger.error(f"Database error adding message: {e}")
@@ -97,6 +125,126 @@ async def add_message_to_conversation(
         logger.error(f"Error adding message: {e}")
         raise
 
+async def commit_chat_turn(
+    db,
+    user_id: str,
+    conversation_id: str,
+    messages: List[Message],
+    history: List[Message],
+    create: bool = False
+) -> Conversation:
+    """
+    Persists the messages of one chat turn with a single conversation write
+    and a single bucket write
+    Args:
+        db: MongoDB database connection
+        user_id: ID of the user owning the conversation
+        conversation_id: ID of the conversation (pre-generated when creating)
+        messages: New messages of the turn, in order
+        history: Messages already loaded for this conversation
+        create: Create the conversation in the same write if it is missing
+    Returns:
+        Conversation object built from the write result, without a re-read
+    """
+    try:
+        upsert_fields = None
+        if create:
+            upsert_fields = {
+                "user_id": ObjectId(user_id),
+                "session_id": f"session_{datetime.utcnow().timestamp()}",
+                "is_active": True
+            }
+        conversation, stored = await append_messages(
+            db, conversation_id, messages, upsert_fields=upsert_fields
+        )
+        conversation["messages"] = list(history) + stored
+        return trusted_conversation(conversation)
+    except PyMongoError as e:
+        logger.error(f"Database error committing chat turn: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"Error committing chat turn: {e}")
+        raise
+
+def conversation_delta(conversation: Conversation, since: int) -> ConversationDelta:
+    """
+    Strips the messages a client already holds from a conversation
+    Args:
+        conversation: Conversation with its full message history
+        since: Number of messages the client holds, i.e. the first seq it lacks
+    Returns:
+        ConversationDelta with the conversation metadata and newer messages only
+    """
+    document = dict(conversation.__dict__)
+    document["messages"] = [
+        msg for msg in conversation.messages
+        if msg.seq is not None and msg.seq >= since
+    ]
+    document["since"] = since
+    return construct_from(ConversationDelta, document)
+
+def _etag(message_count: int, summary_seq: int, updated_at: datetime) -> str:
+    # Every write bumps message_count or updated_at, except summary
+    # updates, which advance summary_seq
+    millis = (updated_at - EPOCH) // timedelta(milliseconds=1)
+    return f'"{message_count}-{summary_seq}-{millis}"'
+
+def loaded_message_count(messages: List[Message], start: Optional[int] = None) -> int:
+    """
+    Sequence number following the unbroken run of messages from `start`
+    (the first message's seq by default): how many messages a response
+    really holds, whatever message_count says
+    """
+    expected = start if start is not None else (messages[0].seq if messages else 0)
+    for msg in messages:
+        if msg.seq != expected:
+            break
+        expected += 1
+    return expected
+
+def conversation_etag(conversation: Conversation, start: Optional[int] = None) -> str:
+    """
+    Entity tag of a conversation, for conditional GETs. message_count is
+    bumped before the new messages reach their bucket, so the tag counts
+    the messages actually returned: a body read between the two writes
+    gets a tag no later read matches, instead of one claiming messages it
+    lacks.
+    Args:
+        conversation: Conversation with the messages being returned
+        start: Seq the returned messages should begin at (0 for a full read)
+    """
+    return _etag(
+        min(conversation.message_count, loaded_message_count(conversation.messages, start)),
+        conversation.summary_seq,
+        conversation.updated_at
+    )
+
+async def get_conversation_etag(db, conversation_id: str) -> Optional[str]:
+    """
+    Reads the current entity tag of a conversation without its messages
+    Args:
+        db: MongoDB database connection
+        conversation_id: ID of the conversation
+    Returns:
+        The entity tag, or None if the conversation is missing or still
+        embeds its messages (those are migrated by a full read)
+    """
+    try:
+        conversation = await db.conversations.find_one(
+            {"_id": ObjectId(conversation_id)},
+            {"message_count": 1, "summary_seq": 1, "updated_at": 1}
+        )
+        if not conversation or "message_count" not in conversation:
+            return None
+        return _etag(
+            conversation["message_count"],
+            conversation.get("summary_seq", 0),
+            conversation["updated_at"]
+        )
+    except PyMongoError as e:
+        logger.error(f"Database error getting conversation etag: {e}")
+        raise
+
 async def get_user_conversations(db, user_id: str) -> List[Conversation]:
     """
     Gets all conversations for a specific user
@@ -111,12 +259,115 @@ async def get_user_conversations(db, user_id: str) -> List[Conversation]:
         async for conversation in db.conversations.find(
             {"user_id": ObjectId(user_id)}
         ).sort("updated_at", -1):
-            conversations.append(Conversation(**conversation))
+            if "message_count" not in conversation:
+                conversation = await migrate_embedded_messages(db, conversation)
+                conversation.pop("buckets")
+            conversations.append(trusted_conversation(conversation))
         return conversations
     except PyMongoError as e:
         logger.error(f"Database error getting user conversations: {e}")
         raise
 
+# Fields of a conversation summary; legacy documents that still embed their
+# messages get a count and preview computed from the array instead
+SUMMARY_PROJECTION = {
+    "user_id": 1,
+    "session_id": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "is_active": 1,
+    "message_count": {"$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]},
+    "last_message": {"$ifNull": ["$last_message", {"$last": {"$ifNull": ["$messages", [None]]}}]}
+}
+
+def encode_cursor(conversation: dict) -> str:
+    """Opaque keyset cursor: updated_at (UTC epoch milliseconds, BSON's precision) and _id"""
+    millis = (conversation["updated_at"] - EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}_{conversation['_id']}"
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    millis, _, conversation_id = cursor.partition("_")
+    if not millis.isdigit() or not ObjectId.is_valid(conversation_id):
+        raise ValueError("Invalid cursor")
+    return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(conversation_id)
+
+async def _attach_previews(db, summaries: List[dict]):
+    """
+    Truncates previews and reads the newest message of bucketed
+    conversations stored before previews were kept
+    """
+    for summary in summaries:
+        if summary.get("last_message"):
+            summary["last_message"]["text"] = summary["last_message"]["text"][:CONVERSATION_PREVIEW_CHARS]
+    missing = {
+        summary["_id"]: summary for summary in summaries
+        if summary.get("message_count") and not summary.get("last_message")
+    }
+    if not missing:
+        return
+    async for bucket in db.message_buckets.aggregate([
+        {"$match": {"conversation_id": {"$in": list(missing)}}},
+        {"$sort": {"conversation_id": 1, "bucket": -1}},
+        {"$group": {"_id": "$conversation_id", "message": {"$first": {"$last": "$messages"}}}}
+    ]):
+        message = bucket.get("message")
+        if message:
+            missing[bucket["_id"]]["last_message"] = {
+                "text": message["text"][:CONVERSATION_PREVIEW_CHARS],
+                "sender": message["sender"],
+                "timestamp": message["timestamp"]
+            }
+
+def trusted_summary(document: dict) -> ConversationSummary:
+    summary = construct_from(ConversationSummary, document)
+    if summary.last_message:
+        summary.last_message = construct_from(MessagePreview, summary.last_message)
+    return summary
+
+async def get_user_conversation_summaries(
+    db,
+    user_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None
+) -> ConversationPage:
+    """
+    Pages through a user's conversations, most recently updated first,
+    without loading any messages
+    Args:
+        db: MongoDB database connection
+        user_id: ID of the user
+        limit: Page size
+        cursor: next_cursor of the previous page
+    Returns:
+        ConversationPage of summaries with message count and last-message preview
+    """
+    try:
+        query: Dict = {"user_id": ObjectId(user_id)}
+        if cursor:
+            updated_at, last_id = decode_cursor(cursor)
+            # Keyset continuation on the (user_id, updated_at, _id) index
+            query["$or"] = [
+                {"updated_at": {"$lt": updated_at}},
+                {"updated_at": updated_at, "_id": {"$lt": last_id}}
+            ]
+        summaries = await db.conversations.aggregate([
+            {"$match": query},
+            {"$sort": {"updated_at": -1, "_id": -1}},
+            {"$limit": limit + 1},
+            {"$project": SUMMARY_PROJECTION}
+        ]).to_list(length=limit + 1)
+
+        next_cursor = encode_cursor(summaries[limit - 1]) if len(summaries) > limit else None
+        summaries = summaries[:limit]
+        await _attach_previews(db, summaries)
+        return construct_from(ConversationPage, {
+            "items": [trusted_summary(summary) for summary in summaries],
+            "next_cursor": next_cursor
+        })
+    except PyMongoError as e:
+        logger.error(f"Database error getting conversation summaries: {e}")
+        raise
+
 async def end_conversation(db, conversation_id: str) -> Conversation:
     """
     Marks a conversation as inactive
@@ -148,23 +399,35 @@ async def end_conversation(db, conversation_id: str) -> Conversation:
         logger.error(f"Error ending conversation: {e}")
         raise
 
-async def get_conversation_messages(db, conversation_id: str) -> List[Message]:
+async def get_conversation_messages(
+    db,
+    conversation_id: str,
+    limit: Optional[int] = None,
+    before: Optional[int] = None
+) -> List[Message]:
     """
-    Gets all messages from a specific conversation
+    Gets messages from a specific conversation, newest page first
     Args:
         db: MongoDB database connection
         conversation_id: ID of the conversation
+        limit: Maximum number of messages to return
+        before: Only return messages with a sequence number below this
     Returns:
-        List of Message objects
+        List of Message objects, oldest first
     """
     try:
+        messages = await get_messages(db, conversation_id, limit=limit, before=before)
+        if messages:
+            return messages
+
+        # Pre-bucket conversations still embed their messages; move them over
         conversation = await db.conversations.find_one(
-            {"_id": ObjectId(conversation_id)},
-            {"messages": 1}
+            {"_id": ObjectId(conversation_id), "message_count": {"$exists": False}}
         )
-        if conversation:
-            return [Message(**msg) for msg in conversation.get("messages", [])]
-        return []
+        if not conversation:
+            return []
+        await migrate_embedded_messages(db, conversation)
+        return await get_messages(db, conversation_id, limit=limit, before=before)
     except PyMongoError as e:
         logger.error(f"Database error getting messages: {e}")
         raise
\ No newline at end of file
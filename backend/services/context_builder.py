@@ -0,0 +1,202 @@
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+from bson import ObjectId
+from schemas.message import Message
+
+logger = logging.getLogger(__name__)
+
+# Prompt tokens allowed for conversation context (summary + recent turns)
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "2000"))
+
+# Fixed per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+Summarizer = Callable[[Optional[str], List[Message]], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: Message) -> int:
+    return estimate_tokens(message.text) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextWindow:
+    """The part of a conversation sent to the model for one turn"""
+
+    def __init__(
+        self,
+        messages: List[Message],
+        summary: Optional[str],
+        summary_seq: int,
+        pending: List[Message],
+        full_tokens: Optional[int],
+        sent_tokens: int
+    ):
+        self.messages = messages
+        self.summary = summary
+        self.summary_seq = summary_seq
+        # Messages that fell out of the window but are not in the summary yet
+        self.pending = pending
+        # None when only the tail of the history was loaded
+        self.full_tokens = full_tokens
+        self.sent_tokens = sent_tokens
+
+    @property
+    def tokens_saved(self) -> Optional[int]:
+        if self.full_tokens is None:
+            return None
+        return max(self.full_tokens - self.sent_tokens, 0)
+
+
+class ContextBuilder:
+    """
+    Keeps the prompt within a token budget: the newest turns are sent
+    verbatim and everything older is represented by a rolling summary stored
+    on the conversation. The summary is extended incrementally with only the
+    messages that have just left the window, never rebuilt from scratch.
+    """
+
+    def __init__(self, token_budget: int = LLM_CONTEXT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.requests = 0
+        # Turns built from the whole history; only they measure the saving
+        self.measured_requests = 0
+        self.full_tokens = 0
+        self.sent_tokens = 0
+        self.summaries_updated = 0
+        self._tasks = set()
+
+    def build(
+        self,
+        history: List[Message],
+        summary: Optional[str] = None,
+        summary_seq: int = 0
+    ) -> ContextWindow:
+        """
+        Selects the messages to send for a turn
+        Args:
+            history: Conversation messages, oldest first, ending with the
+                current user message
+            summary: Rolling summary of messages before summary_seq
+            summary_seq: First sequence number not covered by the summary
+        Returns:
+            ContextWindow with the recent messages and summary to send
+        """
+        unsummarized = [
+            msg for msg in history
+            if msg.seq is None or msg.seq >= summary_seq
+        ]
+        budget = self.token_budget
+        if summary:
+            budget -= estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS
+
+        kept = []
+        used = 0
+        for message in reversed(unsummarized):
+            cost = message_tokens(message)
+            # The current message is always sent, even if it alone is too large
+            if kept and used + cost > budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+
+        pending = unsummarized[:len(unsummarized) - len(kept)]
+        # A history starting past seq 0 is a tail; its size says nothing
+        # about the whole conversation
+        complete = not history or history[0].seq in (None, 0)
+        full_tokens = sum(message_tokens(msg) for msg in history) if complete else None
+        sent_tokens = used
+        if summary:
+            sent_tokens += estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS
+
+        window = ContextWindow(kept, summary, summary_seq, pending, full_tokens, sent_tokens)
+        self.requests += 1
+        if full_tokens is not None:
+            self.measured_requests += 1
+            self.full_tokens += full_tokens
+            self.sent_tokens += sent_tokens
+        return window
+
+    async def update_summary(
+        self,
+        db,
+        conversation_id: str,
+        window: ContextWindow,
+        summarizer: Summarizer
+    ) -> Optional[str]:
+        """
+        Folds the window's pending messages into the stored summary
+        Args:
+            db: MongoDB database connection
+            conversation_id: ID of the conversation
+            window: Window whose pending messages should be summarised
+            summarizer: Coroutine producing a new summary from the previous
+                summary and the messages to add
+        Returns:
+            The new summary, or None if nothing was updated
+        """
+        if not window.pending:
+            return None
+        try:
+            summary = await summarizer(window.summary, window.pending)
+            next_seq = max(msg.seq for msg in window.pending) + 1
+            # Only apply on top of the summary this window was built from
+            result = await db.conversations.update_one(
+                {"_id": ObjectId(conversation_id), "summary_seq": {"$in": [window.summary_seq, None]}},
+                {"$set": {
+                    "summary": summary,
+                    "summary_seq": next_seq,
+                    "summary_updated_at": datetime.utcnow()
+                }}
+            )
+            if result.modified_count:
+                self.summaries_updated += 1
+                return summary
+        except Exception as e:
+            logger.error(f"Error updating conversation summary: {e}")
+        return None
+
+    def schedule_summary_update(
+        self,
+        db,
+        conversation_id: str,
+        window: ContextWindow,
+        summarizer: Summarizer
+    ):
+        """Runs update_summary in the background so the turn is not delayed"""
+        if not window.pending:
+            return
+        task = asyncio.create_task(
+            self.update_summary(db, conversation_id, window, summarizer)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> Dict:
+        """
+        Token accounting across the turns built by this process; token
+        counts cover the measured turns, those built from the whole history
+        """
+        saved = max(self.full_tokens - self.sent_tokens, 0)
+        return {
+            "token_budget": self.token_budget,
+            "requests": self.requests,
+            "measured_requests": self.measured_requests,
+            "full_history_tokens": self.full_tokens,
+            "sent_tokens": self.sent_tokens,
+            "tokens_saved": saved,
+            "avg_tokens_saved_per_request": (
+                round(saved / self.measured_requests, 1) if self.measured_requests else 0
+            ),
+            "summaries_updated": self.summaries_updated
+        }
+
+
+context_builder = ContextBuilder()
@@ -0,0 +1,242 @@
+"""
+Batched lookups of orders, order items, users and products by id, and of
+users by their account _id
+
+Shared loaders coalesce every lookup made by any request within a short
+window (DATALOADER_WINDOW_MS) into one $in query per collection. A request
+scope (request_loaders) adds per-request memoization on top, batching the
+loads of one event-loop tick before handing them to the shared loaders.
+"""
+import os
+import time
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from pymongo.errors import PyMongoError
+from utils.database import get_db, get_products_collection
+
+logger = logging.getLogger(__name__)
+
+# How long a shared loader waits for more keys before querying
+DATALOADER_WINDOW_MS = float(os.getenv("DATALOADER_WINDOW_MS", "2"))
+# Keys per $in query; a full batch is sent without waiting for the window
+DATALOADER_MAX_BATCH = int(os.getenv("DATALOADER_MAX_BATCH", "500"))
+
+BatchFetch = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+
+class DataLoader:
+    """
+    Coalesces concurrent single-key loads into batched fetches.
+
+    The first load of a window schedules a flush `window` seconds later
+    (0: at the end of the current tick); every key requested until then,
+    or until max_batch keys are pending, goes into one fetch call.
+    Concurrent loads of the same key share one result. With cache=True
+    results are also kept for the loader's lifetime, which is only
+    appropriate for request-scoped loaders.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fetch: BatchFetch,
+        window: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        cache: bool = False
+    ):
+        self.name = name
+        self.fetch = fetch
+        self.window = DATALOADER_WINDOW_MS / 1000 if window is None else window
+        self.max_batch = max_batch or DATALOADER_MAX_BATCH
+        self._cache: Optional[Dict[Hashable, asyncio.Future]] = {} if cache else None
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._flush: Optional[asyncio.Handle] = None
+        self._tasks = set()
+
+        self.loads = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.batches = 0
+        self.keys_fetched = 0
+        self.max_batch_size = 0
+        self.errors = 0
+        self.fetch_seconds = 0.0
+        self.max_fetch_seconds = 0.0
+
+    async def load(self, key: Hashable) -> Any:
+        """Value for key (None when missing), fetched in the next batch"""
+        self.loads += 1
+        future = self._cache.get(key) if self._cache is not None else None
+        if future is not None:
+            self.cache_hits += 1
+        elif key in self._pending:
+            future = self._pending[key]
+            self.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            if self._cache is not None:
+                self._cache[key] = future
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+            elif self._flush is None:
+                loop = asyncio.get_running_loop()
+                if self.window > 0:
+                    self._flush = loop.call_later(self.window, self._dispatch)
+                else:
+                    self._flush = loop.call_soon(self._dispatch)
+
+        try:
+            # Shielded: one cancelled caller must not fail the others
+            return await asyncio.shield(future)
+        except Exception:
+            if self._cache is not None:
+                self._cache.pop(key, None)
+            raise
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self):
+        if self._flush is not None:
+            self._flush.cancel()
+            self._flush = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[Hashable, asyncio.Future]):
+        started = time.perf_counter()
+        try:
+            results = await self.fetch(list(batch))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"{self.name} loader batch of {len(batch)} failed: {e}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    # Waiters may all have been cancelled
+                    future.exception()
+            return
+        finally:
+            elapsed = time.perf_counter() - started
+            self.batches += 1
+            self.keys_fetched += len(batch)
+            self.max_batch_size = max(self.max_batch_size, len(batch))
+            self.fetch_seconds += elapsed
+            self.max_fetch_seconds = max(self.max_fetch_seconds, elapsed)
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key))
+
+    def stats(self) -> Dict:
+        return {
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "batches": self.batches,
+            "mean_batch_size": round(self.keys_fetched / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "mean_batch_ms": round(self.fetch_seconds / self.batches * 1000, 3) if self.batches else 0.0,
+            "max_batch_ms": round(self.max_fetch_seconds * 1000, 3),
+            "errors": self.errors
+        }
+
+
+def fetch_by(get_collection: Callable, field: str, projection: Dict) -> BatchFetch:
+    """Batch fetch of one document per key with a single $in query"""
+    async def fetch(keys: List[Hashable]) -> Dict[Hashable, Dict]:
+        try:
+            cursor = get_collection().find({field: {"$in": keys}}, projection)
+            return {doc[field]: doc async for doc in cursor}
+        except PyMongoError as e:
+            logger.error(f"Database error batch loading by {field}: {e}")
+            raise
+    return fetch
+
+
+def fetch_grouped_by(get_collection: Callable, field: str, projection: Dict) -> BatchFetch:
+    """Batch fetch of all documents per key; keys without any get []"""
+    async def fetch(keys: List[Hashable]) -> Dict[Hashable, List[Dict]]:
+        try:
+            grouped: Dict[Hashable, List[Dict]] = {key: [] for key in keys}
+            async for doc in get_collection().find({field: {"$in": keys}}, projection).sort("id", 1):
+                grouped[doc[field]].append(doc)
+            return grouped
+        except PyMongoError as e:
+            logger.error(f"Database error batch loading by {field}: {e}")
+            raise
+    return fetch
+
+
+class Loaders:
+    """One loader per lookup; shared across requests or scoped to one"""
+
+    def __init__(
+        self,
+        orders: DataLoader,
+        order_items: DataLoader,
+        users: DataLoader,
+        products: DataLoader,
+        accounts: DataLoader
+    ):
+        self.orders = orders
+        self.order_items = order_items
+        self.users = users
+        self.products = products
+        # Users by the ObjectId conversations refer to them with
+        self.accounts = accounts
+
+    def all(self) -> List[DataLoader]:
+        return [self.orders, self.order_items, self.users, self.products, self.accounts]
+
+    def stats(self) -> Dict:
+        return {loader.name: loader.stats() for loader in self.all()}
+
+
+shared_loaders = Loaders(
+    orders=DataLoader("orders", fetch_by(
+        lambda: get_db().orders, "id",
+        {"_id": 0, "id": 1, "user_id": 1, "status": 1, "total_amount": 1, "created_at": 1}
+    )),
+    order_items=DataLoader("order_items", fetch_grouped_by(
+        lambda: get_db().order_items, "order_id",
+        {"_id": 0, "id": 1, "order_id": 1, "product_id": 1, "quantity": 1, "price": 1}
+    )),
+    users=DataLoader("users", fetch_by(
+        lambda: get_db().users, "id", {"_id": 0, "id": 1, "name": 1, "email": 1}
+    )),
+    products=DataLoader("products", fetch_by(
+        get_products_collection, "id",
+        {"_id": 0, "id": 1, "name": 1, "category": 1, "brand": 1, "retail_price": 1}
+    )),
+    accounts=DataLoader("accounts", fetch_by(
+        lambda: get_db().users, "_id", {"_id": 1, "id": 1}
+    )),
+)
+
+_request_loaders: ContextVar[Optional[Loaders]] = ContextVar("request_loaders", default=None)
+
+
+def _scoped(shared: DataLoader) -> DataLoader:
+    async def fetch(keys: List[Hashable]) -> Dict[Hashable, Any]:
+        return dict(zip(keys, await shared.load_many(keys)))
+    return DataLoader(f"request:{shared.name}", fetch, window=0, cache=True)
+
+
+def request_loaders() -> Loaders:
+    """
+    Loaders for the current request (task context), created on first use.
+    They memoize results for the request and batch through shared_loaders.
+    Call it before fanning out with gather: child tasks copy the context,
+    so loaders created inside one are not seen by its siblings.
+    """
+    loaders = _request_loaders.get()
+    if loaders is None:
+        loaders = Loaders(*(_scoped(loader) for loader in shared_loaders.all()))
+        _request_loaders.set(loaders)
+    return loaders
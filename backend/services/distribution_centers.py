@@ -0,0 +1,266 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from pymongo import DESCENDING
+from services.inventory_availability import availability_revision, center_stock
+
+logger = logging.getLogger(__name__)
+
+DC_INDEX_ENABLED = os.getenv("DC_INDEX_ENABLED", "true").lower() == "true"
+DC_INDEX_REFRESH_SECONDS = float(os.getenv("DC_INDEX_REFRESH_SECONDS", "300"))
+# Shipping estimate: handling days plus one day per SHIPPING_KM_PER_DAY
+SHIPPING_KM_PER_DAY = float(os.getenv("SHIPPING_KM_PER_DAY", "800"))
+SHIPPING_HANDLING_DAYS = int(os.getenv("SHIPPING_HANDLING_DAYS", "1"))
+
+EARTH_RADIUS_KM = 6371.0088
+# Points compared against all centers per step of a bulk lookup
+BULK_CHUNK_POINTS = 65536
+
+
+def unit_vectors(latitude, longitude) -> np.ndarray:
+    """Degrees to points on the unit sphere, shape (..., 3)"""
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _haversine_scalar(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def shipping_days(distance_km: float) -> int:
+    return SHIPPING_HANDLING_DAYS + max(1, math.ceil(distance_km / SHIPPING_KM_PER_DAY))
+
+
+class DistributionCenterSnapshot:
+    """
+    Immutable in-memory copy of the distribution centers and their stock.
+
+    Centers are stored as unit vectors, so the nearest center to a point is
+    the one with the largest dot product (the smallest great-circle angle).
+    The network has tens of centers, so a flat scan is cheaper than walking
+    a spatial tree: single lookups scan plain floats (NumPy call overhead
+    would dominate), bulk lookups multiply a block of points by the center
+    matrix at once.
+
+    Stock is a sparse (product, center) table sorted by product, so the
+    centers holding a product are one searchsorted slice.
+    """
+
+    def __init__(self, centers: List[Dict], stock: List[Dict], version: Tuple):
+        self.version = version
+        self.loaded_at = time.time()
+        self.size = len(centers)
+
+        self.id = np.fromiter((doc["id"] for doc in centers), dtype=np.int64, count=self.size)
+        self.name = [doc.get("name") or "" for doc in centers]
+        self.latitude = np.fromiter((doc["latitude"] for doc in centers), dtype=np.float64, count=self.size)
+        self.longitude = np.fromiter((doc["longitude"] for doc in centers), dtype=np.float64, count=self.size)
+        self.unit = unit_vectors(self.latitude, self.longitude)
+        self._unit_rows = [tuple(vector) for vector in self.unit.tolist()]
+        self._row = {int(center_id): row for row, center_id in enumerate(self.id)}
+
+        # Stock rows for centers that are not loaded are dropped
+        entries = [
+            (doc["product_id"], self._row[doc["distribution_center_id"]], doc["quantity"])
+            for doc in stock
+            if doc.get("distribution_center_id") in self._row
+        ]
+        product = np.array([entry[0] for entry in entries], dtype=np.int64)
+        order = np.argsort(product, kind="stable")
+        self.stock_product = product[order]
+        self.stock_center = np.array([entry[1] for entry in entries], dtype=np.int32)[order]
+        self.stock_quantity = np.array([entry[2] for entry in entries], dtype=np.int64)[order]
+        self.stock_size = len(entries)
+
+    def stock_for(self, product_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Center rows holding the product and their available quantity"""
+        start, end = np.searchsorted(self.stock_product, [product_id, product_id + 1])
+        return self.stock_center[start:end], self.stock_quantity[start:end]
+
+    def candidates(self, product_id: Optional[int]) -> np.ndarray:
+        if product_id is None:
+            return np.arange(self.size)
+        return self.stock_for(product_id)[0]
+
+    def nearest_rows(self, points: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+        """Row of the nearest candidate center for each unit-vector point"""
+        result = np.empty(len(points), dtype=np.int64)
+        centers = self.unit[candidates].T
+        for start in range(0, len(points), BULK_CHUNK_POINTS):
+            similarity = points[start:start + BULK_CHUNK_POINTS] @ centers
+            result[start:start + len(similarity)] = candidates[np.argmax(similarity, axis=1)]
+        return result
+
+    def nearest(self, latitude: float, longitude: float, product_id: Optional[int] = None, k: int = 1) -> List[Dict]:
+        """
+        Nearest centers to a location, optionally only those stocking a product
+        Args:
+            latitude, longitude: Location in degrees
+            product_id: Only consider centers with available stock of this product
+            k: Number of centers to return
+        Returns:
+            List of center dicts with distance and shipping estimate, nearest first
+        """
+        if product_id is None:
+            rows, stock = range(self.size), {}
+        else:
+            centers, quantity = self.stock_for(product_id)
+            stock = dict(zip(centers.tolist(), quantity.tolist()))
+            rows = stock.keys()
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        x, y, z = math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+        unit = self._unit_rows
+        nearest = sorted(
+            rows, key=lambda row: -(x * unit[row][0] + y * unit[row][1] + z * unit[row][2])
+        )[:k]
+        return [
+            self._center(row, _haversine_scalar(
+                latitude, longitude, self.latitude[row], self.longitude[row]
+            ), stock.get(row))
+            for row in nearest
+        ]
+
+    def nearest_many(
+        self,
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        product_id: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized nearest center for many locations
+        Returns:
+            (center ids, distances in km); id -1 and NaN where no center
+            stocks the product
+        """
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        candidates = self.candidates(product_id)
+        if len(candidates) == 0:
+            return np.full(len(latitude), -1, dtype=np.int64), np.full(len(latitude), np.nan)
+        rows = self.nearest_rows(unit_vectors(latitude, longitude), candidates)
+        distances = haversine_km(latitude, longitude, self.latitude[rows], self.longitude[rows])
+        return self.id[rows], distances
+
+    def _center(self, row: int, distance_km: float, quantity: Optional[int]) -> Dict:
+        center = {
+            "id": int(self.id[row]),
+            "name": self.name[row],
+            "latitude": float(self.latitude[row]),
+            "longitude": float(self.longitude[row]),
+            "distance_km": round(float(distance_km), 1),
+            "shipping_days": shipping_days(float(distance_km)),
+        }
+        if quantity is not None:
+            center["available_quantity"] = int(quantity)
+        return center
+
+
+class DistributionCenterIndex:
+    """
+    Process-wide nearest-distribution-center index; reloads build a new
+    snapshot and swap it in when the centers or inventory change
+    """
+
+    def __init__(self):
+        self.snapshot: Optional[DistributionCenterSnapshot] = None
+        self.hits = 0
+        self.reloads = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    def nearest(self, latitude: float, longitude: float, product_id: Optional[int] = None, k: int = 1) -> Optional[List[Dict]]:
+        """Returns the nearest centers, or None while no snapshot is loaded"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        self.hits += 1
+        return snapshot.nearest(latitude, longitude, product_id, k)
+
+    def nearest_many(self, latitude, longitude, product_id: Optional[int] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        self.hits += 1
+        return snapshot.nearest_many(latitude, longitude, product_id)
+
+    async def version(self, db) -> Tuple:
+        """
+        Count and newest _id of distribution_centers, plus the revision of
+        the inventory availability counters (bumped by every stock change,
+        including status updates through the inventory API)
+        """
+        newest = await db.distribution_centers.find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+        return (
+            await db.distribution_centers.estimated_document_count(),
+            newest["_id"] if newest else None,
+            await availability_revision(db)
+        )
+
+    async def load(self, db, version: Optional[Tuple] = None):
+        version = version or await self.version(db)
+        centers = await db.distribution_centers.find(
+            {}, {"_id": 0, "id": 1, "name": 1, "latitude": 1, "longitude": 1}
+        ).sort("id", 1).to_list(length=None)
+        # The maintained counters, rather than a scan of inventory_items
+        stock = await center_stock(db)
+        snapshot = await asyncio.get_running_loop().run_in_executor(
+            None, DistributionCenterSnapshot, centers, stock, version
+        )
+        self.snapshot = snapshot
+        self.reloads += 1
+        logger.info(
+            f"Distribution center index loaded: {snapshot.size} centers, "
+            f"{snapshot.stock_size} product stock entries"
+        )
+
+    async def refresh_if_changed(self, db) -> bool:
+        version = await self.version(db)
+        if self.snapshot is not None and self.snapshot.version == version:
+            return False
+        await self.load(db, version)
+        return True
+
+    def stats(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            "ready": snapshot is not None,
+            "centers": snapshot.size if snapshot else 0,
+            "stock_entries": snapshot.stock_size if snapshot else 0,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "reloads": self.reloads,
+            "hits": self.hits
+        }
+
+
+async def run_distribution_center_refresher(get_db, interval: Optional[float] = None):
+    """Background loop keeping the distribution center index current"""
+    interval = DC_INDEX_REFRESH_SECONDS if interval is None else interval
+    while True:
+        try:
+            db = get_db()
+            if db is not None:
+                await distribution_centers.refresh_if_changed(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Distribution center index refresh failed: {e}")
+        await asyncio.sleep(interval)
+
+
+distribution_centers = DistributionCenterIndex()
@@ -0,0 +1,214 @@
+"""
+Local stand-in for the chat completion API, for offline load tests
+
+FakeLLM produces completions of realistic size with configurable time to first
+token, streaming speed, error rate and share of <<QUERY_DB>> tool calls,
+so the whole chat path (database queries included) can be exercised
+without network access. It is served in-process (LLM_BACKEND=fake) or over
+HTTP by benchmarks.fake_llm_server, which exercises the real client pool.
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+from services.llm_client import QUERY_DB_MARKER, LLMBackend
+from services.metrics import llm_request_seconds, record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+# Time to first token, with a normally distributed relative jitter
+LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "300"))
+LLM_FAKE_JITTER = float(os.getenv("LLM_FAKE_JITTER", "0.2"))
+LLM_FAKE_TOKENS_PER_SECOND = float(os.getenv("LLM_FAKE_TOKENS_PER_SECOND", "250"))
+# Share of completions that fail, and of replies that are database queries
+LLM_FAKE_ERROR_RATE = float(os.getenv("LLM_FAKE_ERROR_RATE", "0"))
+LLM_FAKE_QUERY_RATE = float(os.getenv("LLM_FAKE_QUERY_RATE", "0.3"))
+LLM_FAKE_REPLY_TOKENS = int(os.getenv("LLM_FAKE_REPLY_TOKENS", "60"))
+
+CATEGORIES = ("Jeans", "T-Shirts", "Hoodies", "Dresses", "Jackets", "Shoes", "Sweaters")
+ORDER_NUMBER = re.compile(r"order\D{0,20}?(\d+)", re.IGNORECASE)
+FILLER_WORDS = """
+    thanks for reaching out I would be happy to help with that our store
+    carries a wide range of styles in most sizes and colours and new
+    arrivals land every week let me know your size budget or a brand you
+    like and I can narrow things down for you
+""".split()
+
+
+class FakeLLMError(Exception):
+    """Injected completion failure"""
+
+
+class FakeCompletion:
+    """One planned completion: its text, chunks, usage and timing"""
+
+    def __init__(self, text: str, chunks: List[str], usage: Dict, first_token_seconds: float, fails: bool):
+        self.text = text
+        self.chunks = chunks
+        self.usage = usage
+        self.first_token_seconds = first_token_seconds
+        self.fails = fails
+
+
+class FakeLLM:
+    """
+    Generates completions from the conversation's last user message:
+    summary requests get a short summary, a share of the rest a
+    <<QUERY_DB>> call (order_status when an order number is mentioned,
+    otherwise top_products) and everything else filler text. One word is
+    counted as one token.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = LLM_FAKE_LATENCY_MS,
+        jitter: float = LLM_FAKE_JITTER,
+        tokens_per_second: float = LLM_FAKE_TOKENS_PER_SECOND,
+        error_rate: float = LLM_FAKE_ERROR_RATE,
+        query_rate: float = LLM_FAKE_QUERY_RATE,
+        reply_tokens: int = LLM_FAKE_REPLY_TOKENS,
+        seed: Optional[int] = None
+    ):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.query_rate = query_rate
+        self.reply_tokens = reply_tokens
+        self.random = random.Random(seed)
+
+    def plan(self, messages: List[Dict], max_tokens: int = 1024) -> FakeCompletion:
+        """Decides the completion for a request, without waiting"""
+        last = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        if last.startswith("Update the summary"):
+            words = ["The", "customer", "asked", "about", "products", "and", "orders."]
+        elif self.random.random() < self.query_rate:
+            words = [QUERY_DB_MARKER + json.dumps(self._query(last))]
+        else:
+            words = [self.random.choice(FILLER_WORDS) for _ in range(self.reply_tokens)]
+        words = words[:max(1, max_tokens)]
+        chunks = [words[0]] + [" " + word for word in words[1:]]
+        latency = self.latency_ms / 1000
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        return FakeCompletion(
+            text="".join(chunks),
+            chunks=chunks,
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(words),
+                "total_tokens": prompt_tokens + len(words)
+            },
+            first_token_seconds=max(0.0, self.random.gauss(latency, latency * self.jitter)),
+            fails=self.random.random() < self.error_rate
+        )
+
+    def _query(self, message: str) -> Dict:
+        order = ORDER_NUMBER.search(message)
+        if order:
+            return {"intent": "order_status", "order_id": int(order.group(1))}
+        lowered = message.lower()
+        category = next(
+            (c for c in CATEGORIES if c.lower().rstrip("s") in lowered),
+            self.random.choice(CATEGORIES)
+        )
+        return {
+            "intent": "top_products", "category": category, "brand": None,
+            "department": None, "limit": 5, "sort": "sales"
+        }
+
+    async def complete(self, completion: FakeCompletion) -> str:
+        """Waits as long as the full completion would take, then returns it"""
+        await asyncio.sleep(completion.first_token_seconds)
+        if completion.fails:
+            raise FakeLLMError("Injected completion failure")
+        await asyncio.sleep(len(completion.chunks) / self.tokens_per_second)
+        return completion.text
+
+    async def stream(self, completion: FakeCompletion) -> AsyncIterator[str]:
+        """Yields the completion's chunks at tokens_per_second"""
+        await asyncio.sleep(completion.first_token_seconds)
+        if completion.fails:
+            raise FakeLLMError("Injected completion failure")
+        delay = 1 / self.tokens_per_second
+        for chunk in completion.chunks:
+            yield chunk
+            await asyncio.sleep(delay)
+
+
+class FakeLLMClient(LLMBackend):
+    """In-process LLM backend answering from a FakeLLM"""
+
+    def __init__(self, llm: Optional[FakeLLM] = None):
+        self.llm = llm or FakeLLM()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def chat_completion(
+        self,
+        messages: List[Dict],
+        model: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1024,
+        timeout: Optional[float] = None
+    ) -> str:
+        completion = self.llm.plan(messages, max_tokens)
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            text = await self.llm.complete(completion)
+        except Exception:
+            self.failed += 1
+            llm_request_seconds.observe(time.perf_counter() - started, model, "complete", "error")
+            raise
+        finally:
+            self.in_flight -= 1
+        self.completed += 1
+        record_llm_usage(model, completion.usage)
+        llm_request_seconds.observe(time.perf_counter() - started, model, "complete", "ok")
+        return text
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict],
+        model: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1024,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        completion = self.llm.plan(messages, max_tokens)
+        started = time.perf_counter()
+        outcome = "error"
+        self.in_flight += 1
+        try:
+            async for chunk in self.llm.stream(completion):
+                yield chunk
+            outcome = "ok"
+        except GeneratorExit:
+            outcome = "closed"
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            llm_request_seconds.observe(time.perf_counter() - started, model, "stream", outcome)
+        self.completed += 1
+        record_llm_usage(model, completion.usage)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": "fake",
+            "in_flight": self.in_flight,
+            "queued": 0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "latency_ms": self.llm.latency_ms,
+            "tokens_per_second": self.llm.tokens_per_second,
+            "error_rate": self.llm.error_rate,
+            "query_rate": self.llm.query_rate
+        }
@@ -1,51 +1,270 @@
 import os
-import json
-from groq import Groq
-from typing import List, Dict
-from models.conversation import Conversation
-from schemas.message import Message
-from utils.database import get_db
+import time
+import asyncio
 import logging
-from pymongo import MongoClient
+from typing import AsyncIterator, List, Dict, Optional
+from bson import ObjectId
+from schemas.message import Message
+from services.data_loader import request_loaders
+from services.inventory_availability import get_availability
+from services.llm_client import QUERY_DB_MARKER, get_llm_client
+from services.metrics import stage
+from services.product_sales import PRODUCT_SALES_COLLECTION
+from services.query_planner import (
+    QueryRequest,
+    parse_free_text,
+    parse_tool_call,
+    query_planner
+)
+from services.response_cache import NEVER_CACHE, response_cache
+from services.singleflight import SINGLEFLIGHT_SCOPE, db_flights, flight_key, llm_flights
+from utils.database import get_db, get_products_collection
+from utils.text import normalize_message
 
 logger = logging.getLogger(__name__)
 
+LLM_ERROR_RESPONSE = "I'm having trouble processing your request. Please try again later."
+DB_ERROR_RESPONSE = "I encountered an error processing your request. Please try again."
+ORDER_ACCOUNT_RESPONSE = "I can only look up orders for a signed-in customer account."
+TOP_PRODUCTS_HEADING = "Here are our top products:"
+UNRANKED_PRODUCTS_HEADING = "We don't have sales rankings yet, but here are some of our products:"
+
+
+class QueryMarkerScanner:
+    """
+    Incrementally scans streamed LLM output for the <<QUERY_DB>> marker.
+
+    Text is released as soon as it can no longer be the start of the marker,
+    so tokens reach the client without waiting for the full completion while
+    a marker split across chunks is still detected.
+    """
+
+    def __init__(self, marker: str = QUERY_DB_MARKER):
+        self.marker = marker
+        self.pending = ""
+        self.found = False
+        self.query = ""
+
+    def feed(self, text: str) -> str:
+        """Consumes a chunk and returns the portion that is safe to emit"""
+        if self.found:
+            self.query += text
+            return ""
+
+        self.pending += text
+        index = self.pending.find(self.marker)
+        if index != -1:
+            self.found = True
+            emit = self.pending[:index]
+            self.query = self.pending[index + len(self.marker):]
+            self.pending = ""
+            return emit
+
+        # Hold back the longest suffix that could still grow into the marker
+        hold = 0
+        for size in range(min(len(self.marker) - 1, len(self.pending)), 0, -1):
+            if self.marker.startswith(self.pending[-size:]):
+                hold = size
+                break
+        emit = self.pending[:len(self.pending) - hold]
+        self.pending = self.pending[len(self.pending) - hold:]
+        return emit
+
+    def flush(self) -> str:
+        """Releases any held-back text once the stream has ended"""
+        emit, self.pending = self.pending, ""
+        return emit
+
+    @property
+    def query_complete(self) -> bool:
+        """The query is a single line, so a newline after it ends it"""
+        return self.found and "\n" in self.query.lstrip()
+
+def flight_scope(user_message: str, user_id: Optional[str]):
+    """
+    Scope for coalescing a completion: None to share with any identical
+    prompt, a user id to share only within that user, or False when the
+    call must not be shared at all (personal message without a user)
+    """
+    if SINGLEFLIGHT_SCOPE == "user" or NEVER_CACHE.search(normalize_message(user_message)):
+        return user_id or False
+    return None
+
 class GroqService:
+    model = os.getenv("GROQ_MODEL", "mixtral-8x7b-32768")  # or "llama2-70b-4096"
+    temperature = 0.3
+    max_tokens = 1024
+
     def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        self.db = MongoClient(os.getenv("MONGO_URI"))[os.getenv("DB_NAME")]
+        self.client = get_llm_client()
         
-    async def generate_response(self, user_message: str, conversation_history: List[Message]) -> str:
+    async def generate_response(
+        self,
+        user_message: str,
+        conversation_history: List[Message],
+        summary: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> str:
         """
-        Generates an AI response using Groq's LLM with business logic integration
+        Generates an AI response using Groq's LLM with business logic integration.
+        Identical concurrent prompts share one completion (see flight_scope).
         """
+        cache_key = response_cache.key_for(
+            user_message, conversation_history[:-1], summary, self._cache_params()
+        )
+        if cache_key:
+            cached = await response_cache.get(cache_key, get_db())
+            if cached is not None:
+                return cached
+
+        # System prompt, rolling summary and recent conversation history
+        messages = self._build_messages(conversation_history, summary)
+        scope = flight_scope(user_message, user_id)
+        key = None if scope is False else flight_key(
+            {"messages": messages, "params": self._cache_params()}, scope
+        )
+        return await llm_flights.do(
+            key, lambda: self._complete(messages, user_message, cache_key, user_id)
+        )
+
+    async def _complete(
+        self,
+        messages: List[Dict],
+        user_message: str,
+        cache_key,
+        user_id: Optional[str] = None
+    ) -> str:
+        """One completion (plus database query) for a prompt, cached when allowed"""
+        started = time.perf_counter()
         try:
-            # Format conversation history
-            messages = self._format_conversation_history(conversation_history)
-            
-            # Get system prompt with business logic instructions
-            system_prompt = self._get_system_prompt()
-            
-            # Call Groq API
-            response = self.client.chat.completions.create(
-                messages=[{"role": "system", "content": system_prompt}] + messages,
-                model="mixtral-8x7b-32768",  # or "llama2-70b-4096"
-                temperature=0.3,
-                max_tokens=1024
-            )
-            
-            # Extract and process response
-            llm_response = response.choices[0].message.content
+            # Call Groq API without blocking the event loop
+            with stage("llm"):
+                llm_response = await self.client.chat_completion(
+                    messages=messages,
+                    model=self.model,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                )
             
             # Check if we need to query the database
-            if "<<QUERY_DB>>" in llm_response:
-                return await self._handle_db_query(llm_response, user_message)
-                
-            return llm_response
+            if QUERY_DB_MARKER in llm_response:
+                with stage("db_query"):
+                    llm_response = await self._handle_db_query(llm_response, user_message, user_id)
             
         except Exception as e:
             logger.error(f"Error generating LLM response: {e}")
-            return "I'm having trouble processing your request. Please try again later."
+            return LLM_ERROR_RESPONSE
+
+        if cache_key and llm_response != DB_ERROR_RESPONSE:
+            latency_ms = (time.perf_counter() - started) * 1000
+            await response_cache.set(cache_key, llm_response, latency_ms, get_db())
+        return llm_response
+
+    async def stream_response(
+        self,
+        user_message: str,
+        conversation_history: List[Message],
+        summary: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streams an AI response chunk by chunk as Groq produces it.
+        When the <<QUERY_DB>> marker appears the remaining completion is only
+        read up to the end of the query line, and the database answer is
+        streamed in its place.
+        """
+        cache_key = response_cache.key_for(
+            user_message, conversation_history[:-1], summary, self._cache_params()
+        )
+        if cache_key:
+            cached = await response_cache.get(cache_key, get_db())
+            if cached is not None:
+                yield cached
+                return
+
+        started = time.perf_counter()
+        emitted = []
+        scanner = QueryMarkerScanner()
+        try:
+            stream = self.client.stream_chat_completion(
+                messages=self._build_messages(conversation_history, summary),
+                model=self.model,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            )
+            try:
+                async for text in stream:
+                    emit = scanner.feed(text)
+                    if emit:
+                        emitted.append(emit)
+                        yield emit
+                    if scanner.query_complete:
+                        break
+            finally:
+                # Closing early releases the connection and the in-flight slot
+                await stream.aclose()
+
+            if not scanner.found:
+                tail = scanner.flush()
+                if tail:
+                    emitted.append(tail)
+                    yield tail
+            else:
+                with stage("db_query"):
+                    answer = await self._handle_db_query(
+                        QUERY_DB_MARKER + scanner.query, user_message, user_id
+                    )
+                emitted.append(answer)
+                yield answer
+
+        except Exception as e:
+            logger.error(f"Error streaming LLM response: {e}")
+            yield LLM_ERROR_RESPONSE
+            return
+
+        response = "".join(emitted)
+        if cache_key and response and DB_ERROR_RESPONSE not in response:
+            latency_ms = (time.perf_counter() - started) * 1000
+            await response_cache.set(cache_key, response, latency_ms, get_db())
+
+    def _cache_params(self) -> Dict:
+        """Model parameters that are part of every response cache key"""
+        return {
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+
+    async def summarize(self, previous_summary: Optional[str], messages: List[Message]) -> str:
+        """Extends a conversation summary with messages that left the context window"""
+        transcript = "\n".join(
+            f"{'Customer' if msg.sender == 'user' else 'Assistant'}: {msg.text}"
+            for msg in messages
+        )
+        prompt = (
+            "Update the summary of a customer support conversation with the new "
+            "messages below. Keep product names, order numbers, preferences and "
+            "open questions. Reply with the updated summary only, in at most "
+            "120 words.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}"
+        )
+        return await self.client.chat_completion(
+            messages=[{"role": "user", "content": prompt}],
+            model=self.model,
+            temperature=0,
+            max_tokens=256
+        )
+
+    def _build_messages(self, history: List[Message], summary: Optional[str] = None) -> List[Dict]:
+        """System prompt, optional rolling summary and formatted history"""
+        messages = [{"role": "system", "content": self._get_system_prompt()}]
+        if summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation: {summary}"
+            })
+        return messages + self._format_conversation_history(history)
 
     def _format_conversation_history(self, history: List[Message]) -> List[Dict]:
         """Formats message history for LLM input"""
@@ -72,75 +291,136 @@ class GroqService:
         - For order status requests, ask for order number
         
         Database Query Instructions:
-        When you need to query the database, respond with:
-        <<QUERY_DB>>[your natural language query]
+        When you need to query the database, respond with the marker followed
+        by a single-line JSON object and nothing else:
+        <<QUERY_DB>>{"intent": ..., "category": ..., "brand": ..., "department": ..., "limit": ..., "sort": ...}
+        
+        - intent: "top_products", "search_products" or "order_status"
+        - category, brand, department: product attributes, or null
+        - limit: number of products (1-20, default 5)
+        - sort: "sales", "price_asc", "price_desc" or "newest"
+        - order_id: the order number, for "order_status" only
         
         Example:
         User: "What are your top jeans?"
-        AI: "<<QUERY_DB>>Get top 5 jeans sorted by sales count"
+        AI: <<QUERY_DB>>{"intent": "top_products", "category": "Jeans", "brand": null, "department": null, "limit": 5, "sort": "sales"}
         """
 
-    async def _handle_db_query(self, llm_response: str, user_message: str) -> str:
+    async def answer_top_products(self, request: str, user_id: Optional[str] = None) -> str:
+        """Answers a top-products or order-status request straight from the database, skipping the LLM"""
+        try:
+            return await self._run_query(parse_free_text(request), user_id)
+        except Exception as e:
+            logger.error(f"Error answering top products request: {e}")
+            return DB_ERROR_RESPONSE
+
+    async def _handle_db_query(
+        self,
+        llm_response: str,
+        user_message: str,
+        user_id: Optional[str] = None
+    ) -> str:
         """Handles database queries triggered by the LLM"""
         try:
-            query = llm_response.split("<<QUERY_DB>>")[1].strip()
+            query = llm_response.split(QUERY_DB_MARKER)[1].strip()
             logger.info(f"Executing database query: {query}")
             
-            # Parse query and execute appropriate database operation
-            if "top" in query.lower() and "product" in query.lower():
-                products = await self._query_top_products(query)
-                return self._format_product_response(products)
-            elif "order status" in query.lower():
-                return "Please provide your order number so I can check the status."
-            else:
-                return "I need more information to help with that request. Could you please clarify?"
+            # Structured tool call, falling back to the legacy free-text form
+            request = parse_tool_call(query) or parse_free_text(query)
+            return await self._run_query(request, user_id)
                 
         except Exception as e:
             logger.error(f"Error handling DB query: {e}")
-            return "I encountered an error processing your request. Please try again."
+            return DB_ERROR_RESPONSE
 
-    async def _query_top_products(self, query: str) -> List[Dict]:
-        """Queries top products based on LLM request"""
-        try:
-            limit = 5
-            if "3" in query:
-                limit = 3
-            elif "5" in query:
-                limit = 5
-            elif "10" in query:
-                limit = 10
-                
-            category = None
-            if "jeans" in query.lower():
-                category = "Jeans"
-            elif "shirt" in query.lower():
-                category = "T-Shirts"
-                
-            query_filter = {}
-            if category:
-                query_filter["category"] = category
-                
-            products = await self.db.products.find(query_filter)\
-                .sort("salesCount", -1)\
-                .limit(limit)\
-                .to_list(length=limit)
-                
-            return products
-            
-        except Exception as e:
-            logger.error(f"Error querying products: {e}")
-            raise
+    async def _run_query(self, request: QueryRequest, user_id: Optional[str] = None) -> str:
+        """
+        Executes a structured request and formats the answer; identical
+        concurrent product requests share one execution
+        """
+        if request.intent == "order_status":
+            # Personal; its lookups are batched by the data loaders instead
+            return await self._query_order_status(request, user_id)
+        key = flight_key({
+            "intent": request.intent,
+            "filters": request.filters(),
+            "terms": request.terms,
+            "limit": request.limit,
+            "sort": request.sort
+        })
+        return await db_flights.do(key, lambda: self._query_products(request))
+
+    async def _query_products(self, request: QueryRequest) -> str:
+        products = await query_planner.find_products(
+            get_products_collection(), get_db()[PRODUCT_SALES_COLLECTION], request
+        )
+        if not products and request.unmatched_terms and not request.filters():
+            return "I need more information to help with that request. Could you please clarify?"
+        # One round trip for the stock of every listed product
+        availability = await get_availability(
+            get_db(), [self._product_id(product) for product in products]
+        ) if products else {}
+        heading = UNRANKED_PRODUCTS_HEADING if request.unranked else TOP_PRODUCTS_HEADING
+        return self._format_product_response(products, availability, heading)
+
+    async def _query_order_status(self, request: QueryRequest, user_id: Optional[str] = None) -> str:
+        """
+        Looks up the status of a single order of the chatting user; orders
+        of other customers are answered as if they did not exist
+        """
+        if request.order_id is None:
+            return "Please provide your order number so I can check the status."
+        if not user_id or not ObjectId.is_valid(user_id):
+            return ORDER_ACCOUNT_RESPONSE
+        # Batched with the lookups of concurrent chats
+        loaders = request_loaders()
+        account, order = await asyncio.gather(
+            loaders.accounts.load(ObjectId(user_id)),
+            loaders.orders.load(request.order_id)
+        )
+        if not account or account.get("id") is None:
+            return ORDER_ACCOUNT_RESPONSE
+        if not order or order.get("user_id") != account["id"]:
+            return f"I couldn't find order #{request.order_id}. Could you double-check the number?"
+        # Contents are only read once the order is known to be the user's
+        response = f"Order #{request.order_id} is currently: {order.get('status', 'unknown')}."
+        items = await loaders.order_items.load(request.order_id)
+        if items:
+            products = await loaders.products.load_many(
+                list(dict.fromkeys(item["product_id"] for item in items))
+            )
+            names = {product["id"]: product["name"] for product in products if product}
+            lines = [
+                f"{item.get('quantity') or 1} x {names.get(item['product_id'], 'Unknown product')}"
+                for item in items
+            ]
+            response += " It contains: " + ", ".join(lines) + "."
+        return response
+
+    @staticmethod
+    def _product_id(product: Dict) -> int:
+        # products documents carry id, product_sales documents product_id
+        return product.get("id", product.get("product_id"))
 
-    def _format_product_response(self, products: List[Dict]) -> str:
+    def _format_product_response(
+        self,
+        products: List[Dict],
+        availability: Optional[Dict] = None,
+        heading: str = TOP_PRODUCTS_HEADING
+    ) -> str:
         """Formats product data for LLM response"""
         if not products:
             return "We don't have any products matching that criteria currently."
             
-        response = "Here are our top products:\n"
+        response = heading + "\n"
         for i, product in enumerate(products, 1):
             response += (
-                f"{i}. {product['name']} - ${product['price']} "
-                f"(Category: {product['category']})\n"
+                f"{i}. {product['name']} - ${product['retail_price']:.2f} "
+                f"(Category: {product['category']})"
             )
+            stock = (availability or {}).get(self._product_id(product))
+            if stock is not None:
+                response += " - in stock" if stock["available_items"] > 0 else " - out of stock"
+            response += "\n"
         response += "\nWould you like more information about any of these?"
         return response
\ No newline at end of file
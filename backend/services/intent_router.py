@@ -0,0 +1,155 @@
+import os
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from utils.text import normalize_message
+
+# Minimum confidence for answering without the LLM
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.75"))
+
+# Words that carry no intent and are ignored when measuring coverage
+FILLER_WORDS = frozenset("""
+    a an the is are am be was do does did can could would will you your yours
+    i me we us our it its this that these those there what whats which how
+    please pls to of for about on in at with and or any some tell show give
+    let know so very much lot just really ok okay again
+""".split())
+
+# intent -> [(phrase, weight)]; weights of distinct phrases add up (capped at 1)
+INTENT_PATTERNS: Dict[str, List[Tuple[str, float]]] = {
+    "greeting": [
+        ("hello", 1.0), ("hi", 1.0), ("hey", 1.0), ("hiya", 1.0),
+        ("good morning", 1.0), ("good afternoon", 1.0), ("good evening", 1.0),
+    ],
+    "thanks": [
+        ("thanks", 1.0), ("thank", 0.8), ("thank you", 1.0), ("thx", 1.0),
+        ("ty", 0.8), ("cheers", 0.8), ("appreciate", 0.8),
+    ],
+    "top_products": [
+        ("top product", 1.0), ("top products", 1.0), ("top", 0.8),
+        ("best seller", 1.0), ("best sellers", 1.0), ("bestseller", 1.0),
+        ("bestsellers", 1.0), ("best selling", 1.0), ("most popular", 1.0),
+        ("popular", 0.7), ("trending", 0.7), ("best", 0.6),
+        ("products", 0.3), ("items", 0.2),
+        ("jeans", 0.3), ("shirts", 0.3), ("shirt", 0.3), ("t shirts", 0.3),
+        ("hoodies", 0.3), ("dresses", 0.3), ("jackets", 0.3), ("shoes", 0.3),
+    ],
+    "order_status": [
+        ("order status", 1.0), ("where is my order", 1.0), ("track my order", 1.0),
+        ("track order", 1.0), ("tracking", 0.8), ("my order", 0.6), ("order", 0.4),
+        ("status", 0.4), ("shipped", 0.6), ("delivered", 0.5), ("where", 0.2),
+    ],
+    "returns": [
+        ("return policy", 1.0), ("returns policy", 1.0), ("refund policy", 1.0),
+        ("return", 0.7), ("returns", 0.7), ("refund", 0.7), ("refunds", 0.7),
+        ("exchange", 0.6), ("send back", 0.7), ("policy", 0.3),
+    ],
+}
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over word tokens: every phrase is found in a
+    single left-to-right pass, however many phrases are registered.
+    """
+
+    def __init__(self, phrases: Dict[Tuple[str, ...], List[Tuple[str, float]]]):
+        # Node i: transitions, failure link and (length, payload) outputs
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.outputs: List[List[Tuple[int, List[Tuple[str, float]]]]] = [[]]
+
+        for tokens, payload in phrases.items():
+            node = 0
+            for token in tokens:
+                if token not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                    self.goto[node][token] = len(self.goto) - 1
+                node = self.goto[node][token]
+            self.outputs[node].append((len(tokens), payload))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(token, 0)
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def search(self, tokens: List[str]):
+        """Yields (start, end, payload) for every phrase occurrence"""
+        node = 0
+        for index, token in enumerate(tokens):
+            while node and token not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(token, 0)
+            for length, payload in self.outputs[node]:
+                yield index - length + 1, index + 1, payload
+
+
+class IntentMatch:
+    def __init__(self, intent: str, confidence: float, phrases: List[str]):
+        self.intent = intent
+        self.confidence = confidence
+        self.phrases = phrases
+
+    @property
+    def confident(self) -> bool:
+        return self.confidence >= INTENT_CONFIDENCE_THRESHOLD
+
+
+class IntentRouter:
+    """
+    Scores every rule-based intent for a message in one automaton pass.
+
+    Confidence combines the summed weight of the intent's matched phrases
+    with how much of the message's non-filler words they cover, and is
+    reduced when a second intent also matches, so mixed or open-ended
+    messages fall through to the LLM.
+    """
+
+    def __init__(self, patterns: Dict[str, List[Tuple[str, float]]] = INTENT_PATTERNS):
+        phrases: Dict[Tuple[str, ...], List[Tuple[str, float]]] = {}
+        for intent, entries in patterns.items():
+            for phrase, weight in entries:
+                tokens = tuple(normalize_message(phrase).split())
+                phrases.setdefault(tokens, []).append((intent, weight))
+        self.automaton = AhoCorasick(phrases)
+
+    def classify(self, message: str) -> Optional[IntentMatch]:
+        """Returns the most likely intent, or None if nothing matched"""
+        tokens = normalize_message(message).split()
+        content = [i for i, token in enumerate(tokens) if token not in FILLER_WORDS]
+        if not content:
+            return None
+
+        weights: Dict[str, Dict[str, float]] = {}
+        covered: Dict[str, set] = {}
+        for start, end, payload in self.automaton.search(tokens):
+            phrase = " ".join(tokens[start:end])
+            for intent, weight in payload:
+                if weight <= 0:
+                    continue
+                weights.setdefault(intent, {})[phrase] = weight
+                covered.setdefault(intent, set()).update(range(start, end))
+
+        scores = []
+        for intent, phrase_weights in weights.items():
+            strength = min(1.0, sum(phrase_weights.values()))
+            coverage = len(covered[intent].intersection(content)) / len(content)
+            scores.append((strength * (0.5 + 0.5 * coverage), intent))
+        if not scores:
+            return None
+
+        scores.sort(reverse=True)
+        confidence, intent = scores[0]
+        if len(scores) > 1:
+            confidence -= scores[1][0] * 0.5
+        return IntentMatch(intent, round(max(confidence, 0.0), 3), sorted(weights[intent]))
+
+
+intent_router = IntentRouter()
@@ -0,0 +1,329 @@
+import os
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_AVAILABILITY_COLLECTION = "inventory_availability"
+VIEW_STATE_COLLECTION = "materialized_views"
+# Item changes remembered per counter document, so replaying one is a no-op
+AVAILABILITY_APPLIED_KEEP = int(os.getenv("AVAILABILITY_APPLIED_KEEP", "100"))
+DUPLICATE_KEY = 11000
+
+# inventory_items holds one document per physical item; these count. An
+# item without a quantity (exports with one row per item) is one unit
+AVAILABLE_MATCH = {
+    "status": "available",
+    "$or": [{"quantity": {"$gt": 0}}, {"quantity": None}]
+}
+ITEM_QUANTITY = {"$ifNull": ["$quantity", 1]}
+ITEM_FIELDS = {"_id": 0, "product_id": 1, "distribution_center_id": 1, "quantity": 1, "status": 1}
+
+
+def item_quantity(item: Dict) -> int:
+    """Python twin of ITEM_QUANTITY"""
+    quantity = item.get("quantity")
+    return 1 if quantity is None else quantity
+
+
+def is_available(item: Optional[Dict]) -> bool:
+    """Python twin of AVAILABLE_MATCH"""
+    return bool(item) and item.get("status") == "available" and item_quantity(item) > 0
+
+
+def availability_pipeline(into: str = INVENTORY_AVAILABILITY_COLLECTION) -> List[Dict]:
+    """
+    Counts available inventory_items per product and per (product,
+    distribution center) and writes one document per product:
+    {_id: product_id, available_items, available_quantity,
+     centers: {"<distribution_center_id>": {items, quantity}}}
+    """
+    return [
+        {"$match": AVAILABLE_MATCH},
+        {"$group": {
+            "_id": {"product_id": "$product_id", "center": "$distribution_center_id"},
+            "items": {"$sum": 1},
+            "quantity": {"$sum": ITEM_QUANTITY}
+        }},
+        {"$group": {
+            "_id": "$_id.product_id",
+            "available_items": {"$sum": "$items"},
+            "available_quantity": {"$sum": "$quantity"},
+            "centers": {"$push": {
+                "k": {"$toString": "$_id.center"},
+                "v": {"items": "$items", "quantity": "$quantity"}
+            }}
+        }},
+        {"$set": {"product_id": "$_id", "centers": {"$arrayToObject": "$centers"}}},
+        {"$out": into}
+    ]
+
+
+def rebuild_inventory_availability_sync(db):
+    """
+    Rebuilds the counters from scratch with a synchronous pymongo database,
+    for use right after inventory_items has been (re)loaded. The counters
+    are built beside the live collection and renamed over it.
+    """
+    staging = db[INVENTORY_AVAILABILITY_COLLECTION + "_staging"]
+    staging.drop()
+    list(db.inventory_items.aggregate(availability_pipeline(into=staging.name), allowDiskUse=True))
+    if staging.name not in db.list_collection_names(filter={"name": staging.name}):
+        # $out writes nothing when no item is available
+        db.create_collection(staging.name)
+    db.client.admin.command(
+        "renameCollection", f"{db.name}.{staging.name}",
+        to=f"{db.name}.{INVENTORY_AVAILABILITY_COLLECTION}", dropTarget=True
+    )
+    # The rebuilt counters already reflect every item's current status
+    db.inventory_items.update_many(
+        {"availability_pending": {"$exists": True}}, {"$unset": {"availability_pending": ""}}
+    )
+    db[VIEW_STATE_COLLECTION].update_one(
+        {"_id": INVENTORY_AVAILABILITY_COLLECTION},
+        {"$set": {"refreshed_at": datetime.utcnow()}, "$inc": {"revision": 1}},
+        upsert=True
+    )
+
+
+async def availability_revision(db) -> Optional[int]:
+    """
+    Counter bumped by every rebuild and every change to the counters, so
+    in-memory copies (the distribution center index) can tell they are stale
+    """
+    state = await db[VIEW_STATE_COLLECTION].find_one(
+        {"_id": INVENTORY_AVAILABILITY_COLLECTION}, {"revision": 1}
+    )
+    return state.get("revision") if state else None
+
+
+async def center_stock(db) -> List[Dict]:
+    """
+    Available quantity per (product, distribution center) with stock, read
+    from the counters: [{product_id, distribution_center_id, quantity}]
+    """
+    return await db[INVENTORY_AVAILABILITY_COLLECTION].aggregate([
+        {"$project": {"_id": 0, "product_id": "$_id", "centers": {"$objectToArray": {"$ifNull": ["$centers", {}]}}}},
+        {"$unwind": "$centers"},
+        {"$match": {"centers.v.items": {"$gt": 0}}},
+        {"$project": {
+            "product_id": 1,
+            "distribution_center_id": {"$toInt": "$centers.k"},
+            "quantity": "$centers.v.quantity"
+        }}
+    ], allowDiskUse=True).to_list(length=None)
+
+
+def availability_deltas(
+    changes: Iterable[Tuple[Optional[Dict], Optional[Dict]]]
+) -> Dict[Tuple[int, int], List[int]]:
+    """
+    Net counter changes for a batch of item changes
+    Args:
+        changes: (before, after) item documents; None for an insert's before
+            or a delete's after
+    Returns:
+        {(product_id, distribution_center_id): [items delta, quantity delta]}
+        without zero entries
+    """
+    deltas: Dict[Tuple[int, int], List[int]] = defaultdict(lambda: [0, 0])
+    for before, after in changes:
+        for item, sign in ((before, -1), (after, 1)):
+            if is_available(item):
+                delta = deltas[(item["product_id"], item["distribution_center_id"])]
+                delta[0] += sign
+                delta[1] += sign * item_quantity(item)
+    return {key: delta for key, delta in deltas.items() if delta != [0, 0]}
+
+
+def counter_writes(
+    per_product: Dict[int, Dict[str, int]],
+    change_id: Optional[ObjectId] = None,
+    upsert: bool = True
+) -> List[UpdateOne]:
+    """
+    One counter update per product; with a change_id, counters that already
+    recorded the change are left alone
+    """
+    writes = []
+    for product_id, inc in per_product.items():
+        query = {"_id": product_id}
+        update = {"$inc": inc, "$setOnInsert": {"product_id": product_id}}
+        if change_id is not None:
+            query["applied_changes"] = {"$ne": change_id}
+            update["$push"] = {"applied_changes": {"$each": [change_id], "$slice": -AVAILABILITY_APPLIED_KEEP}}
+        writes.append(UpdateOne(query, update, upsert=upsert))
+    return writes
+
+
+async def apply_inventory_changes(
+    db,
+    changes: Iterable[Tuple[Optional[Dict], Optional[Dict]]],
+    change_id: Optional[ObjectId] = None
+) -> int:
+    """
+    Folds item changes into the counters with one unordered bulk write
+    Args:
+        db: MongoDB database connection
+        changes: (before, after) item documents, see availability_deltas
+        change_id: Identifies the changes, making a repeated call a no-op
+    Returns:
+        Number of counter documents touched
+    """
+    try:
+        per_product: Dict[int, Dict[str, int]] = defaultdict(dict)
+        for (product_id, center), (items, quantity) in availability_deltas(changes).items():
+            inc = per_product[product_id]
+            inc["available_items"] = inc.get("available_items", 0) + items
+            inc["available_quantity"] = inc.get("available_quantity", 0) + quantity
+            inc[f"centers.{center}.items"] = items
+            inc[f"centers.{center}.quantity"] = quantity
+        if not per_product:
+            return 0
+        counters = db[INVENTORY_AVAILABILITY_COLLECTION]
+        try:
+            await counters.bulk_write(counter_writes(per_product, change_id), ordered=False)
+        except BulkWriteError as e:
+            if change_id is None or any(
+                error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])
+            ):
+                raise
+            # The upsert met an existing counter (created concurrently, or
+            # one that already recorded the change): update it in place
+            await counters.bulk_write(counter_writes(per_product, change_id, upsert=False), ordered=False)
+        await db[VIEW_STATE_COLLECTION].update_one(
+            {"_id": INVENTORY_AVAILABILITY_COLLECTION},
+            {"$set": {"updated_at": datetime.utcnow()}, "$inc": {"revision": 1}},
+            upsert=True
+        )
+        return len(per_product)
+    except PyMongoError as e:
+        logger.error(f"Database error updating inventory availability: {e}")
+        raise
+
+
+async def update_inventory_status(db, item_id: int, status: str) -> Optional[Dict]:
+    """
+    Changes an inventory item's status and adjusts the counters to match.
+    The change is queued on the item in the same write as the status, then
+    folded into the counters and dequeued; a change left queued by a failure
+    is reapplied by the next change of the item or by
+    apply_pending_inventory_changes, and applying one twice is a no-op.
+    Args:
+        db: MongoDB database connection
+        item_id: id of the inventory item
+        status: New status, e.g. "available", "reserved" or "sold"
+    Returns:
+        The updated item fields, or None if the item does not exist
+    """
+    try:
+        while True:
+            before = await db.inventory_items.find_one({"id": item_id}, ITEM_FIELDS)
+            if before is None:
+                return None
+            after = {**before, "status": status}
+            # Only written if the status is still the one read, so every
+            # queued change starts where the previous one ended
+            result = await db.inventory_items.update_one(
+                {"id": item_id, "status": before.get("status")},
+                {
+                    "$set": {"status": status, "updated_at": datetime.utcnow()},
+                    "$push": {"availability_pending": {"_id": ObjectId(), "before": before, "after": after}}
+                }
+            )
+            if result.matched_count:
+                break
+        await apply_item_pending_changes(db, item_id)
+        return after
+    except PyMongoError as e:
+        logger.error(f"Database error updating inventory item {item_id}: {e}")
+        raise
+
+
+async def apply_item_pending_changes(db, item_id: int) -> int:
+    """
+    Folds the changes queued on one item into the counters, oldest first
+    Returns:
+        Number of changes applied
+    """
+    item = await db.inventory_items.find_one({"id": item_id}, {"availability_pending": 1})
+    pending = (item or {}).get("availability_pending") or []
+    for change in pending:
+        await apply_inventory_changes(db, [(change["before"], change["after"])], change_id=change["_id"])
+        await db.inventory_items.update_one(
+            {"id": item_id}, {"$pull": {"availability_pending": {"_id": change["_id"]}}}
+        )
+    return len(pending)
+
+
+async def apply_pending_inventory_changes(db) -> int:
+    """
+    Reapplies the item changes a failure left queued, e.g. at startup
+    Returns:
+        Number of changes applied
+    """
+    try:
+        applied = 0
+        async for item in db.inventory_items.find(
+            {"availability_pending.0": {"$exists": True}}, {"_id": 0, "id": 1}
+        ):
+            applied += await apply_item_pending_changes(db, item["id"])
+        if applied:
+            logger.info(f"Reapplied {applied} queued inventory changes")
+        return applied
+    except PyMongoError as e:
+        logger.error(f"Database error reapplying inventory changes: {e}")
+        raise
+
+
+async def get_availability(
+    db,
+    product_ids: List[int],
+    distribution_center_id: Optional[int] = None
+) -> Dict[int, Dict]:
+    """
+    Availability of several products in one round trip
+    Args:
+        db: MongoDB database connection
+        product_ids: Products to look up
+        distribution_center_id: Only count stock held at this center
+    Returns:
+        {product_id: {"available_items", "available_quantity", "centers"}};
+        products without available stock have zero counts
+    """
+    try:
+        projection = {"available_items": 1, "available_quantity": 1, "centers": 1}
+        if distribution_center_id is not None:
+            projection = {f"centers.{distribution_center_id}": 1}
+        counters = {
+            doc["_id"]: doc
+            async for doc in db[INVENTORY_AVAILABILITY_COLLECTION].find(
+                {"_id": {"$in": list(set(product_ids))}}, projection
+            )
+        }
+        result = {}
+        for product_id in product_ids:
+            doc = counters.get(product_id, {})
+            centers = {
+                int(center): counts for center, counts in (doc.get("centers") or {}).items()
+                if counts.get("items", 0) > 0
+            }
+            if distribution_center_id is not None:
+                counts = centers.get(distribution_center_id, {})
+                items, quantity = counts.get("items", 0), counts.get("quantity", 0)
+            else:
+                items, quantity = doc.get("available_items", 0), doc.get("available_quantity", 0)
+            result[product_id] = {
+                "available_items": max(items, 0),
+                "available_quantity": max(quantity, 0),
+                "centers": centers
+            }
+        return result
+    except PyMongoError as e:
+        logger.error(f"Database error reading inventory availability: {e}")
+        raise
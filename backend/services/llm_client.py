@@ -0,0 +1,295 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+import httpx
+from services.metrics import llm_request_seconds, record_llm_usage, registry
+
+logger = logging.getLogger(__name__)
+
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "64"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+# "groq": any OpenAI-compatible HTTP API at GROQ_BASE_URL (Groq, or a local
+# benchmarks.fake_llm_server); "fake": the in-process stand-in (services.fake_llm)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+
+# Prefix of a model reply asking for a database query instead of answering
+QUERY_DB_MARKER = "<<QUERY_DB>>"
+
+
+class LLMBackend(ABC):
+    """Interface GroqService uses to reach a chat completion model"""
+
+    @abstractmethod
+    async def chat_completion(
+        self,
+        messages: List[Dict],
+        model: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1024,
+        timeout: Optional[float] = None
+    ) -> str:
+        """Runs a single chat completion and returns the message content"""
+
+    @abstractmethod
+    def stream_chat_completion(
+        self,
+        messages: List[Dict],
+        model: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1024,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Streams a chat completion, yielding content deltas as they arrive"""
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        """Counters reported under "llm" in /api/health"""
+
+    async def aclose(self):
+        """Releases pooled connections, if any"""
+
+
+class LLMClient(LLMBackend):
+    """
+    Non-blocking client for Groq's OpenAI-compatible chat completions API.
+
+    A single pooled keep-alive httpx connection set is shared by every call,
+    and a semaphore caps how many completions are in flight at once; callers
+    beyond the cap wait in line and are reported as queued.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = GROQ_BASE_URL,
+        max_in_flight: int = LLM_MAX_IN_FLIGHT,
+        timeout: float = LLM_TIMEOUT_SECONDS
+    ):
+        self.api_key = api_key or os.getenv("GROQ_API_KEY")
+        self.base_url = base_url.rstrip("/")
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._http: Optional[httpx.AsyncClient] = None
+        self.in_flight = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(self.timeout, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_MAX_KEEPALIVE
+                )
+            )
+        return self._http
+
+    async def chat_completion(
+        self,
+        messages: List[Dict],
+        model: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1024,
+        timeout: Optional[float] = None
+    ) -> str:
+        """
+        Runs a single chat completion and returns the message content
+        Args:
+            messages: OpenAI-style role/content messages
+            model: Model name
+            temperature: Sampling temperature
+            max_tokens: Completion token limit
+            timeout: Per-call deadline in seconds, including time spent queued
+        Returns:
+            Completion text
+        """
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+
+        async def call():
+            async with self._slot():
+                response = await self.http.post("/chat/completions", json=payload)
+                response.raise_for_status()
+                body = response.json()
+                record_llm_usage(model, body.get("usage"))
+                return body["choices"][0]["message"]["content"]
+
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(call(), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.failed += 1
+            llm_request_seconds.observe(time.perf_counter() - started, model, "complete", "timeout")
+            raise
+        except Exception:
+            self.failed += 1
+            llm_request_seconds.observe(time.perf_counter() - started, model, "complete", "error")
+            raise
+        self.completed += 1
+        llm_request_seconds.observe(time.perf_counter() - started, model, "complete", "ok")
+        return result
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict],
+        model: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1024,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streams a chat completion, yielding content deltas as they arrive.
+        The timeout bounds the wait for a slot and for each network read.
+        """
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        deadline = timeout or self.timeout
+
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async with self._slot(deadline):
+                async with self.http.stream(
+                    "POST",
+                    "/chat/completions",
+                    json=payload,
+                    timeout=httpx.Timeout(deadline, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = json.loads(data)
+                        # Groq reports usage on the final chunk under x_groq
+                        record_llm_usage(model, chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage"))
+                        choices = chunk.get("choices") or []
+                        if choices:
+                            text = choices[0].get("delta", {}).get("content")
+                            if text:
+                                yield text
+            outcome = "ok"
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            self.timeouts += 1
+            self.failed += 1
+            outcome = "timeout"
+            raise
+        except GeneratorExit:
+            # The consumer stopped reading early
+            outcome = "closed"
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            llm_request_seconds.observe(time.perf_counter() - started, model, "stream", outcome)
+        self.completed += 1
+
+    def _slot(self, timeout: Optional[float] = None) -> "_Slot":
+        return _Slot(self, timeout)
+
+    def stats(self) -> Dict:
+        """Snapshot of concurrency and outcome counters"""
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts
+        }
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class _Slot:
+    """Async context manager holding one in-flight slot of an LLMClient"""
+
+    def __init__(self, client: LLMClient, timeout: Optional[float]):
+        self.client = client
+        self.timeout = timeout
+
+    async def __aenter__(self):
+        client = self.client
+        client.queued += 1
+        try:
+            if self.timeout:
+                await asyncio.wait_for(client._semaphore.acquire(), self.timeout)
+            else:
+                await client._semaphore.acquire()
+        finally:
+            client.queued -= 1
+        client.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.client.in_flight -= 1
+        self.client._semaphore.release()
+        return False
+
+
+_llm_client: Optional[LLMBackend] = None
+
+
+def create_llm_client(backend: str = LLM_BACKEND) -> LLMBackend:
+    """Builds the LLM backend named by LLM_BACKEND"""
+    if backend == "groq":
+        return LLMClient()
+    if backend == "fake":
+        from services.fake_llm import FakeLLMClient
+        return FakeLLMClient()
+    raise ValueError(f"Unknown LLM_BACKEND: {backend}")
+
+
+def get_llm_client() -> LLMBackend:
+    """Returns the process-wide LLM client, creating it on first use"""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = create_llm_client()
+    return _llm_client
+
+
+registry.gauge(
+    "llm_requests_in_flight", "LLM completions holding a slot",
+    function=lambda: {(): _llm_client.stats()["in_flight"] if _llm_client else 0}
+)
+registry.gauge(
+    "llm_requests_queued", "LLM completions waiting for a slot",
+    function=lambda: {(): _llm_client.stats()["queued"] if _llm_client else 0}
+)
+
+
+async def close_llm_client():
+    """Closes pooled connections; the client reconnects lazily if reused"""
+    if _llm_client is not None:
+        await _llm_client.aclose()
@@ -0,0 +1,320 @@
+from datetime import datetime
+from bson import ObjectId
+from typing import Dict, List, Optional, Tuple
+from schemas.message import Message
+from utils.serialization import construct_from
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+import os
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Messages per bucket document; each conversation's history is split into
+# fixed-size buckets keyed by (conversation_id, bucket = seq // size)
+MESSAGE_BUCKET_SIZE = int(os.getenv("MESSAGE_BUCKET_SIZE", "50"))
+# Characters of the newest message kept on the conversation for list views
+CONVERSATION_PREVIEW_CHARS = int(os.getenv("CONVERSATION_PREVIEW_CHARS", "120"))
+# Tries of a bucket write once its sequence numbers are counted, and the
+# pause before the first retry (doubled for each further one)
+MESSAGE_WRITE_ATTEMPTS = int(os.getenv("MESSAGE_WRITE_ATTEMPTS", "4"))
+MESSAGE_WRITE_BACKOFF_SECONDS = float(os.getenv("MESSAGE_WRITE_BACKOFF_SECONDS", "0.05"))
+DUPLICATE_KEY = 11000
+
+async def create_message_indexes(db):
+    """Creates the indexes the bucket store relies on"""
+    await db.message_buckets.create_index(
+        [("conversation_id", 1), ("bucket", -1)],
+        unique=True
+    )
+
+def bucket_for(seq: int) -> int:
+    return seq // MESSAGE_BUCKET_SIZE
+
+def buckets_needed(limit: int) -> int:
+    """Newest buckets that must be read to return `limit` messages"""
+    return -(-limit // MESSAGE_BUCKET_SIZE) + 1
+
+def message_document(message: Message, seq: int) -> dict:
+    """Serialises a message for storage in a bucket"""
+    message_dict = message.dict()
+    message_dict["seq"] = seq
+    message_dict["timestamp"] = datetime.utcnow()
+    return message_dict
+
+def message_preview(message: Message, timestamp: datetime) -> dict:
+    """Truncated copy of a message kept on the conversation for summaries"""
+    return {
+        "text": message.text[:CONVERSATION_PREVIEW_CHARS],
+        "sender": message.sender,
+        "timestamp": timestamp
+    }
+
+def bucket_writes(
+    conversation_id: ObjectId,
+    message_docs: List[dict],
+    upsert: bool = True
+) -> List[UpdateOne]:
+    """
+    Groups message documents into one upsert per bucket they land in. A
+    bucket that already holds the first of its messages is left alone, so
+    the writes can be repeated without duplicating anything.
+    """
+    grouped: Dict[int, List[dict]] = {}
+    for message_dict in message_docs:
+        grouped.setdefault(bucket_for(message_dict["seq"]), []).append(message_dict)
+    return [
+        UpdateOne(
+            {
+                "conversation_id": conversation_id,
+                "bucket": bucket,
+                "messages.seq": {"$ne": docs[0]["seq"]}
+            },
+            {
+                "$push": {"messages": {"$each": docs}},
+                "$inc": {"count": len(docs)},
+                "$setOnInsert": {"created_at": datetime.utcnow()}
+            },
+            upsert=upsert
+        )
+        for bucket, docs in grouped.items()
+    ]
+
+async def write_buckets(db, conversation_id: ObjectId, message_docs: List[dict]):
+    """
+    Stores counted messages in their buckets, retrying failed writes: the
+    conversation already claims their sequence numbers, so giving up would
+    leave a gap in its history
+    Args:
+        db: MongoDB database connection
+        conversation_id: ID of the conversation
+        message_docs: Message documents with their sequence numbers
+    """
+    for attempt in range(1, MESSAGE_WRITE_ATTEMPTS + 1):
+        try:
+            try:
+                await db.message_buckets.bulk_write(
+                    bucket_writes(conversation_id, message_docs), ordered=False
+                )
+            except BulkWriteError as e:
+                if any(error.get("code") != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                    raise
+                # The upsert found a bucket that exists (created concurrently,
+                # or already holding these messages): push into it instead
+                await db.message_buckets.bulk_write(
+                    bucket_writes(conversation_id, message_docs, upsert=False), ordered=False
+                )
+            return
+        except PyMongoError as e:
+            if attempt == MESSAGE_WRITE_ATTEMPTS:
+                raise
+            logger.warning(f"Writing message buckets failed (attempt {attempt}): {e}")
+            await asyncio.sleep(MESSAGE_WRITE_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+def flatten_buckets(
+    buckets: List[dict],
+    limit: Optional[int] = None,
+    before: Optional[int] = None,
+    since: Optional[int] = None
+) -> List[dict]:
+    """Merges bucket documents into a seq-ordered list of raw messages"""
+    messages = []
+    for bucket in buckets:
+        messages.extend(bucket.get("messages", []))
+    if before is not None:
+        messages = [msg for msg in messages if msg["seq"] < before]
+    if since is not None:
+        messages = [msg for msg in messages if msg["seq"] >= since]
+    messages.sort(key=lambda msg: msg["seq"])
+    if limit is not None:
+        messages = messages[-limit:] if limit > 0 else []
+    return messages
+
+async def append_messages(
+    db,
+    conversation_id: str,
+    messages: List[Message],
+    upsert_fields: Optional[dict] = None
+) -> Tuple[dict, List[Message]]:
+    """
+    Appends messages to a conversation in one conversation write and one
+    bucket write, whatever the length of the history
+    Args:
+        db: MongoDB database connection
+        conversation_id: ID of the conversation
+        messages: Messages to add, in order
+        upsert_fields: Fields for a conversation that does not exist yet;
+            when given the conversation is created in the same call
+    Returns:
+        Tuple of the updated conversation document (without messages) and
+        the stored Message objects with their sequence numbers
+    """
+    try:
+        now = datetime.utcnow()
+        update = {
+            "$inc": {"message_count": len(messages)},
+            "$set": {"updated_at": now, "last_message": message_preview(messages[-1], now)}
+        }
+        if upsert_fields:
+            update["$setOnInsert"] = {**upsert_fields, "created_at": now}
+
+        conversation = await db.conversations.find_one_and_update(
+            {"_id": ObjectId(conversation_id)},
+            update,
+            projection={"messages": 0},
+            upsert=bool(upsert_fields),
+            return_document=ReturnDocument.AFTER
+        )
+        if not conversation:
+            raise ValueError("Conversation not found")
+
+        first_seq = conversation["message_count"] - len(messages)
+        message_docs = [
+            message_document(message, first_seq + offset)
+            for offset, message in enumerate(messages)
+        ]
+        await write_buckets(db, ObjectId(conversation_id), message_docs)
+        return conversation, [construct_from(Message, msg) for msg in message_docs]
+    except PyMongoError as e:
+        logger.error(f"Database error appending messages: {e}")
+        raise
+
+async def append_message(db, conversation_id: str, message: Message) -> Message:
+    """
+    Appends a single message to its conversation's tail bucket
+    Args:
+        db: MongoDB database connection
+        conversation_id: ID of the conversation
+        message: Message object to add
+    Returns:
+        The stored Message, including its sequence number
+    """
+    _, stored = await append_messages(db, conversation_id, [message])
+    return stored[0]
+
+async def migrate_embedded_messages(db, conversation: dict) -> dict:
+    """
+    Moves the embedded messages array of a pre-bucket conversation into the
+    bucket store and returns the document in its bucketed form
+    """
+    messages = conversation.pop("messages", None) or []
+    for seq, msg in enumerate(messages):
+        msg["seq"] = seq
+
+    if messages:
+        grouped: Dict[int, List[dict]] = {}
+        for msg in messages:
+            grouped.setdefault(bucket_for(msg["seq"]), []).append(msg)
+        await db.message_buckets.bulk_write([
+            UpdateOne(
+                {"conversation_id": conversation["_id"], "bucket": bucket},
+                {"$setOnInsert": {
+                    "messages": docs,
+                    "count": len(docs),
+                    "created_at": datetime.utcnow()
+                }},
+                upsert=True
+            )
+            for bucket, docs in grouped.items()
+        ], ordered=False)
+
+    await db.conversations.update_one(
+        {"_id": conversation["_id"], "message_count": {"$exists": False}},
+        {"$set": {"message_count": len(messages)}, "$unset": {"messages": ""}}
+    )
+    conversation["message_count"] = len(messages)
+    conversation["buckets"] = [{"messages": messages}]
+    return conversation
+
+async def find_conversation_with_messages(
+    db,
+    conversation_id: str,
+    limit: Optional[int] = None,
+    since: Optional[int] = None,
+    unsummarized: bool = False
+) -> Optional[dict]:
+    """
+    Loads a conversation and its newest buckets in a single round trip
+    Args:
+        db: MongoDB database connection
+        conversation_id: ID of the conversation
+        limit: Only load the buckets needed for this many newest messages
+        since: Only load messages from min(summary_seq, since) on: the ones
+            a client lacks and the ones its rolling summary does not cover
+        unsummarized: Only load messages from summary_seq on, the ones a
+            context window can still need
+    Returns:
+        Conversation document with a seq-ordered `messages` list, or None
+    """
+    lookup = {
+        "from": "message_buckets",
+        "localField": "_id",
+        "foreignField": "conversation_id",
+        "as": "buckets"
+    }
+    bucket_pipeline = [{"$sort": {"bucket": -1}}]
+    if since is not None or unsummarized:
+        first_seq = "$$summary_seq" if since is None else {"$min": ["$$summary_seq", since]}
+        lookup["let"] = {"summary_seq": {"$ifNull": ["$summary_seq", 0]}}
+        bucket_pipeline.insert(0, {"$match": {"$expr": {"$gte": [
+            "$bucket",
+            {"$floor": {"$divide": [first_seq, MESSAGE_BUCKET_SIZE]}}
+        ]}}})
+    if limit is not None:
+        bucket_pipeline.append({"$limit": buckets_needed(limit)})
+    bucket_pipeline.append({"$project": {"messages": 1}})
+    lookup["pipeline"] = bucket_pipeline
+
+    cursor = db.conversations.aggregate([
+        {"$match": {"_id": ObjectId(conversation_id)}},
+        {"$lookup": lookup}
+    ])
+    documents = await cursor.to_list(length=1)
+    if not documents:
+        return None
+
+    conversation = documents[0]
+    if "message_count" not in conversation:
+        conversation = await migrate_embedded_messages(db, conversation)
+    if since is not None or unsummarized:
+        summary_seq = conversation.get("summary_seq", 0)
+        since = summary_seq if since is None else min(summary_seq, since)
+    conversation["messages"] = flatten_buckets(conversation.pop("buckets"), limit=limit, since=since)
+    return conversation
+
+async def get_messages(
+    db,
+    conversation_id: str,
+    limit: Optional[int] = None,
+    before: Optional[int] = None
+) -> List[Message]:
+    """
+    Reads messages from the bucket store in sequence order
+    Args:
+        db: MongoDB database connection
+        conversation_id: ID of the conversation
+        limit: Return at most this many of the newest matching messages
+        before: Only return messages with a sequence number below this
+    Returns:
+        List of Message objects, oldest first
+    """
+    try:
+        query = {"conversation_id": ObjectId(conversation_id)}
+        if before is not None:
+            if before <= 0:
+                return []
+            query["bucket"] = {"$lte": bucket_for(before - 1)}
+
+        cursor = db.message_buckets.find(query, {"messages": 1})
+        if limit is not None:
+            # Only the newest buckets are needed; the newest one may be partial
+            cursor = cursor.sort("bucket", -1).limit(buckets_needed(limit))
+        else:
+            cursor = cursor.sort("bucket", 1)
+
+        buckets = [bucket async for bucket in cursor]
+        return [construct_from(Message, msg) for msg in flatten_buckets(buckets, limit, before)]
+    except PyMongoError as e:
+        logger.error(f"Database error reading messages: {e}")
+        raise
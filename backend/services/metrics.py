@@ -0,0 +1,346 @@
+"""
+Process metrics exported in the Prometheus text format at /api/metrics
+
+Chat turns are timed per stage (conversation load, context window, fast
+path, LLM call, database query, persistence, serialization), MongoDB
+commands per collection and operation through a driver CommandListener,
+and LLM calls with their token usage. An event-loop lag monitor and
+in-flight gauges for HTTP requests and LLM calls complete the picture.
+
+Recording is a dictionary lookup and a few additions; rendering only
+happens when /api/metrics is scraped. With METRICS_ENABLED=false every
+recording call returns immediately and the listener is not installed.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+# Seconds; spans sub-millisecond Mongo commands up to slow LLM completions
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base of the metric types: a name, help text and one series per label
+    value tuple. Updates may come from driver threads (Motor runs commands
+    in a thread pool), so series are changed under a lock.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        if not registry.enabled:
+            return
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = list(self._series.items())
+        return [
+            f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+            for labels, value in series
+        ]
+
+
+class Gauge(Metric):
+    """Set explicitly, or read from `function` (returning {labels: value}) at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), function: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value: float, *labels):
+        if not registry.enabled:
+            return
+        with self._lock:
+            self._series[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        if not registry.enabled:
+            return
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def samples(self) -> List[str]:
+        if self.function is not None:
+            try:
+                series = list(self.function().items())
+            except Exception as e:
+                logger.error(f"Collecting gauge {self.name} failed: {e}")
+                return []
+        else:
+            with self._lock:
+                series = list(self._series.items())
+        return [
+            f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+            for labels, value in series
+        ]
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram; each series is [bucket counts..., sum, count]"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        if not registry.enabled:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            # Per-bucket counts; made cumulative when rendered
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, *labels) -> "_Timer":
+        """Context manager observing the duration of its block"""
+        if not registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        lines = []
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{label_text} {values[-1]}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+_NULL_TIMER = nullcontext()
+
+
+class MetricsRegistry:
+    """The process's metrics, rendered together for a scrape"""
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = (), function=None) -> Gauge:
+        return self.register(Gauge(name, help, labels, function))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "chat_stage_duration_seconds", "Duration of each stage of a chat turn", ["stage"]
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests being handled", ["method"]
+)
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+mongo_command_seconds = registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ["collection", "command", "outcome"]
+)
+llm_request_seconds = registry.histogram(
+    "llm_request_duration_seconds", "LLM completion latency, including time queued", ["model", "mode", "outcome"]
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens reported by the LLM API", ["model", "kind"]
+)
+loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "Delay of a timer callback beyond its due time", buckets=LAG_BUCKETS
+)
+loop_lag_last = registry.gauge(
+    "event_loop_lag_last_seconds", "Most recent event loop lag sample"
+)
+
+
+def stage(name: str):
+    """Times a chat-turn stage: `with stage("llm"): ...`"""
+    return stage_seconds.time(name)
+
+
+def record_llm_usage(model: str, usage: Optional[Dict]):
+    """Counts the prompt and completion tokens of one LLM response"""
+    if not registry.enabled or not usage:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage.get(kind):
+            llm_tokens.inc(model, kind.split("_")[0], amount=usage[kind])
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Driver command listener timing every MongoDB command by collection and
+    operation. The driver reports durations itself, so this only keeps the
+    collection name between a command's started and finished events.
+    """
+
+    def __init__(self):
+        self._collections: Dict[Tuple, str] = {}
+
+    def started(self, event):
+        collection = event.command.get("collection") if event.command_name == "getMore" \
+            else event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = \
+            collection if isinstance(collection, str) else ""
+
+    def _finished(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongo_command_seconds.observe(
+            event.duration_micros / 1e6, collection, event.command_name, outcome
+        )
+
+    def succeeded(self, event):
+        self._finished(event, "ok")
+
+    def failed(self, event):
+        self._finished(event, "error")
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+def mongo_event_listeners() -> List[monitoring.CommandListener]:
+    """Listeners for a new MongoDB client; none when metrics are disabled"""
+    return [mongo_command_metrics] if registry.enabled else []
+
+
+async def run_loop_lag_monitor(interval: Optional[float] = None):
+    """Background loop sampling how late the event loop runs a sleeping task"""
+    interval = LOOP_LAG_INTERVAL_SECONDS if interval is None else interval
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        loop_lag_seconds.observe(lag)
+        loop_lag_last.set(lag)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting in-flight HTTP requests and timing them by
+    route template (not raw path, which would explode label cardinality)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        http_requests_in_flight.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec(method)
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                method, route.path if route is not None else "unmatched", str(status[0])
+            )
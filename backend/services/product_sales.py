@@ -0,0 +1,254 @@
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_SALES_COLLECTION = "product_sales"
+VIEW_STATE_COLLECTION = "materialized_views"
+PRODUCT_SALES_REFRESH_SECONDS = float(os.getenv("PRODUCT_SALES_REFRESH_SECONDS", "300"))
+# How long one refresher may hold the refresh lease before another takes over
+PRODUCT_SALES_LEASE_SECONDS = float(os.getenv("PRODUCT_SALES_LEASE_SECONDS", "600"))
+
+# Identifies this process as a lease holder (several uvicorn workers may run
+# the refresher against one database)
+REFRESHER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Fields returned by top-N reads; every index below contains them all so
+# those reads are answered from the index alone
+TOP_N_FIELDS = ("product_id", "name", "retail_price", "category", "sales_count")
+DIMENSIONS = ("category", "department", "brand")
+
+
+def product_sales_indexes() -> List[List[tuple]]:
+    """Global and per-dimension covering indexes for top-N by sales"""
+    indexes = [[("sales_count", DESCENDING)] + [
+        (field, ASCENDING) for field in TOP_N_FIELDS if field != "sales_count"
+    ]]
+    for dimension in DIMENSIONS:
+        indexes.append(
+            [(dimension, ASCENDING), ("sales_count", DESCENDING)] + [
+                (field, ASCENDING) for field in TOP_N_FIELDS
+                if field not in (dimension, "sales_count")
+            ]
+        )
+    return indexes
+
+
+def _accumulate(field: str) -> Dict:
+    """Adds the new batch to a field unless this batch was already applied"""
+    return {"$cond": [
+        {"$lt": [{"$ifNull": ["$applied_id", 0]}, "$$new.applied_id"]},
+        {"$add": [{"$ifNull": [f"${field}", 0]}, f"$$new.{field}"]},
+        f"${field}"
+    ]}
+
+
+def refresh_pipeline(after_id: int, through_id: int, into: str = PRODUCT_SALES_COLLECTION) -> List[Dict]:
+    """
+    Aggregates order_items with after_id < id <= through_id and merges the
+    per-product totals into product_sales (or the collection named by
+    into). Each document records the last batch it absorbed (applied_id),
+    so re-running a batch after a crash does not double count.
+    """
+    return [
+        {"$match": {"id": {"$gt": after_id, "$lte": through_id}}},
+        {"$group": {
+            "_id": "$product_id",
+            "sales_count": {"$sum": {"$ifNull": ["$quantity", 1]}},
+            "revenue": {"$sum": {"$multiply": [
+                {"$ifNull": ["$price", 0]}, {"$ifNull": ["$quantity", 1]}
+            ]}},
+            "order_count": {"$sum": 1}
+        }},
+        {"$lookup": {
+            "from": "products",
+            "localField": "_id",
+            "foreignField": "id",
+            "pipeline": [{"$project": {
+                "_id": 0, "name": 1, "category": 1, "department": 1,
+                "brand": 1, "retail_price": 1, "distribution_center_id": 1
+            }}],
+            "as": "product"
+        }},
+        {"$unwind": {"path": "$product", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "_id": 1,
+            "product_id": "$_id",
+            "sales_count": 1,
+            "revenue": 1,
+            "order_count": 1,
+            "name": "$product.name",
+            "category": "$product.category",
+            "department": "$product.department",
+            "brand": "$product.brand",
+            "retail_price": "$product.retail_price",
+            "distribution_center_id": "$product.distribution_center_id",
+            "applied_id": {"$literal": through_id},
+            "updated_at": {"$literal": datetime.utcnow()}
+        }},
+        {"$merge": {
+            "into": into,
+            "on": "_id",
+            "whenMatched": [{"$set": {
+                "sales_count": _accumulate("sales_count"),
+                "revenue": _accumulate("revenue"),
+                "order_count": _accumulate("order_count"),
+                "name": "$$new.name",
+                "category": "$$new.category",
+                "department": "$$new.department",
+                "brand": "$$new.brand",
+                "retail_price": "$$new.retail_price",
+                "distribution_center_id": "$$new.distribution_center_id",
+                "applied_id": {"$max": [{"$ifNull": ["$applied_id", 0]}, "$$new.applied_id"]},
+                "updated_at": "$$new.updated_at"
+            }}],
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+
+async def create_product_sales_indexes(db):
+    for keys in product_sales_indexes():
+        await db[PRODUCT_SALES_COLLECTION].create_index(keys)
+
+
+async def acquire_refresh_lease(db, owner: str = REFRESHER_ID) -> Optional[Dict]:
+    """
+    Takes the product_sales refresh lease unless another refresher holds an
+    unexpired one
+    Returns:
+        The view state document, or None when the lease is held elsewhere
+    """
+    now = datetime.utcnow()
+    try:
+        return await db[VIEW_STATE_COLLECTION].find_one_and_update(
+            {"_id": PRODUCT_SALES_COLLECTION, "$or": [
+                {"lease_owner": {"$in": [None, owner]}},
+                {"lease_until": {"$lt": now}}
+            ]},
+            {"$set": {
+                "lease_owner": owner,
+                "lease_until": now + timedelta(seconds=PRODUCT_SALES_LEASE_SECONDS)
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The state document exists and its lease belongs to someone else
+        return None
+
+
+async def merge_sales_window(db, after_id: int, through_id: int):
+    """Merges the totals of order_items after_id < id <= through_id into product_sales"""
+    await db.order_items.aggregate(refresh_pipeline(after_id, through_id)).to_list(length=None)
+
+
+async def refresh_product_sales(db, owner: str = REFRESHER_ID) -> Dict:
+    """
+    Folds order_items added since the last refresh into product_sales.
+
+    Refreshes are serialized by a lease on the view state document, and the
+    id window is saved as pending before it is merged. A refresh that died
+    after merging retries exactly that window, which the per-product
+    applied_id guard makes idempotent, so no range is ever added twice.
+    Args:
+        db: MongoDB database connection
+        owner: Lease holder id (this process by default)
+    Returns:
+        Dict with the processed id range, or {"skipped": True} when another
+        refresher holds the lease
+    """
+    try:
+        state = await acquire_refresh_lease(db, owner)
+        if state is None:
+            return {"skipped": True}
+        states = db[VIEW_STATE_COLLECTION]
+        after_id = state.get("high_water_id", 0)
+
+        pending = state.get("pending")
+        if pending and pending.get("after_id") == after_id:
+            through_id = pending["through_id"]
+        else:
+            latest = await db.order_items.find_one(
+                {}, {"_id": 0, "id": 1}, sort=[("id", DESCENDING)]
+            )
+            through_id = latest["id"] if latest else 0
+            if through_id <= after_id:
+                await states.update_one(
+                    {"_id": PRODUCT_SALES_COLLECTION, "lease_owner": owner},
+                    {"$unset": {"lease_owner": "", "lease_until": "", "pending": ""}}
+                )
+                return {"after_id": after_id, "through_id": after_id}
+            saved = await states.update_one(
+                {"_id": PRODUCT_SALES_COLLECTION, "lease_owner": owner, "high_water_id": state.get("high_water_id")},
+                {"$set": {"pending": {"after_id": after_id, "through_id": through_id}}}
+            )
+            if not saved.matched_count:
+                return {"skipped": True}
+
+        await merge_sales_window(db, after_id, through_id)
+        await states.update_one(
+            {"_id": PRODUCT_SALES_COLLECTION, "pending.through_id": through_id},
+            {
+                "$set": {"high_water_id": through_id, "refreshed_at": datetime.utcnow()},
+                "$unset": {"pending": "", "lease_owner": "", "lease_until": ""}
+            }
+        )
+        logger.info(f"product_sales refreshed for order_items {after_id + 1}-{through_id}")
+        return {"after_id": after_id, "through_id": through_id}
+    except PyMongoError as e:
+        logger.error(f"Database error refreshing product_sales: {e}")
+        raise
+
+
+def rebuild_product_sales_sync(db):
+    """
+    Rebuilds product_sales from scratch with a synchronous pymongo database,
+    for use right after order_items has been reloaded. The view is built
+    and indexed in a staging collection, then renamed over the live one.
+    """
+    staging = db[PRODUCT_SALES_COLLECTION + "_staging"]
+    staging.drop()
+
+    latest = db.order_items.find_one({}, {"_id": 0, "id": 1}, sort=[("id", DESCENDING)])
+    through_id = latest["id"] if latest else 0
+    if through_id:
+        list(db.order_items.aggregate(refresh_pipeline(0, through_id, into=staging.name), allowDiskUse=True))
+    for keys in product_sales_indexes():
+        staging.create_index(keys)
+
+    db.client.admin.command(
+        "renameCollection", f"{db.name}.{staging.name}",
+        to=f"{db.name}.{PRODUCT_SALES_COLLECTION}", dropTarget=True
+    )
+    # A pending window from before the rebuild is already counted
+    db[VIEW_STATE_COLLECTION].update_one(
+        {"_id": PRODUCT_SALES_COLLECTION},
+        {
+            "$set": {"high_water_id": through_id, "refreshed_at": datetime.utcnow()},
+            "$unset": {"pending": "", "lease_owner": "", "lease_until": ""}
+        },
+        upsert=True
+    )
+
+
+async def run_product_sales_refresher(get_db, interval: Optional[float] = None):
+    """Background loop keeping product_sales current"""
+    interval = PRODUCT_SALES_REFRESH_SECONDS if interval is None else interval
+    while True:
+        try:
+            db = get_db()
+            if db is not None:
+                await refresh_product_sales(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"product_sales refresh failed: {e}")
+        await asyncio.sleep(interval)
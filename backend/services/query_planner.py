@@ -0,0 +1,360 @@
+import os
+import re
+import json
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo.errors import PyMongoError
+from services.catalog import catalog
+from utils.text import normalize_message
+
+logger = logging.getLogger(__name__)
+
+# How long distinct category/brand/department values are trusted
+QUERY_VALUE_CACHE_SECONDS = float(os.getenv("QUERY_VALUE_CACHE_SECONDS", "300"))
+
+INTENTS = ("top_products", "search_products", "order_status")
+SORTS = {
+    "sales": [("sales_count", -1)],
+    "price_asc": [("retail_price", 1)],
+    "price_desc": [("retail_price", -1)],
+    "newest": [("created_at", -1)],
+}
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 20
+
+# Filters in the order they are applied; category and distribution center
+# come first so the $match can use their indexes
+FILTER_FIELDS = ("category", "distribution_center_id", "department", "brand")
+RESOLVED_FIELDS = ("category", "department", "brand")
+
+PRODUCT_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "name": 1,
+    "brand": 1,
+    "category": 1,
+    "department": 1,
+    "retail_price": 1,
+    "distribution_center_id": 1,
+}
+
+# Sales-ranked requests read the product_sales view; this projection only
+# names fields held by its covering indexes
+SALES_PROJECTION = {
+    "_id": 0,
+    "product_id": 1,
+    "name": 1,
+    "category": 1,
+    "retail_price": 1,
+    "sales_count": 1,
+}
+
+
+class QueryRequest:
+    """A structured database request emitted by the model (or parsed from text)"""
+
+    def __init__(
+        self,
+        intent: str,
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        department: Optional[str] = None,
+        distribution_center_id: Optional[int] = None,
+        limit: int = DEFAULT_LIMIT,
+        sort: str = "sales",
+        order_id: Optional[int] = None,
+        terms: Optional[List[str]] = None
+    ):
+        self.intent = intent
+        self.category = category
+        self.brand = brand
+        self.department = department
+        self.distribution_center_id = distribution_center_id
+        self.limit = max(1, min(int(limit), MAX_LIMIT))
+        self.sort = sort if isinstance(sort, str) and sort in SORTS else "sales"
+        self.order_id = order_id
+        # Free-text words still to be matched against catalog values
+        self.terms = terms or []
+        self.unmatched_terms: List[str] = []
+        # Set when sales ranking was asked for but no sales data exists yet
+        self.unranked = False
+
+    def filters(self) -> Dict[str, Any]:
+        return {
+            field: getattr(self, field)
+            for field in FILTER_FIELDS
+            if getattr(self, field) is not None
+        }
+
+
+def _optional_int(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None and value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_tool_call(text: str) -> Optional[QueryRequest]:
+    """
+    Parses the JSON object following <<QUERY_DB>>
+    Returns:
+        QueryRequest, or None if the text holds no valid tool call
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        call = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(call, dict) or call.get("intent") not in INTENTS:
+        return None
+
+    def text_field(name):
+        value = call.get(name)
+        return str(value).strip() if value not in (None, "") else None
+
+    # Anything but a known sort name (e.g. a list) falls back to sales
+    sort = call.get("sort")
+    if not isinstance(sort, str) or sort not in SORTS:
+        sort = "sales"
+
+    return QueryRequest(
+        intent=call["intent"],
+        category=text_field("category"),
+        brand=text_field("brand"),
+        department=text_field("department"),
+        distribution_center_id=_optional_int(call.get("distribution_center_id")),
+        limit=_optional_int(call.get("limit")) or DEFAULT_LIMIT,
+        sort=sort,
+        order_id=_optional_int(call.get("order_id"))
+    )
+
+
+_NUMBER = re.compile(r"\b(\d{1,7})\b")
+_STOP_WORDS = frozenset("""
+    a an the get show me list find our your top best selling sorted by sales
+    count products product items item most popular what are is of for in and
+    with please some any by cheapest cheap expensive newest latest new
+""".split())
+
+
+def parse_free_text(text: str) -> QueryRequest:
+    """Best-effort request for legacy free-text queries and direct intents"""
+    normalized = normalize_message(text)
+    words = normalized.split()
+    if "order" in words:
+        numbers = [int(n) for n in _NUMBER.findall(normalized) if len(n) >= 3]
+        return QueryRequest("order_status", order_id=numbers[0] if numbers else None)
+
+    sort = "sales"
+    if {"cheapest", "cheap"} & set(words):
+        sort = "price_asc"
+    elif "expensive" in words:
+        sort = "price_desc"
+    elif {"newest", "latest", "new"} & set(words):
+        sort = "newest"
+
+    limits = [int(n) for n in _NUMBER.findall(normalized) if 0 < int(n) <= MAX_LIMIT]
+    terms = [word for word in words if word not in _STOP_WORDS and not word.isdigit()]
+    return QueryRequest(
+        "top_products" if sort == "sales" else "search_products",
+        limit=limits[0] if limits else DEFAULT_LIMIT,
+        sort=sort,
+        terms=terms
+    )
+
+
+class Param:
+    """Placeholder in a prepared pipeline, bound per execution"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+def _bind(template, params: Dict[str, Any]):
+    if isinstance(template, Param):
+        return params[template.name]
+    if isinstance(template, dict):
+        return {key: _bind(value, params) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_bind(value, params) for value in template]
+    return template
+
+
+class PreparedPlan:
+    def __init__(self, template: List[Dict]):
+        self.template = template
+        self.uses = 0
+
+    def bind(self, params: Dict[str, Any]) -> List[Dict]:
+        self.uses += 1
+        return _bind(self.template, params)
+
+
+class ValueResolver:
+    """
+    Maps loosely written values ("jean", "mens", "levis") onto the exact
+    values stored in the products collection, so filters stay exact-match
+    and indexable. Distinct values are cached for QUERY_VALUE_CACHE_SECONDS.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self._lookup: Dict[str, str] = {}
+        self._loaded_at = 0.0
+        self._version = None
+
+    @staticmethod
+    def _keys(value: str) -> List[str]:
+        key = normalize_message(value)
+        keys = [key, key.replace(" ", "")]
+        if key.endswith("s"):
+            keys.append(key[:-1])
+        else:
+            keys.append(key + "s")
+        return keys
+
+    async def refresh(self, collection):
+        """Reloads values from the in-memory catalog, or from the collection"""
+        if catalog.ready:
+            if self._version != catalog.snapshot.version:
+                self._load(catalog.values(self.field))
+                self._version = catalog.snapshot.version
+            return
+        if time.monotonic() - self._loaded_at < QUERY_VALUE_CACHE_SECONDS and self._lookup:
+            return
+        self._load(await collection.distinct(self.field))
+        self._version = None
+
+    def _load(self, values: List[str]):
+        lookup = {}
+        for value in values:
+            if isinstance(value, str) and value:
+                for key in self._keys(value):
+                    lookup.setdefault(key, value)
+        self._lookup = lookup
+        self._loaded_at = time.monotonic()
+
+    def resolve(self, value: str) -> Optional[str]:
+        for key in self._keys(value):
+            if key in self._lookup:
+                return self._lookup[key]
+        return None
+
+
+class QueryPlanner:
+    """
+    Compiles QueryRequests into aggregation pipelines. Pipelines are cached
+    per query shape (intent, filters present, sort), so repeated shapes
+    only bind new values into an already prepared pipeline.
+    """
+
+    def __init__(self):
+        self._plans: Dict[Tuple, PreparedPlan] = {}
+        self._resolvers = {field: ValueResolver(field) for field in RESOLVED_FIELDS}
+        self.plan_hits = 0
+        self.plan_misses = 0
+
+    async def resolve(self, collection, request: QueryRequest) -> QueryRequest:
+        """Canonicalises filter values and assigns free-text terms to fields"""
+        for resolver in self._resolvers.values():
+            await resolver.refresh(collection)
+
+        for field, resolver in self._resolvers.items():
+            value = getattr(request, field)
+            if value is not None:
+                setattr(request, field, resolver.resolve(value) or value)
+
+        # Try two-word phrases first ("t shirts"), then single words
+        terms = request.terms
+        used = set()
+        for size in (2, 1):
+            for i in range(len(terms) - size + 1):
+                if used.intersection(range(i, i + size)):
+                    continue
+                phrase = " ".join(terms[i:i + size])
+                for field, resolver in self._resolvers.items():
+                    if getattr(request, field) is not None:
+                        continue
+                    value = resolver.resolve(phrase)
+                    if value is not None:
+                        setattr(request, field, value)
+                        used.update(range(i, i + size))
+                        break
+        request.unmatched_terms = [
+            term for i, term in enumerate(terms) if i not in used
+        ]
+        request.terms = []
+        return request
+
+    def compile(self, request: QueryRequest) -> List[Dict]:
+        """Returns the product pipeline for a request, reusing prepared plans"""
+        filters = request.filters()
+        shape = (request.intent, tuple(filters), request.sort)
+        plan = self._plans.get(shape)
+        if plan is None:
+            self.plan_misses += 1
+            plan = PreparedPlan(self._build_template(tuple(filters), request.sort))
+            self._plans[shape] = plan
+        else:
+            self.plan_hits += 1
+        return plan.bind({**filters, "limit": request.limit})
+
+    @staticmethod
+    def _build_template(fields: Tuple[str, ...], sort: str) -> List[Dict]:
+        pipeline = []
+        if fields:
+            pipeline.append({"$match": {field: Param(field) for field in fields}})
+        pipeline.extend([
+            {"$sort": dict(SORTS[sort])},
+            {"$limit": Param("limit")},
+            {"$project": SALES_PROJECTION if sort == "sales" else PRODUCT_PROJECTION}
+        ])
+        return pipeline
+
+    async def find_products(self, products, product_sales, request: QueryRequest) -> List[Dict]:
+        """
+        Resolves, compiles and runs a product request
+        Args:
+            products: The products collection
+            product_sales: The materialized product_sales view
+            request: Structured request to run
+        Returns:
+            List of product documents
+        """
+        try:
+            request = await self.resolve(products, request)
+
+            # Served from memory whenever the catalog snapshot is loaded
+            results = catalog.query(request.filters(), request.sort, request.limit)
+            if results is not None:
+                if request.sort == "sales" and not any(row.get("sales_count") for row in results):
+                    request.unranked = True
+                return results
+
+            collection = product_sales if request.sort == "sales" else products
+            results = await collection.aggregate(self.compile(request)).to_list(length=request.limit)
+            if not results and request.sort == "sales":
+                # The view has not been built yet: list products by load
+                # time, which is no ranking, and say so
+                request.sort = "newest"
+                request.unranked = True
+                results = await products.aggregate(self.compile(request)).to_list(length=request.limit)
+            return results
+        except PyMongoError as e:
+            logger.error(f"Database error running product query: {e}")
+            raise
+
+    def stats(self) -> Dict:
+        lookups = self.plan_hits + self.plan_misses
+        return {
+            "prepared_plans": len(self._plans),
+            "plan_hits": self.plan_hits,
+            "plan_misses": self.plan_misses,
+            "plan_hit_ratio": round(self.plan_hits / lookups, 4) if lookups else 0.0
+        }
+
+
+query_planner = QueryPlanner()
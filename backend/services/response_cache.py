@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from pymongo.errors import PyMongoError
+from schemas.message import Message
+from utils.text import normalize_message
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+# Prior messages hashed into the key alongside the rolling summary
+RESPONSE_CACHE_CONTEXT_MESSAGES = int(os.getenv("RESPONSE_CACHE_CONTEXT_MESSAGES", "2"))
+# Share entries between workers through a Mongo collection with a TTL index
+RESPONSE_CACHE_SHARED = os.getenv("RESPONSE_CACHE_SHARED", "false").lower() == "true"
+RESPONSE_CACHE_COLLECTION = "llm_response_cache"
+
+# Anything that looks tied to a specific customer or order is never cached
+NEVER_CACHE = re.compile(
+    r"\b(order|orders|tracking|track|my|mine|account|invoice|payment|address)\b"
+    r"|\d{3,}|@"
+)
+
+# (intent, pattern, ttl in seconds); messages matching no rule are not cached
+CACHEABLE_INTENTS: List[Tuple[str, "re.Pattern", int]] = [
+    ("greeting", re.compile(r"^(hi|hello|hey|good (morning|afternoon|evening))( there)?$"), 86400),
+    ("thanks", re.compile(r"^(thanks|thank you|thx|ty)( (so|very) much)?$"), 86400),
+    ("policy", re.compile(r"\b(return|returns|refund|exchange|shipping|delivery|warranty|policy)\b"), 3600),
+    ("top_products", re.compile(r"\b(top|best|popular|best selling|bestselling)\b"), 600),
+]
+
+def classify_cacheability(normalized: str) -> Tuple[Optional[str], int]:
+    """Returns (intent, ttl) for a normalized message, or (None, 0) if uncacheable"""
+    if not normalized or NEVER_CACHE.search(normalized):
+        return None, 0
+    for intent, pattern, ttl in CACHEABLE_INTENTS:
+        if pattern.search(normalized):
+            return intent, ttl
+    return None, 0
+
+
+class CacheKey:
+    def __init__(self, digest: str, intent: str, ttl: int):
+        self.digest = digest
+        self.intent = intent
+        self.ttl = ttl
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM answers: an in-process LRU in front of an optional
+    Mongo collection shared by every worker, both with per-intent TTLs.
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, shared: bool = RESPONSE_CACHE_SHARED):
+        self.max_size = max_size
+        self.shared = shared
+        # digest -> (response, expires_at monotonic, latency saved per hit in ms)
+        self._entries: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+
+    def key_for(
+        self,
+        user_message: str,
+        context: List[Message],
+        summary: Optional[str],
+        params: Dict
+    ) -> Optional[CacheKey]:
+        """
+        Builds the cache key for a turn
+        Args:
+            user_message: The current user message
+            context: Prior messages of the context window (oldest first)
+            summary: Rolling summary sent with the prompt
+            params: Model parameters that affect the answer
+        Returns:
+            CacheKey, or None if this message must not be cached
+        """
+        normalized = normalize_message(user_message)
+        intent, ttl = classify_cacheability(normalized)
+        if intent is None:
+            return None
+
+        recent = context[-RESPONSE_CACHE_CONTEXT_MESSAGES:] if RESPONSE_CACHE_CONTEXT_MESSAGES else []
+        material = json.dumps({
+            "message": normalized,
+            "summary": summary or "",
+            "context": [[msg.sender, normalize_message(msg.text)] for msg in recent],
+            "params": params
+        }, sort_keys=True)
+        return CacheKey(hashlib.sha256(material.encode()).hexdigest(), intent, ttl)
+
+    async def get(self, key: CacheKey, db=None) -> Optional[str]:
+        """Looks a key up in the local tier, then the shared tier"""
+        entry = self._entries.get(key.digest)
+        if entry is not None:
+            response, expires_at, latency_ms = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key.digest)
+                self.local_hits += 1
+                self.saved_ms += latency_ms
+                return response
+            del self._entries[key.digest]
+
+        if self.shared and db is not None:
+            try:
+                document = await db[RESPONSE_CACHE_COLLECTION].find_one({
+                    "_id": key.digest,
+                    "expires_at": {"$gt": datetime.utcnow()}
+                })
+            except PyMongoError as e:
+                logger.error(f"Database error reading response cache: {e}")
+                document = None
+            if document:
+                remaining = (document["expires_at"] - datetime.utcnow()).total_seconds()
+                self._store_local(key.digest, document["response"], remaining, document["latency_ms"])
+                self.shared_hits += 1
+                self.saved_ms += document["latency_ms"]
+                return document["response"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: CacheKey, response: str, latency_ms: float, db=None):
+        """Stores a freshly generated response in both tiers"""
+        self._store_local(key.digest, response, key.ttl, latency_ms)
+        if self.shared and db is not None:
+            try:
+                await db[RESPONSE_CACHE_COLLECTION].replace_one(
+                    {"_id": key.digest},
+                    {
+                        "response": response,
+                        "intent": key.intent,
+                        "latency_ms": latency_ms,
+                        "expires_at": datetime.utcnow() + timedelta(seconds=key.ttl)
+                    },
+                    upsert=True
+                )
+            except PyMongoError as e:
+                logger.error(f"Database error writing response cache: {e}")
+
+    def _store_local(self, digest: str, response: str, ttl: float, latency_ms: float):
+        self._entries[digest] = (response, time.monotonic() + ttl, latency_ms)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Hit ratio and latency saved since startup"""
+        hits = self.local_hits + self.shared_hits
+        lookups = hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_ms": round(self.saved_ms, 1)
+        }
+
+
+async def create_response_cache_indexes(db):
+    """TTL index so shared entries expire on their own"""
+    if RESPONSE_CACHE_SHARED:
+        await db[RESPONSE_CACHE_COLLECTION].create_index("expires_at", expireAfterSeconds=0)
+
+
+response_cache = ResponseCache()
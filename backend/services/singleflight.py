@@ -0,0 +1,93 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+# "request": share between identical requests from anyone; "user": only
+# between identical requests of the same user. Messages that look personal
+# (see response_cache.NEVER_CACHE) are always scoped to their user.
+SINGLEFLIGHT_SCOPE = os.getenv("SINGLEFLIGHT_SCOPE", "request")
+
+
+def flight_key(material: Dict, scope: Optional[str] = None) -> str:
+    """
+    Digest of everything a call's result depends on, optionally prefixed by
+    a scope (e.g. a user id) so calls in different scopes never share
+    """
+    digest = hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{scope}:{digest}" if scope else digest
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key starts
+    the upstream call, callers arriving while it is in flight await the same
+    result. Nothing is kept once the call finishes, so this only removes
+    duplicate work, it never serves stale results.
+
+    The upstream call runs in its own task, so a caller that disconnects
+    does not cancel it for the others.
+    """
+
+    def __init__(self, name: str, enabled: bool = SINGLEFLIGHT_ENABLED):
+        self.name = name
+        self.enabled = enabled
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.upstream_calls = 0
+        self.shared = 0
+        self.errors = 0
+        self.max_waiters = 0
+        self._waiters: Dict[str, int] = {}
+
+    async def do(self, key: Optional[str], call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs call(), or joins the identical call already in flight
+        Args:
+            key: flight_key of the call; None never coalesces
+            call: Zero-argument coroutine function making the upstream call
+        Returns:
+            The call's result (its exception is raised to every waiter)
+        """
+        self.calls += 1
+        if not self.enabled or key is None:
+            self.upstream_calls += 1
+            return await call()
+
+        task = self._calls.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.get_running_loop().create_task(call())
+            self._calls[key] = task
+            self._waiters[key] = 1
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        else:
+            self.shared += 1
+            self._waiters[key] += 1
+            self.max_waiters = max(self.max_waiters, self._waiters[key])
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._calls.pop(key, None)
+        self._waiters.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.upstream_calls,
+            "saved_calls": self.shared,
+            "in_flight": len(self._calls),
+            "max_waiters": self.max_waiters,
+            "errors": self.errors
+        }
+
+
+llm_flights = SingleFlight("llm")
+db_flights = SingleFlight("db")
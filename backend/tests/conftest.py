@@ -0,0 +1,100 @@
+import os
+import sys
+import asyncio
+
+import mongomock
+import pytest
+
+# Modules import each other as top-level packages (services, utils, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class AsyncCursor:
+    """Motor-style cursor over a mongomock cursor"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self.cursor = self.cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, count):
+        self.cursor = self.cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.cursor)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.cursor:
+            yield document
+
+
+class AsyncCollection:
+    """The subset of Motor's collection API the services use, over mongomock"""
+
+    def __init__(self, collection):
+        self.sync = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.sync.find(*args, **kwargs))
+
+    def aggregate(self, pipeline, **kwargs):
+        return AsyncCursor(self.sync.aggregate(pipeline, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.sync, name)
+
+        async def call(*args, **kwargs):
+            # Yield once so concurrent tasks interleave as they would on I/O
+            await asyncio.sleep(0)
+            return method(*args, **kwargs)
+        return call
+
+
+def aggregate_with_lookup(self, pipeline, **kwargs):
+    """
+    $match then $lookup with a pipeline, which mongomock lacks: runs the
+    lookup pipeline per document with its `let` variables bound
+    """
+    match, lookup = pipeline[0]["$match"], pipeline[1]["$lookup"]
+    documents = list(self.sync.find(match))
+    for document in documents:
+        variables = {
+            f"$${name}": document.get(field.get("$ifNull", [field])[0].lstrip("$"), 0)
+            for name, field in lookup.get("let", {}).items()
+        }
+
+        def bind(value):
+            if isinstance(value, dict):
+                return {key: bind(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [bind(item) for item in value]
+            return variables.get(value, value) if isinstance(value, str) else value
+
+        document[lookup["as"]] = list(self.sync.database[lookup["from"]].aggregate(
+            [{"$match": {lookup["foreignField"]: document[lookup["localField"]]}}]
+            + bind(lookup["pipeline"])
+        ))
+    return AsyncCursor(iter(documents))
+
+
+class AsyncDatabase:
+    def __init__(self, database):
+        self.sync = database
+
+    def __getitem__(self, name):
+        return AsyncCollection(self.sync[name])
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+@pytest.fixture
+def async_db():
+    """Motor-like database backed by mongomock (no server needed)"""
+    return AsyncDatabase(mongomock.MongoClient().test)
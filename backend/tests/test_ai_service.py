@@ -0,0 +1,36 @@
+import asyncio
+from services.ai_service import STATIC_RESPONSES, generate_fast_path_response
+
+
+def fast_path(message: str):
+    lookups = []
+
+    async def database_lookup(text: str, user_id=None) -> str:
+        lookups.append(text)
+        return f"looked up: {text}"
+
+    return asyncio.run(generate_fast_path_response(message, database_lookup)), lookups
+
+
+def test_order_status_with_number_is_looked_up():
+    for message in ("Where is my order 12345?", "track order #555"):
+        result, lookups = fast_path(message)
+        assert result is not None
+        response, match = result
+        assert match.intent == "order_status"
+        assert lookups == [message]
+        assert response == f"looked up: {message}"
+        assert response != STATIC_RESPONSES["order_status"]
+
+
+def test_order_status_without_number_asks_for_it():
+    result, lookups = fast_path("where is my order")
+    assert result is not None
+    assert result[0] == STATIC_RESPONSES["order_status"]
+    assert lookups == []
+
+
+def test_order_status_with_unparsed_number_goes_to_llm():
+    result, lookups = fast_path("order status 42")
+    assert result is None
+    assert lookups == []
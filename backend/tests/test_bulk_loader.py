@@ -0,0 +1,88 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bson
+import mongomock
+from utils.bulk_loader import REQUIRED, LoaderOptions, TableSpec, insert_batch, parse_block, run_pipeline
+
+SPEC = TableSpec(
+    name="items",
+    label="Items",
+    fields=[("id", "int", REQUIRED), ("name", "str", None)],
+    indexes=[]
+)
+
+
+def write_csv(path, rows: int) -> str:
+    csv_file = path / "items.csv"
+    with open(csv_file, "w") as file:
+        file.write("id,name\n")
+        for i in range(rows):
+            file.write(f"{i},item number {i} with some padding to fill the blocks\n")
+    return str(csv_file)
+
+
+def run_with_timeout(target, seconds: float = 30):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(report=target()), daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "run_pipeline hung"
+    return result["report"]
+
+
+def test_writer_error_other_than_pymongo_is_reported_without_hanging(tmp_path):
+    csv_file = write_csv(tmp_path, 20000)
+    collection = mongomock.MongoClient().db.items
+    options = LoaderOptions(parse_workers=1, writers=2, block_bytes=64 * 1024, batch_bytes=16 * 1024, queue_depth=1)
+    committed = []
+
+    def broken_write(collection, documents):
+        raise TypeError("cannot encode value")
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        report = run_with_timeout(lambda: run_pipeline(
+            collection, csv_file, SPEC, options, executor,
+            write_batch=broken_write, on_commit=committed.append
+        ))
+
+    assert report.error == "cannot encode value"
+    assert report.counts.get("failed") == 20000
+    assert report.batches > options.writers + options.queue_depth
+    # Nothing was written, so no progress may be checkpointed
+    assert committed == []
+
+
+def test_pipeline_inserts_every_row(tmp_path):
+    csv_file = write_csv(tmp_path, 5000)
+    collection = mongomock.MongoClient().db.items
+    options = LoaderOptions(parse_workers=1, writers=2, block_bytes=64 * 1024, batch_bytes=16 * 1024)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # mongomock wants plain dicts rather than raw BSON
+        report = run_with_timeout(lambda: run_pipeline(
+            collection, csv_file, SPEC, options, executor,
+            write_batch=lambda collection, documents: insert_batch(collection, [dict(d) for d in documents])
+        ))
+
+    assert report.error is None
+    assert report.counts == {"inserted": 5000}
+    assert collection.count_documents({}) == 5000
+
+
+def test_row_hash_ignores_load_time_of_missing_datetimes(tmp_path):
+    csv_file = tmp_path / "orders.csv"
+    csv_file.write_text("id,created_at\n1,\n2,2024-01-02 03:04:05\n")
+    fields = [("id", "int", REQUIRED), ("created_at", "datetime", None)]
+
+    def parse():
+        block = parse_block(str(csv_file), ["id", "created_at"], len("id,created_at\n"),
+                            csv_file.stat().st_size, fields, ())
+        return [bson.decode(document) for document in block.encoded]
+
+    first = parse()
+    time.sleep(0.01)
+    second = parse()
+    assert first[0]["created_at"] != second[0]["created_at"]
+    assert [doc["row_hash"] for doc in first] == [doc["row_hash"] for doc in second]
+    assert first[0]["row_hash"] != first[1]["row_hash"]
@@ -0,0 +1,20 @@
+import asyncio
+import time
+
+from services.catalog import ProductCatalog
+from utils.bulk_loader import sync_batch
+
+
+def product(price):
+    return {"id": 7, "name": "Slim Jeans", "category": "Jeans", "retail_price": price, "row_hash": int(price)}
+
+
+def test_in_place_sync_update_changes_version(async_db):
+    async_db.sync.products.create_index("id", unique=True)
+    sync_batch(async_db.sync.products, [product(50.0)])
+    catalog = ProductCatalog()
+    before = asyncio.run(catalog.version(async_db))
+
+    time.sleep(0.002)
+    assert sync_batch(async_db.sync.products, [product(40.0)])["updated"] == 1
+    assert asyncio.run(catalog.version(async_db)) != before
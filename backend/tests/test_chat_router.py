@@ -0,0 +1,40 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from conftest import AsyncCollection, aggregate_with_lookup
+from routers import chat
+from utils.database import get_db
+
+
+@pytest.fixture
+def client(async_db, monkeypatch):
+    monkeypatch.setattr(AsyncCollection, "aggregate", aggregate_with_lookup)
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/api/chat")
+    app.dependency_overrides[get_db] = lambda: async_db
+    return TestClient(app)
+
+
+def test_since_beyond_message_count_is_rejected(client, async_db):
+    conversation_id = ObjectId()
+    async_db.sync.conversations.insert_one({
+        "_id": conversation_id, "user_id": ObjectId(), "session_id": "s",
+        "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 2),
+        "message_count": 4, "summary_seq": 0, "is_active": True,
+    })
+    params = {"user_message": "hello", "user_id": str(ObjectId()), "conversation_id": str(conversation_id)}
+
+    response = client.post("/api/chat", params={**params, "since": 6})
+    assert response.status_code == 400
+    assert async_db.sync.conversations.find_one({"_id": conversation_id})["message_count"] == 4
+
+    ok = client.post("/api/chat", params={**params, "since": 4})
+    assert ok.status_code == 200
+    assert [msg["seq"] for msg in ok.json()["messages"]] == [4, 5]
+
+    new = client.post("/api/chat", params={"user_message": "hello", "user_id": params["user_id"], "since": 2})
+    assert new.status_code == 400
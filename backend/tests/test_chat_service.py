@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+
+from conftest import AsyncCollection, aggregate_with_lookup
+from services import message_store
+from services.chat_service import (
+    conversation_etag, get_conversation, get_conversation_etag, trusted_conversation
+)
+
+
+def message(seq):
+    return {"text": f"message {seq}", "sender": "user" if seq % 2 == 0 else "bot",
+            "timestamp": datetime(2024, 1, 1), "metadata": {}, "seq": seq}
+
+
+def read_conversation(db, conversation_id):
+    """What a full GET returns: the conversation with its bucketed messages"""
+    document = db.sync.conversations.find_one({"_id": conversation_id})
+    document["messages"] = [
+        msg for bucket in db.sync.message_buckets.find({"conversation_id": conversation_id}).sort("bucket", 1)
+        for msg in bucket["messages"]
+    ]
+    return trusted_conversation(document)
+
+
+def test_etag_counts_only_messages_returned(async_db):
+    conversation_id = ObjectId()
+    # A turn between its message_count bump and its bucket write
+    async_db.sync.conversations.insert_one({
+        "_id": conversation_id, "user_id": ObjectId(), "session_id": "s",
+        "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 2),
+        "message_count": 4, "summary_seq": 0, "is_active": True,
+    })
+    async_db.sync.message_buckets.insert_one({
+        "conversation_id": conversation_id, "bucket": 0, "messages": [message(0), message(1)],
+    })
+
+    stale = conversation_etag(read_conversation(async_db, conversation_id), start=0)
+    assert stale.startswith('"2-')
+    assert stale != asyncio.run(get_conversation_etag(async_db, str(conversation_id)))
+
+    async_db.sync.message_buckets.update_one(
+        {"conversation_id": conversation_id},
+        {"$push": {"messages": {"$each": [message(2), message(3)]}}}
+    )
+    fresh = conversation_etag(read_conversation(async_db, conversation_id), start=0)
+    assert fresh == asyncio.run(get_conversation_etag(async_db, str(conversation_id)))
+
+
+def test_since_loads_only_unsummarized_and_missing_messages(async_db, monkeypatch):
+    monkeypatch.setattr(message_store, "MESSAGE_BUCKET_SIZE", 5)
+    monkeypatch.setattr(AsyncCollection, "aggregate", aggregate_with_lookup)
+    conversation_id = ObjectId()
+    async_db.sync.conversations.insert_one({
+        "_id": conversation_id, "user_id": ObjectId(), "session_id": "s",
+        "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 2),
+        "message_count": 23, "summary": "earlier", "summary_seq": 16, "is_active": True,
+    })
+    async_db.sync.message_buckets.insert_many([
+        {"conversation_id": conversation_id, "bucket": bucket,
+         "messages": [message(seq) for seq in range(bucket * 5, min(bucket * 5 + 5, 23))]}
+        for bucket in range(5)
+    ])
+
+    def seqs(since, unsummarized=False):
+        conversation = asyncio.run(get_conversation(
+            async_db, str(conversation_id), since=since, unsummarized=unsummarized
+        ))
+        return [msg.seq for msg in conversation.messages]
+
+    # The summary covers the first 16 messages
+    assert seqs(21) == list(range(16, 23))
+    assert seqs(10) == list(range(10, 23))
+    assert seqs(None) == list(range(23))
+    assert seqs(None, unsummarized=True) == list(range(16, 23))
@@ -0,0 +1,22 @@
+from schemas.message import Message, MessageSender
+from services.context_builder import ContextBuilder
+
+
+def history(seqs):
+    return [Message(text="word " * 50, sender=MessageSender.USER, seq=seq) for seq in seqs] + [
+        Message(text="and now?", sender=MessageSender.USER)
+    ]
+
+
+def test_partial_history_does_not_report_a_saving():
+    builder = ContextBuilder(token_budget=100)
+    full = builder.build(history(range(10)))
+    assert full.tokens_saved > 0
+
+    tail = builder.build(history(range(16, 20)), summary="earlier", summary_seq=16)
+    assert tail.full_tokens is None and tail.tokens_saved is None
+
+    stats = builder.stats()
+    assert (stats["requests"], stats["measured_requests"]) == (2, 1)
+    assert stats["full_history_tokens"] == full.full_tokens
+    assert stats["tokens_saved"] == full.tokens_saved
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+from services import inventory_availability
+from services.distribution_centers import DistributionCenterIndex
+from services.inventory_availability import (
+    AVAILABLE_MATCH, apply_inventory_changes, apply_pending_inventory_changes, availability_pipeline,
+    get_availability, update_inventory_status
+)
+
+
+def seed(db):
+    db.sync.distribution_centers.insert_many([
+        {"id": 1, "name": "Near", "latitude": 40.7, "longitude": -74.0},
+        {"id": 2, "name": "Far", "latitude": 34.0, "longitude": -118.2},
+    ])
+    db.sync.inventory_items.insert_many([
+        {"id": 10, "product_id": 7, "distribution_center_id": 1, "quantity": 1, "status": "available"},
+        {"id": 11, "product_id": 7, "distribution_center_id": 2, "quantity": 1, "status": "available"},
+    ])
+
+
+def test_status_change_reloads_index_and_reroutes(async_db):
+    seed(async_db)
+    # mongomock has no $out; build the counters as inserts instead
+    asyncio.run(apply_inventory_changes(async_db, [
+        (None, item) for item in async_db.sync.inventory_items.find({}, {"_id": 0})
+    ]))
+
+    index = DistributionCenterIndex()
+
+    async def scenario():
+        assert await index.refresh_if_changed(async_db)
+        assert [c["id"] for c in index.nearest(40.0, -75.0, product_id=7)] == [1]
+        assert not await index.refresh_if_changed(async_db)
+
+        # The nearby item sells; the index must stop routing there
+        await update_inventory_status(async_db, 10, "sold")
+        assert await index.refresh_if_changed(async_db)
+        return index.nearest(40.0, -75.0, product_id=7)
+
+    nearest = asyncio.run(scenario())
+    assert [c["id"] for c in nearest] == [2]
+
+
+def test_items_without_quantity_count_as_one(async_db):
+    items = [
+        {"id": 1, "product_id": 5, "distribution_center_id": 1, "status": "available"},
+        {"id": 2, "product_id": 5, "distribution_center_id": 1, "quantity": None, "status": "available"},
+        {"id": 3, "product_id": 5, "distribution_center_id": 1, "quantity": 0, "status": "available"},
+    ]
+    asyncio.run(apply_inventory_changes(async_db, [(None, item) for item in items]))
+    counts = asyncio.run(get_availability(async_db, [5]))[5]
+    assert (counts["available_items"], counts["available_quantity"]) == (2, 2)
+
+    # The rebuild counts the same way ($out, its last stage, is not in mongomock)
+    async_db.sync.inventory_items.insert_many(items)
+    [rebuilt] = async_db.sync.inventory_items.aggregate(availability_pipeline()[:-2])
+    assert (rebuilt["available_items"], rebuilt["available_quantity"]) == (2, 2)
+    assert async_db.sync.inventory_items.count_documents(AVAILABLE_MATCH) == 2
+
+
+def test_status_change_interrupted_before_the_counters_is_reapplied_once(async_db, monkeypatch):
+    seed(async_db)
+    asyncio.run(apply_inventory_changes(async_db, [
+        (None, item) for item in async_db.sync.inventory_items.find({}, {"_id": 0})
+    ]))
+
+    def available():
+        return asyncio.run(get_availability(async_db, [7]))[7]["available_items"]
+
+    async def lost_connection(*args, **kwargs):
+        raise AutoReconnect("connection reset")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(inventory_availability, "apply_inventory_changes", lost_connection)
+        with pytest.raises(AutoReconnect):
+            asyncio.run(update_inventory_status(async_db, 10, "sold"))
+    assert async_db.sync.inventory_items.find_one({"id": 10})["status"] == "sold"
+    assert available() == 2
+
+    assert asyncio.run(apply_pending_inventory_changes(async_db)) == 1
+    assert available() == 1
+    assert asyncio.run(apply_pending_inventory_changes(async_db)) == 0
+
+    # A change applied but not dequeued (failure in between) is skipped on replay
+    change = {"_id": ObjectId(), "before": {"product_id": 7, "distribution_center_id": 2, "status": "available"},
+              "after": {"product_id": 7, "distribution_center_id": 2, "status": "sold"}}
+    asyncio.run(apply_inventory_changes(async_db, [(change["before"], change["after"])], change_id=change["_id"]))
+    async_db.sync.inventory_items.update_one({"id": 11}, {"$set": {"status": "sold", "availability_pending": [change]}})
+    assert asyncio.run(apply_pending_inventory_changes(async_db)) == 1
+    assert available() == 0
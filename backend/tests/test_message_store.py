@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+from conftest import AsyncCollection
+from schemas.message import Message, MessageSender
+from services import message_store
+from services.message_store import append_messages, create_message_indexes
+
+
+@pytest.fixture
+def conversation(async_db, monkeypatch):
+    monkeypatch.setattr(message_store, "MESSAGE_WRITE_BACKOFF_SECONDS", 0)
+    asyncio.run(create_message_indexes(async_db))
+    conversation_id = ObjectId()
+    async_db.sync.conversations.insert_one({"_id": conversation_id, "message_count": 0})
+    return conversation_id
+
+
+def flaky_bulk_write(monkeypatch, failures, apply_before_failing):
+    calls = []
+
+    async def bulk_write(self, requests, **kwargs):
+        calls.append(len(requests))
+        if len(calls) <= failures:
+            if apply_before_failing:
+                self.sync.bulk_write(requests, **kwargs)
+            raise AutoReconnect("connection reset")
+        return self.sync.bulk_write(requests, **kwargs)
+
+    monkeypatch.setattr(AsyncCollection, "bulk_write", bulk_write, raising=False)
+    return calls
+
+
+def turn(db, conversation_id):
+    messages = [Message(text="hi", sender=MessageSender.USER), Message(text="hello", sender=MessageSender.BOT)]
+    return asyncio.run(append_messages(db, str(conversation_id), messages))
+
+
+def stored_seqs(db, conversation_id):
+    return [
+        msg["seq"] for bucket in db.sync.message_buckets.find({"conversation_id": conversation_id})
+        for msg in bucket["messages"]
+    ]
+
+
+@pytest.mark.parametrize("apply_before_failing", [False, True])
+def test_failed_bucket_write_is_retried_once_applied(async_db, conversation, monkeypatch, apply_before_failing):
+    calls = flaky_bulk_write(monkeypatch, failures=2, apply_before_failing=apply_before_failing)
+    turn(async_db, conversation)
+    assert len(calls) >= 3
+    # Written exactly once, even when a failed attempt had in fact gone through
+    assert stored_seqs(async_db, conversation) == [0, 1]
+    assert async_db.sync.message_buckets.find_one({"conversation_id": conversation})["count"] == 2
+
+    turn(async_db, conversation)
+    assert stored_seqs(async_db, conversation) == [0, 1, 2, 3]
+
+
+def test_bucket_write_gives_up_after_the_last_attempt(async_db, conversation, monkeypatch):
+    calls = flaky_bulk_write(monkeypatch, failures=100, apply_before_failing=False)
+    with pytest.raises(AutoReconnect):
+        turn(async_db, conversation)
+    assert len(calls) == message_store.MESSAGE_WRITE_ATTEMPTS
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from services import data_loader
+from services.ai_service import generate_fast_path_response
+from services.groq_services import ORDER_ACCOUNT_RESPONSE, GroqService
+from services.query_planner import QueryRequest
+
+OWNER, OTHER, GUEST = ObjectId(), ObjectId(), ObjectId()
+
+
+@pytest.fixture
+def shop(async_db, monkeypatch):
+    async_db.sync.users.insert_many([
+        {"_id": OWNER, "id": 1, "name": "Owner"},
+        {"_id": OTHER, "id": 2, "name": "Other"},
+    ])
+    async_db.sync.orders.insert_one({"id": 12345, "user_id": 1, "status": "shipped"})
+    async_db.sync.order_items.insert_one({"id": 1, "order_id": 12345, "product_id": 7, "quantity": 2})
+    async_db.sync.products.insert_one({"id": 7, "name": "Slim Jeans"})
+    monkeypatch.setattr(data_loader, "get_db", lambda: async_db)
+    monkeypatch.setattr(data_loader.shared_loaders.products, "fetch", data_loader.fetch_by(
+        lambda: async_db.products, "id", {"_id": 0, "id": 1, "name": 1}
+    ))
+    return GroqService.__new__(GroqService)
+
+
+def order_status(service, user_id):
+    request = QueryRequest(intent="order_status", order_id=12345)
+    return asyncio.run(service._run_query(request, user_id))
+
+
+def test_owner_sees_order(shop):
+    response = order_status(shop, str(OWNER))
+    assert response.startswith("Order #12345 is currently: shipped.")
+    assert "2 x Slim Jeans" in response
+
+
+def test_other_customers_order_is_not_found(shop):
+    loads = data_loader.shared_loaders.order_items.loads, data_loader.shared_loaders.products.loads
+    response = order_status(shop, str(OTHER))
+    assert response.startswith("I couldn't find order #12345")
+    assert "shipped" not in response and "Slim Jeans" not in response
+    # Nothing of the order's contents is even read
+    assert (data_loader.shared_loaders.order_items.loads, data_loader.shared_loaders.products.loads) == loads
+
+
+def test_unknown_account_is_refused(shop):
+    assert order_status(shop, str(GUEST)) == ORDER_ACCOUNT_RESPONSE
+    assert order_status(shop, None) == ORDER_ACCOUNT_RESPONSE
+
+
+def test_fast_path_refuses_another_customers_order(shop):
+    def fast_path(user_id):
+        response, match = asyncio.run(generate_fast_path_response(
+            "Where is my order 12345?", shop.answer_top_products, str(user_id)
+        ))
+        assert match.intent == "order_status"
+        return response
+
+    assert fast_path(OWNER).startswith("Order #12345 is currently: shipped.")
+    other = fast_path(OTHER)
+    assert other.startswith("I couldn't find order #12345")
+    assert "shipped" not in other
@@ -0,0 +1,127 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from services import product_sales
+from services.product_sales import PRODUCT_SALES_COLLECTION, VIEW_STATE_COLLECTION, refresh_product_sales
+
+
+class Crash(Exception):
+    pass
+
+
+def add_items(db, first: int, last: int):
+    db.sync.order_items.insert_many([
+        {"id": i, "product_id": i % 3, "quantity": 1} for i in range(first, last + 1)
+    ])
+
+
+def expected_sales(db) -> Counter:
+    return Counter(item["product_id"] for item in db.sync.order_items.find())
+
+
+def stored_sales(db) -> Counter:
+    return Counter({
+        doc["_id"]: doc["sales_count"] for doc in db.sync[PRODUCT_SALES_COLLECTION].find()
+    })
+
+
+def expire_lease(db):
+    db.sync[VIEW_STATE_COLLECTION].update_one(
+        {"_id": PRODUCT_SALES_COLLECTION},
+        {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}}
+    )
+
+
+@pytest.fixture
+def merges(monkeypatch):
+    """
+    Replaces the $merge aggregation (not supported by mongomock) with the
+    same per-product applied_id guard in Python; records merged windows
+    and lets a test hook run after a merge
+    """
+    calls = {"windows": [], "after_merge": None, "delay": 0}
+
+    async def merge(db, after_id, through_id):
+        calls["windows"].append((after_id, through_id))
+        await asyncio.sleep(calls["delay"])
+        totals = Counter(
+            item["product_id"]
+            for item in db.sync.order_items.find({"id": {"$gt": after_id, "$lte": through_id}})
+        )
+        sales = db.sync[PRODUCT_SALES_COLLECTION]
+        for product_id, count in totals.items():
+            doc = sales.find_one({"_id": product_id}) or {}
+            if doc.get("applied_id", 0) < through_id:
+                sales.update_one(
+                    {"_id": product_id},
+                    {"$inc": {"sales_count": count}, "$set": {"applied_id": through_id}},
+                    upsert=True
+                )
+        hook = calls["after_merge"]
+        if hook is not None:
+            calls["after_merge"] = None
+            hook()
+            # Still running when the hook's effects become visible
+            await asyncio.sleep(calls["delay"])
+
+    monkeypatch.setattr(product_sales, "merge_sales_window", merge)
+    return calls
+
+
+def test_crash_after_merge_then_new_inserts_does_not_double_count(async_db, merges):
+    add_items(async_db, 1, 10)
+
+    def crash():
+        raise Crash()
+    merges["after_merge"] = crash
+    with pytest.raises(Crash):
+        asyncio.run(refresh_product_sales(async_db, owner="worker-a"))
+
+    add_items(async_db, 11, 15)
+    # The dead worker's lease blocks others until it expires
+    assert asyncio.run(refresh_product_sales(async_db, owner="worker-b")) == {"skipped": True}
+    expire_lease(async_db)
+
+    assert asyncio.run(refresh_product_sales(async_db, owner="worker-b")) == {"after_id": 0, "through_id": 10}
+    assert asyncio.run(refresh_product_sales(async_db, owner="worker-b")) == {"after_id": 10, "through_id": 15}
+    assert merges["windows"] == [(0, 10), (0, 10), (10, 15)]
+    assert stored_sales(async_db) == expected_sales(async_db)
+
+
+def test_concurrent_refreshers_do_not_double_count(async_db, merges):
+    add_items(async_db, 1, 10)
+    merges["delay"] = 0.01
+
+    async def both():
+        return await asyncio.gather(
+            refresh_product_sales(async_db, owner="worker-a"),
+            refresh_product_sales(async_db, owner="worker-b")
+        )
+    results = asyncio.run(both())
+    assert {"skipped": True} in results
+    assert stored_sales(async_db) == expected_sales(async_db)
+
+    # A refresher outliving its lease: the next one retries the same window
+    add_items(async_db, 11, 20)
+    merges["after_merge"] = lambda: (expire_lease(async_db), add_items(async_db, 21, 25))
+
+    async def overlapping():
+        slow = asyncio.create_task(refresh_product_sales(async_db, owner="worker-a"))
+        await asyncio.sleep(0.005)
+        while not slow.done():
+            await refresh_product_sales(async_db, owner="worker-b")
+            await asyncio.sleep(0.001)
+        await slow
+        await refresh_product_sales(async_db, owner="worker-b")
+    asyncio.run(overlapping())
+
+    # worker-b retried worker-a's window before moving on
+    assert merges["windows"][-3:] == [(10, 20), (10, 20), (20, 25)]
+
+    assert stored_sales(async_db) == expected_sales(async_db)
+    state = async_db.sync[VIEW_STATE_COLLECTION].find_one({"_id": PRODUCT_SALES_COLLECTION})
+    assert state["high_water_id"] == 25
+    assert "pending" not in state
@@ -0,0 +1,30 @@
+import asyncio
+import json
+
+from services.query_planner import QueryPlanner, QueryRequest, parse_tool_call
+
+
+def test_sales_request_without_sales_data_is_marked_unranked(async_db):
+    async_db.sync.products.insert_many([
+        {"id": 1, "name": "Slim Jeans", "category": "Jeans", "retail_price": 50.0},
+        {"id": 2, "name": "Hoodie", "category": "Hoodies", "retail_price": 40.0},
+    ])
+    request = QueryRequest("top_products")
+    results = asyncio.run(QueryPlanner().find_products(async_db.products, async_db.product_sales, request))
+    assert len(results) == 2
+    assert request.unranked
+
+    async_db.sync.product_sales.insert_one(
+        {"product_id": 1, "name": "Slim Jeans", "category": "Jeans", "retail_price": 50.0, "sales_count": 3}
+    )
+    request = QueryRequest("top_products")
+    results = asyncio.run(QueryPlanner().find_products(async_db.products, async_db.product_sales, request))
+    assert [row["product_id"] for row in results] == [1]
+    assert not request.unranked
+
+
+def test_tool_call_with_invalid_sort_falls_back_to_sales():
+    for sort in (["price_asc"], {"by": "price"}, 3, "cheapest", None):
+        request = parse_tool_call('{"intent": "top_products", "sort": %s}' % json.dumps(sort))
+        assert request is not None and request.sort == "sales"
+    assert parse_tool_call('{"intent": "top_products", "sort": "price_desc"}').sort == "price_desc"
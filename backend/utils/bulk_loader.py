@@ -0,0 +1,644 @@
+import io
+import os
+import hashlib
+import time
+import queue
+import logging
+import threading
+from collections import deque
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import bson
+import numpy as np
+import pandas as pd
+from bson.raw_bson import RawBSONDocument
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.write_concern import WriteConcern
+
+logger = logging.getLogger(__name__)
+
+# Pipeline defaults; load_all_data exposes each one as a command line flag
+LOADER_PARSE_WORKERS = int(os.getenv("LOADER_PARSE_WORKERS", str(os.cpu_count() or 2)))
+LOADER_WRITERS = int(os.getenv("LOADER_WRITERS", "4"))
+LOADER_TABLE_WORKERS = int(os.getenv("LOADER_TABLE_WORKERS", "3"))
+LOADER_BLOCK_BYTES = int(os.getenv("LOADER_BLOCK_BYTES", str(8 * 1024 * 1024)))
+LOADER_BATCH_BYTES = int(os.getenv("LOADER_BATCH_BYTES", str(4 * 1024 * 1024)))
+LOADER_WRITE_CONCERN = os.getenv("LOADER_WRITE_CONCERN", "1")
+# A staged load may not shrink the live collection by more than this fraction
+LOADER_MAX_SHRINK = float(os.getenv("LOADER_MAX_SHRINK", "0.5"))
+
+STAGING_SUFFIX = "_staging"
+
+CHECKPOINT_COLLECTION = "loader_checkpoints"
+
+# Marks a column whose absence or malformed value rejects the row. A string
+# rather than object() so field specs survive pickling to parser processes.
+REQUIRED = "<required>"
+
+
+class TableSpec:
+    """
+    How one CSV maps onto one collection
+    Args:
+        name: Collection name (and CSV file stem)
+        label: Human readable name used in progress output
+        fields: (column, kind, default) with kind in int/float/str/datetime
+        indexes: (keys, index options) created after the load
+        timestamps: Columns stamped with the load time unless read from the CSV
+    """
+
+    def __init__(
+        self,
+        name: str,
+        label: str,
+        fields: List[Tuple[str, str, object]],
+        indexes: List[Tuple[object, Dict]],
+        timestamps: Tuple[str, ...] = ("created_at",)
+    ):
+        self.name = name
+        self.label = label
+        self.fields = fields
+        self.indexes = indexes
+        self.timestamps = timestamps
+
+
+class LoaderOptions:
+    """Tuning knobs for the ingestion pipeline"""
+
+    def __init__(
+        self,
+        parse_workers: int = LOADER_PARSE_WORKERS,
+        writers: int = LOADER_WRITERS,
+        table_workers: int = LOADER_TABLE_WORKERS,
+        block_bytes: int = LOADER_BLOCK_BYTES,
+        batch_bytes: int = LOADER_BATCH_BYTES,
+        write_concern: str = LOADER_WRITE_CONCERN,
+        journal: Optional[bool] = None,
+        queue_depth: Optional[int] = None,
+        max_shrink: float = LOADER_MAX_SHRINK
+    ):
+        self.parse_workers = max(1, parse_workers)
+        self.writers = max(1, writers)
+        self.table_workers = max(1, table_workers)
+        self.block_bytes = max(64 * 1024, block_bytes)
+        self.batch_bytes = max(16 * 1024, batch_bytes)
+        self.write_concern = parse_write_concern(write_concern, journal)
+        # Batches parsed ahead of the writers before the parser stage blocks
+        self.queue_depth = queue_depth or self.writers * 2
+        self.max_shrink = min(max(max_shrink, 0.0), 1.0)
+
+
+def parse_write_concern(value: str, journal: Optional[bool] = None) -> WriteConcern:
+    """Accepts "majority", a node count ("0", "1", ...) or a tag set name"""
+    w = int(value) if str(value).isdigit() else value
+    return WriteConcern(w=w, j=journal)
+
+
+class TableReport:
+    """Counters and stage timings for one table load"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+        self.rejected = 0
+        # Writer outcomes: inserted, updated, unchanged, deleted, failed
+        self.counts: Dict[str, int] = {}
+        self.csv_bytes = 0
+        self.bson_bytes = 0
+        self.batches = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        # Stage times are summed across workers, so they can exceed seconds
+        self.stages = {"parse": 0.0, "transform": 0.0, "insert": 0.0, "index": 0.0}
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] += seconds
+
+    def add_written(self, rows: int, counts: Dict[str, int], seconds: float):
+        with self._lock:
+            self.rows += rows
+            for key, value in counts.items():
+                self.counts[key] = self.counts.get(key, 0) + value
+            self.batches += 1
+            self.stages["insert"] += seconds
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.csv_bytes / (1024 * 1024) / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.stages.items())
+        line = (
+            f"{self.name}: {self.rows} rows in {self.seconds:.2f}s "
+            f"({self.rows_per_second:,.0f} rows/s, {self.mb_per_second:.1f} MB/s; {stages})"
+        )
+        counts = " ".join(f"{key}={value}" for key, value in sorted(self.counts.items()) if value)
+        if counts:
+            line += f" {counts}"
+        if self.rejected:
+            line += f" rejected={self.rejected}"
+        if self.error:
+            line += f" FAILED: {self.error}"
+        return line
+
+
+class RejectWriter:
+    """Collects rows that fail validation into <csv>.rejects.csv"""
+
+    def __init__(self, csv_file: str, append: bool = False):
+        self.path = f"{os.path.splitext(csv_file)[0]}.rejects.csv"
+        self.count = 0
+        # A resumed run keeps the rejects of the rows it skips
+        self._header = not (append and os.path.exists(self.path))
+        if not append and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write(self, rows: Optional[pd.DataFrame]):
+        if rows is None or rows.empty:
+            return
+        rows.to_csv(self.path, mode="a", header=self._header, index=False)
+        self._header = False
+        self.count += len(rows)
+
+
+def convert_chunk(
+    chunk: pd.DataFrame,
+    fields: List[Tuple[str, str, object]],
+    timestamps: Tuple[str, ...] = ("created_at",),
+    hashed: bool = False
+) -> Tuple[List[Dict], pd.DataFrame]:
+    """
+    Converts a CSV chunk (read as text) to Mongo documents column by column
+    Args:
+        chunk: DataFrame read from the CSV
+        fields: (column, kind, default) specs
+        timestamps: Columns set to the load time (unless read from the CSV)
+        hashed: Add a row_hash of the fields as read, before missing
+            datetimes are set to the load time, so it is stable across runs
+    Returns:
+        (documents for the valid rows, rejected rows with a reject_reason column)
+    """
+    now = datetime.utcnow()
+    invalid = pd.Series(False, index=chunk.index)
+    reasons = pd.Series("", index=chunk.index, dtype=object)
+    columns = {}
+    # Datetime columns as read, before the load time fills their gaps
+    unstamped = {}
+
+    for name, kind, default in fields:
+        required = default == REQUIRED
+        present = name in chunk.columns
+        if not present and required:
+            raise ValueError(f"Missing required column '{name}'")
+        raw = chunk[name] if present else pd.Series(pd.NA, index=chunk.index, dtype=object)
+
+        if kind in ("int", "float"):
+            values = pd.to_numeric(raw, errors="coerce")
+            bad = values.isna() & raw.notna()
+            if kind == "int":
+                bad |= values.notna() & (values % 1 != 0)
+        elif kind == "datetime":
+            values = pd.to_datetime(raw, errors="coerce", utc=True).dt.tz_localize(None)
+            bad = values.isna() & raw.notna()
+        else:
+            values = raw
+            bad = pd.Series(False, index=chunk.index)
+
+        missing = values.isna()
+        if required:
+            bad |= missing
+        reasons[bad & ~invalid] = f"invalid {name}"
+        invalid |= bad
+
+        if kind == "datetime" and default is None:
+            if hashed:
+                unstamped[name] = values.astype(object).where(~missing, None)
+            values = values.fillna(now) if present else pd.Series(now, index=chunk.index)
+        elif kind == "int":
+            values = values.fillna(0 if required or default is None else default).astype("int64")
+        elif not required:
+            values = values.astype(object).where(~missing, default)
+        columns[name] = values
+
+    for name in timestamps:
+        if name not in columns:
+            columns[name] = pd.Series(now, index=chunk.index)
+
+    rejected = chunk[invalid].assign(reject_reason=reasons[invalid])
+    documents = pd.DataFrame(columns)[~invalid].to_dict("records")
+    if hashed:
+        contents = pd.DataFrame({
+            name: unstamped.get(name, columns[name]) for name, _, _ in fields
+        })[~invalid].to_dict("records")
+        for document, content in zip(documents, contents):
+            document["row_hash"] = row_hash(content)
+    return documents, rejected
+
+
+def read_header(csv_file: str) -> Tuple[List[str], int]:
+    """Returns the CSV column names and the byte offset of the first record"""
+    with open(csv_file, "rb") as file:
+        line = file.readline()
+    columns = pd.read_csv(io.BytesIO(line), nrows=0).columns.tolist()
+    return columns, len(line)
+
+
+def split_blocks(csv_file: str, block_bytes: int, start: int) -> Iterator[Tuple[int, int]]:
+    """
+    Splits a CSV into (start, end) byte ranges of about block_bytes each,
+    ending on a line break. Records must not contain embedded newlines.
+    """
+    size = os.path.getsize(csv_file)
+    with open(csv_file, "rb") as file:
+        while start < size:
+            file.seek(min(start + block_bytes, size))
+            file.readline()
+            end = min(file.tell(), size)
+            yield start, end
+            start = end
+
+
+class ParsedBlock:
+    def __init__(self, encoded: List[bytes], rejected: pd.DataFrame, size: int, parse_s: float, transform_s: float):
+        self.encoded = encoded
+        self.rejected = rejected
+        self.size = size
+        self.parse_s = parse_s
+        self.transform_s = transform_s
+
+
+def parse_block(
+    csv_file: str,
+    columns: List[str],
+    start: int,
+    end: int,
+    fields: List[Tuple[str, str, object]],
+    timestamps: Tuple[str, ...]
+) -> ParsedBlock:
+    """
+    Parser stage, run in a worker process: reads one byte range, converts
+    it and returns the documents already BSON-encoded, so writers only copy
+    bytes onto the wire. Every document carries a row_hash of its CSV
+    fields, which incremental syncs compare against.
+    """
+    started = time.perf_counter()
+    with open(csv_file, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    wanted = [name for name, _, _ in fields if name in columns]
+    chunk = pd.read_csv(
+        io.BytesIO(data),
+        header=None,
+        names=columns,
+        usecols=wanted,
+        dtype={name: "string" for name in wanted}
+    )
+    parsed = time.perf_counter()
+
+    documents, rejected = convert_chunk(chunk, fields, timestamps, hashed=True)
+    encoded = [bson.encode(document) for document in documents]
+    return ParsedBlock(encoded, rejected, end - start, parsed - started, time.perf_counter() - parsed)
+
+
+def row_hash(content: Dict) -> int:
+    """64-bit fingerprint of a row's CSV-derived fields"""
+    digest = hashlib.blake2b(bson.encode(content), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def parser_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool for the parser stage. Workers come from a fork server so
+    they never inherit the MongoClient's sockets and monitor threads.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+
+
+def insert_batch(collection, documents: List[RawBSONDocument]) -> Dict[str, int]:
+    """
+    Default writer operation: unordered insert_many
+    Returns:
+        Counts of inserted and failed rows
+    """
+    try:
+        result = collection.insert_many(documents, ordered=False)
+        return {"inserted": len(result.inserted_ids) if result.acknowledged else len(documents)}
+    except BulkWriteError as e:
+        failed = len(e.details.get("writeErrors", []))
+        logger.warning(f"Partial insert error into {collection.name}: {failed} rows rejected")
+        return {"inserted": e.details.get("nInserted", len(documents) - failed), "failed": failed}
+
+
+def sync_batch(collection, documents: List[RawBSONDocument], timestamps: Tuple[str, ...] = ()) -> Dict[str, int]:
+    """
+    Incremental writer operation: compares each row's hash with the stored
+    one and upserts, keyed on id, only rows that are new or changed
+    Args:
+        collection: Target collection (with a unique index on id)
+        documents: Parsed rows, without load-time timestamps
+        timestamps: Load-time columns; created_at is set on insert only,
+            the others on every write. updated_at is always set, so readers
+            caching a collection see in-place changes
+    Returns:
+        Counts of inserted, updated, unchanged and failed rows
+    """
+    stored = {
+        doc["id"]: doc.get("row_hash")
+        for doc in collection.find(
+            {"id": {"$in": [document["id"] for document in documents]}},
+            {"_id": 0, "id": 1, "row_hash": 1}
+        )
+    }
+    now = datetime.utcnow()
+    on_insert = {name: now for name in timestamps if name == "created_at"}
+    on_write = {name: now for name in timestamps if name != "created_at"}
+    on_write["updated_at"] = now
+
+    operations = []
+    for document in documents:
+        if document["id"] in stored and stored[document["id"]] == document["row_hash"]:
+            continue
+        update = {"$set": {**document, **on_write}}
+        if on_insert:
+            update["$setOnInsert"] = on_insert
+        operations.append(UpdateOne({"id": document["id"]}, update, upsert=True))
+
+    counts = {"unchanged": len(documents) - len(operations)}
+    if not operations:
+        return counts
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        if result.acknowledged:
+            counts["inserted"] = result.upserted_count
+            counts["updated"] = result.matched_count
+        else:
+            counts["updated"] = len(operations)
+    except BulkWriteError as e:
+        failed = len(e.details.get("writeErrors", []))
+        logger.warning(f"Partial sync error into {collection.name}: {failed} rows rejected")
+        counts["inserted"] = e.details.get("nUpserted", 0)
+        counts["updated"] = e.details.get("nMatched", 0)
+        counts["failed"] = failed
+    return counts
+
+
+def read_ids(csv_file: str, chunksize: int = 10**6) -> np.ndarray:
+    """Sorted, distinct ids present in a CSV (reads only the id column)"""
+    ids = [
+        pd.to_numeric(chunk["id"], errors="coerce").dropna().to_numpy(dtype=np.int64)
+        for chunk in pd.read_csv(csv_file, usecols=["id"], dtype={"id": "string"}, chunksize=chunksize)
+    ]
+    return np.unique(np.concatenate(ids)) if ids else np.empty(0, dtype=np.int64)
+
+
+def delete_missing(collection, csv_file: str, batch_size: int = 10000) -> int:
+    """
+    Deletes documents whose id no longer appears in the CSV
+    Returns:
+        Number of documents deleted
+    """
+    present = read_ids(csv_file)
+    deleted = 0
+    cursor = collection.find({}, {"_id": 0, "id": 1}).sort("id", 1).batch_size(batch_size)
+    batch = []
+
+    def flush(ids):
+        if not ids:
+            return 0
+        stored = np.array(ids, dtype=np.int64)
+        missing = stored[~np.isin(stored, present, assume_unique=True)]
+        if not len(missing):
+            return 0
+        return collection.delete_many({"id": {"$in": missing.tolist()}}).deleted_count
+
+    for document in cursor:
+        if isinstance(document.get("id"), int):
+            batch.append(document["id"])
+        if len(batch) >= batch_size:
+            deleted += flush(batch)
+            batch = []
+    deleted += flush(batch)
+    return deleted
+
+
+class Checkpoint:
+    """
+    Resume point of an interrupted sync: the byte offset below which every
+    row has been written, valid only for the same file (path, size, mtime)
+    """
+
+    def __init__(self, db, table: str, csv_file: str):
+        self.collection = db[CHECKPOINT_COLLECTION]
+        self.table = table
+        stat = os.stat(csv_file)
+        self.file = {"path": os.path.abspath(csv_file), "size": stat.st_size, "mtime": stat.st_mtime}
+
+    def load(self) -> Optional[int]:
+        """Returns the committed offset of a matching unfinished run"""
+        state = self.collection.find_one({"_id": self.table})
+        if state and state.get("file") == self.file:
+            return state.get("offset")
+        return None
+
+    def commit(self, offset: int):
+        self.collection.update_one(
+            {"_id": self.table},
+            {"$set": {"file": self.file, "offset": offset, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    def clear(self):
+        self.collection.delete_one({"_id": self.table})
+
+
+def _batches(encoded: List[bytes], batch_bytes: int) -> Iterator[List[bytes]]:
+    batch, size = [], 0
+    for document in encoded:
+        if batch and size + len(document) > batch_bytes:
+            yield batch
+            batch, size = [], 0
+        batch.append(document)
+        size += len(document)
+    if batch:
+        yield batch
+
+
+def run_pipeline(
+    collection,
+    csv_file: str,
+    spec: TableSpec,
+    options: LoaderOptions,
+    executor: Executor,
+    write_batch: Callable = insert_batch,
+    timestamps: Optional[Tuple[str, ...]] = None,
+    start: Optional[int] = None,
+    on_commit: Optional[Callable[[int], None]] = None
+) -> TableReport:
+    """
+    Streams a CSV into a collection: byte ranges are parsed in the executor,
+    cut into batch_bytes batches and handed through a bounded queue to
+    options.writers concurrent writer threads
+    Args:
+        collection: Target pymongo collection
+        csv_file: Path to the CSV
+        spec: Table description
+        options: Pipeline options
+        executor: Process pool shared by all tables
+        write_batch: Writer operation, (collection, documents) -> counts
+        timestamps: Load-time columns added by the parser (spec.timestamps by default)
+        start: Byte offset to resume from, instead of the first record
+        on_commit: Called with the offset below which every row is written
+    Returns:
+        TableReport for the load
+    """
+    report = TableReport(spec.name)
+    columns, header_bytes = read_header(csv_file)
+    start = header_bytes if start is None else max(start, header_bytes)
+    rejects = RejectWriter(csv_file, append=start > header_bytes)
+    timestamps = spec.timestamps if timestamps is None else timestamps
+    collection = collection.with_options(write_concern=options.write_concern)
+
+    batches: "queue.Queue" = queue.Queue(maxsize=options.queue_depth)
+    # [end offset, batches not yet written] per block, in file order; the
+    # commit offset only moves past a block once all its batches are written
+    open_blocks: deque = deque()
+    blocks_lock = threading.Lock()
+
+    def release(block):
+        with blocks_lock:
+            block[1] -= 1
+            committed = None
+            while open_blocks and open_blocks[0][1] == 0:
+                committed = open_blocks.popleft()[0]
+            if committed is not None and on_commit is not None:
+                on_commit(committed)
+
+    def writer():
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            block, batch = item
+            started = time.perf_counter()
+            try:
+                counts = write_batch(collection, [RawBSONDocument(doc) for doc in batch])
+            except Exception as e:
+                # Any error (not only PyMongoError: bson encoding, bugs in
+                # write_batch) is recorded and the writer keeps draining the
+                # queue, so the producer never blocks on a dead writer. The
+                # block stays open, so a checkpoint never skips these rows.
+                if isinstance(e, PyMongoError):
+                    logger.error(f"Database error writing {spec.name}: {e}")
+                else:
+                    logger.exception(f"Error writing {spec.name}: {e}")
+                report.error = report.error or str(e)[:200]
+                report.add_written(len(batch), {"failed": len(batch)}, time.perf_counter() - started)
+                continue
+            report.add_written(len(batch), counts, time.perf_counter() - started)
+            try:
+                release(block)
+            except Exception as e:
+                logger.error(f"Error committing progress of {spec.name}: {e}")
+                report.error = report.error or str(e)[:200]
+
+    threads = [threading.Thread(target=writer, daemon=True) for _ in range(options.writers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        in_flight = deque()
+        ranges = split_blocks(csv_file, options.block_bytes, start)
+        exhausted = False
+        while not exhausted or in_flight:
+            # Keep every parser busy without reading the whole file ahead
+            while not exhausted and len(in_flight) < options.parse_workers * 2:
+                block = next(ranges, None)
+                if block is None:
+                    exhausted = True
+                    break
+                future = executor.submit(
+                    parse_block, csv_file, columns, block[0], block[1], spec.fields, timestamps
+                )
+                in_flight.append((block, future))
+            if not in_flight:
+                break
+
+            block, future = in_flight.popleft()
+            parsed = future.result()
+            report.csv_bytes += parsed.size
+            report.bson_bytes += sum(len(doc) for doc in parsed.encoded)
+            report.add_stage("parse", parsed.parse_s)
+            report.add_stage("transform", parsed.transform_s)
+            rejects.write(parsed.rejected)
+
+            chunks = list(_batches(parsed.encoded, options.batch_bytes))
+            tracked = [block[1], len(chunks) + 1]
+            with blocks_lock:
+                open_blocks.append(tracked)
+            # Blocks when the writers fall behind
+            for chunk in chunks:
+                batches.put((tracked, chunk))
+            release(tracked)
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for thread in threads:
+            thread.join()
+
+    report.rejected = rejects.count
+    report.finish()
+    return report
+
+
+def create_indexes(collection, spec: TableSpec, report: Optional[TableReport] = None):
+    """Builds the table's indexes, timing them into the report"""
+    started = time.perf_counter()
+    for keys, index_options in spec.indexes:
+        collection.create_index(keys, **index_options)
+    if report is not None:
+        report.add_stage("index", time.perf_counter() - started)
+        report.finish()
+
+
+def validate_staged(staging, live, report: TableReport, max_shrink: float = LOADER_MAX_SHRINK) -> int:
+    """
+    Checks a staged collection before it replaces the live one
+    Args:
+        staging: Freshly loaded shadow collection
+        live: Collection it is about to replace
+        report: Report of the staging load
+        max_shrink: Largest accepted drop in row count versus the live collection
+    Returns:
+        Number of staged documents
+    """
+    staged = staging.count_documents({})
+    written = report.counts.get("inserted", 0)
+    if staged != written:
+        raise ValueError(f"{staging.name} holds {staged} documents but {written} were inserted")
+    current = live.estimated_document_count()
+    if current and staged < current * (1 - max_shrink):
+        raise ValueError(
+            f"{staging.name} has {staged} documents against {current} live; "
+            f"refusing to shrink {live.name} by more than {max_shrink:.0%}"
+        )
+    return staged
+
+
+def swap_collection(db, source: str, target: str):
+    """Atomically replaces target with source (renameCollection with dropTarget)"""
+    db.client.admin.command(
+        "renameCollection", f"{db.name}.{source}", to=f"{db.name}.{target}", dropTarget=True
+    )
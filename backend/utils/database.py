@@ -1,31 +1,83 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
+from pymongo import ReadPreference
 from pymongo.errors import ConnectionFailure
 import os
 from dotenv import load_dotenv
+from services.message_store import create_message_indexes
+from services.response_cache import create_response_cache_indexes
+from services.product_sales import create_product_sales_indexes
+from services.metrics import mongo_event_listeners
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME", "ecommerce_chatbot")
 
+# Connection pool tuning (one pool per process, shared by every service)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000"))
+
+# Read preference for catalog lookups, e.g. "secondaryPreferred"
+PRODUCT_READ_PREFERENCE = os.getenv("MONGO_PRODUCT_READ_PREFERENCE", "primary")
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
 client = None
 db = None
 
 async def init_db():
     global client, db
+    if client is not None:
+        return db
     try:
-        client = AsyncIOMotorClient(MONGO_URI)
+        client = AsyncIOMotorClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            event_listeners=mongo_event_listeners()
+        )
         db = client[DB_NAME]
         # Create indexes
         await db.conversations.create_index("user_id")
         await db.conversations.create_index("session_id", unique=True)
         await db.conversations.create_index("is_active")
         await db.conversations.create_index("updated_at")
+        # Keyset pagination of a user's conversation summaries
+        await db.conversations.create_index([("user_id", 1), ("updated_at", -1), ("_id", -1)])
+        await create_message_indexes(db)
+        await create_response_cache_indexes(db)
+        await create_product_sales_indexes(db)
         print("✅ Database connection established and indexes created")
+        return db
     except ConnectionFailure as e:
+        client = None
+        db = None
         print(f"❌ Could not connect to MongoDB: {e}")
         raise
 
 def get_db():
-    return db
\ No newline at end of file
+    return db
+
+def get_products_collection():
+    """Products collection on the shared pool, honouring the catalog read preference"""
+    if db is None:
+        raise RuntimeError("Database has not been initialised")
+    return db.get_collection(
+        "products",
+        read_preference=READ_PREFERENCES.get(PRODUCT_READ_PREFERENCE, ReadPreference.PRIMARY)
+    )
+
+def close_db():
+    global client, db
+    if client is not None:
+        client.close()
+    client = None
+    db = None
@@ -0,0 +1,83 @@
+"""
+Trusted-read serialization for documents that come from our own database
+
+Documents read back from MongoDB were validated when they were written, so
+re-validating them on every response is wasted work. construct_from builds
+models without validation and TrustedJSONResponse encodes them with orjson
+straight from their BSON values (ObjectId, datetime), bypassing FastAPI's
+response_model validation and jsonable_encoder. Routes keep their
+response_model for the OpenAPI schema and return this response directly.
+"""
+from typing import Any, Dict, Mapping, Type, TypeVar
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+import orjson
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Field name -> output key (the alias) per model class
+_aliases: Dict[type, Dict[str, str]] = {}
+
+
+def _output_keys(cls: type) -> Dict[str, str]:
+    keys = _aliases.get(cls)
+    if keys is None:
+        keys = _aliases[cls] = {name: field.alias for name, field in cls.__fields__.items()}
+    return keys
+
+
+def construct_from(cls: Type[ModelT], document: Mapping[str, Any]) -> ModelT:
+    """
+    Builds a model from a stored document without validation
+    Args:
+        cls: Model class
+        document: Document read from MongoDB; keys may be aliases or field names
+    Returns:
+        Model instance holding the document's values as-is. Keys that are
+        not fields of the model are dropped; missing fields get their defaults.
+    """
+    values, fields_set = {}, set()
+    fields = cls.__fields__
+    # Same result as cls.construct(), without its keyword-argument copies
+    for name, alias in _output_keys(cls).items():
+        if alias in document:
+            values[name] = document[alias]
+        elif name in document:
+            values[name] = document[name]
+        else:
+            if not fields[name].required:
+                values[name] = fields[name].get_default()
+            continue
+        fields_set.add(name)
+    model = cls.__new__(cls)
+    object.__setattr__(model, "__dict__", values)
+    object.__setattr__(model, "__fields_set__", fields_set)
+    model._init_private_attributes()
+    return model
+
+
+def model_document(model: BaseModel) -> Dict[str, Any]:
+    """Shallow by-alias dict of a model, as jsonable_encoder would key it"""
+    keys = _output_keys(type(model))
+    return {keys.get(name, name): value for name, value in model.__dict__.items()}
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return model_document(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Encodes models, lists and BSON documents to JSON bytes"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class TrustedJSONResponse(ORJSONResponse):
+    """JSON response for trusted models and documents; performs no validation"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
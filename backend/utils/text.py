@@ -0,0 +1,11 @@
+import re
+import unicodedata
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_message(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a message"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _PUNCTUATION.sub(" ", text.replace("'", ""))
+    return _WHITESPACE.sub(" ", text).strip()
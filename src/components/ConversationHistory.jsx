@@ -59,12 +59,14 @@ const ConversationHistory = () => {
               {conversation.title || `Conversation ${conversation.id}`}
             </div>
             <div className="text-xs text-gray-500 mt-1">
-              {formatDate(conversation.timestamp)}
+              {formatDate(conversation.updated_at)}
             </div>
             <div className="text-xs text-gray-600 mt-1 truncate">
-              {conversation.messages && conversation.messages.length > 1
-                ? `${conversation.messages.length - 1} messages`
-                : 'No messages yet'
+              {conversation.last_message
+                ? conversation.last_message.text
+                : conversation.message_count > 0
+                  ? `${conversation.message_count} messages`
+                  : 'No messages yet'
               }
             </div>
           </div>
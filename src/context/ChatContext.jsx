@@ -1,4 +1,4 @@
-import React, { createContext, useContext, useReducer, useEffect } from 'react';
+import React, { createContext, useContext, useReducer, useEffect, useRef } from 'react';
 
 // Placeholder user ID (replace with real auth/user logic as needed)
 const USER_ID = 'demo-user-123';
@@ -11,13 +11,17 @@ const initialState = {
   loading: false,
   input: '',
   conversations: [],
-  currentConversationId: null
+  currentConversationId: null,
+  // Messages held for the current conversation, sent as `since` so the
+  // chat endpoint only returns the new ones
+  messageCount: 0
 };
 
 // Action types
 const ACTIONS = {
   SET_MESSAGES: 'SET_MESSAGES',
   ADD_MESSAGE: 'ADD_MESSAGE',
+  APPLY_CHAT_RESPONSE: 'APPLY_CHAT_RESPONSE',
   SET_LOADING: 'SET_LOADING',
   SET_INPUT: 'SET_INPUT',
   CLEAR_INPUT: 'CLEAR_INPUT',
@@ -35,6 +39,19 @@ const chatReducer = (state, action) => {
       return { ...state, messages: action.payload };
     case ACTIONS.ADD_MESSAGE:
       return { ...state, messages: [...state.messages, action.payload] };
+    case ACTIONS.APPLY_CHAT_RESPONSE: {
+      const { data, previousMessages } = action.payload;
+      // A delta carries `since` and only the new messages
+      const messages = data.since !== undefined
+        ? [...previousMessages, ...data.messages]
+        : data.messages;
+      return {
+        ...state,
+        messages,
+        messageCount: data.message_count,
+        currentConversationId: data.id
+      };
+    }
     case ACTIONS.SET_LOADING:
       return { ...state, loading: action.payload };
     case ACTIONS.SET_INPUT:
@@ -49,12 +66,14 @@ const chatReducer = (state, action) => {
       return {
         ...state,
         messages: action.payload.messages,
+        messageCount: action.payload.message_count,
         currentConversationId: action.payload.id
       };
     case ACTIONS.START_NEW_CONVERSATION:
       return {
         ...state,
         messages: [{ from: 'bot', text: 'Hi! How can I help you today?' }],
+        messageCount: 0,
         currentConversationId: null
       };
     case ACTIONS.SET_CURRENT_CONVERSATION_ID:
@@ -68,6 +87,8 @@ const ChatContext = createContext();
 
 export const ChatProvider = ({ children }) => {
   const [state, dispatch] = useReducer(chatReducer, initialState);
+  // Last response and ETag per conversation, for conditional reloads
+  const conversationCache = useRef(new Map());
 
   // Fetch all conversations for the user on mount
   useEffect(() => {
@@ -77,9 +98,9 @@ export const ChatProvider = ({ children }) => {
   // Fetch conversations from backend
   const fetchConversations = async () => {
     try {
-      const res = await fetch(`http://localhost:8000/api/conversations/user/${USER_ID}`);
+      const res = await fetch(`http://localhost:8000/api/conversations/user/${USER_ID}/summaries`);
       const data = await res.json();
-      dispatch({ type: ACTIONS.SET_CONVERSATIONS, payload: data });
+      dispatch({ type: ACTIONS.SET_CONVERSATIONS, payload: data.items || [] });
     } catch (err) {
       // Optionally handle error
       dispatch({ type: ACTIONS.SET_CONVERSATIONS, payload: [] });
@@ -89,8 +110,20 @@ export const ChatProvider = ({ children }) => {
   // Load a specific conversation from backend
   const loadConversation = async (conversation) => {
     try {
-      const res = await fetch(`http://localhost:8000/api/conversations/${conversation.id}`);
-      const data = await res.json();
+      const cached = conversationCache.current.get(conversation.id);
+      const res = await fetch(`http://localhost:8000/api/conversations/${conversation.id}`, {
+        headers: cached ? { 'If-None-Match': cached.etag } : {}
+      });
+      let data;
+      if (res.status === 304 && cached) {
+        data = cached.data;
+      } else {
+        data = await res.json();
+        const etag = res.headers.get('ETag');
+        if (etag) {
+          conversationCache.current.set(conversation.id, { etag, data });
+        }
+      }
       dispatch({ type: ACTIONS.LOAD_CONVERSATION, payload: data });
     } catch (err) {
       // Optionally handle error
@@ -118,11 +151,14 @@ export const ChatProvider = ({ children }) => {
   const sendMessage = async (messageText) => {
     if (!messageText.trim()) return;
     dispatch({ type: ACTIONS.SET_LOADING, payload: true });
+    const previousMessages = state.messages;
     const userMessage = { from: 'user', text: messageText };
     dispatch({ type: ACTIONS.ADD_MESSAGE, payload: userMessage });
     dispatch({ type: ACTIONS.CLEAR_INPUT });
     try {
-      const res = await fetch(`http://localhost:8000/api/chat`, {
+      // Only ask for a delta when continuing a conversation we hold
+      const query = state.currentConversationId ? `?since=${state.messageCount}` : '';
+      const res = await fetch(`http://localhost:8000/api/chat${query}`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -132,9 +168,8 @@ export const ChatProvider = ({ children }) => {
         })
       });
       const data = await res.json();
-      // The backend returns the updated conversation, so update messages and conversation id
-      dispatch({ type: ACTIONS.SET_MESSAGES, payload: data.messages });
-      dispatch({ type: ACTIONS.SET_CURRENT_CONVERSATION_ID, payload: data.id });
+      // The backend returns the new messages (or the whole conversation for a new one)
+      dispatch({ type: ACTIONS.APPLY_CHAT_RESPONSE, payload: { data, previousMessages } });
       fetchConversations();
     } catch (err) {
       dispatch({ type: ACTIONS.ADD_MESSAGE, payload: { from: 'bot', text: 'Error contacting server.' } });